@@ -6,7 +6,7 @@ from datetime import datetime
 
 from db import get_students
 from attendance_utils import attendance_to_dataframe
-from face_utils import load_known_face_encodings
+from face_utils import load_face_gallery
 
 
 def render_quick_actions_panel():
@@ -30,11 +30,8 @@ def render_quick_actions_panel():
 
     # 2) Load encodings
     if c2.button("🧠 Load Encodings"):
-        ids, names, encs = load_known_face_encodings()
-        st.session_state["known_ids"] = ids
-        st.session_state["known_names"] = names
-        st.session_state["known_encodings"] = encs
-        st.success(f"Loaded {len(ids)} encodings into memory.")
+        gallery = load_face_gallery()   # applies only what changed since the last load
+        st.success(f"Loaded {len(gallery)} encodings into memory.")
 
     # 3) Add student (scroll hint)
     if c3.button("➕ Add Student"):
@@ -0,0 +1,336 @@
+# ann_index.py
+"""
+Approximate Nearest-Neighbour Index (IVF)
+-----------------------------------------
+Inverted-file index over the 512-D ArcFace embeddings, pure NumPy:
+
+- spherical k-means splits the gallery into `nlist` clusters
+- a query only scans the `nprobe` closest clusters
+  (nprobe is the recall / latency knob: nprobe = nlist is exact search)
+
+Persistence:
+- full index snapshot:   ANN_INDEX_PATH (.npz next to attendance_system.db)
+- incremental updates:   ANN_INDEX_PATH + ".delta" (append-only records)
+
+Keys are face template ids (face_templates.id), so every template of a
+student is indexed. save_student_face_encoding() only appends records to
+the delta log, so enrollment never rewrites the whole index; the log is replayed on load and
+folded back in by compact().
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from config import ANN_INDEX_PATH, ANN_NLIST, ANN_NPROBE
+from gallery import l2_normalize, EMBEDDING_DIM
+
+
+# -------------------------------------------------------
+# K-MEANS (spherical)
+# -------------------------------------------------------
+
+def _assign(vectors, centroids, chunk=8192):
+    """Index of the most similar centroid for every row."""
+    out = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), chunk):
+        sims = vectors[start:start + chunk] @ centroids.T
+        out[start:start + chunk] = np.argmax(sims, axis=1)
+    return out
+
+
+def train_centroids(vectors, nlist, n_iter=10, seed=0):
+    """Spherical k-means on (a sample of) unit vectors."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), 64 * nlist)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(n_iter):
+        labels = _assign(sample, centroids)
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[present]
+
+        sums = sample[rng.choice(sample_size, nlist, replace=False)]  # re-seeds empty clusters
+        sums[present] = np.add.reduceat(sample[order], starts, axis=0)
+        centroids = l2_normalize(sums)
+
+    return centroids
+
+
+# -------------------------------------------------------
+# INDEX
+# -------------------------------------------------------
+
+class IVFIndex:
+    """
+    Keys are face template ids. Main storage is grouped by cluster
+    (CSR layout via `offsets`); upserts go to a small exhaustively-searched
+    `pending` buffer and overwritten rows are tombstoned in `alive`.
+    """
+
+    def __init__(self, nprobe=ANN_NPROBE):
+        self.nprobe = nprobe
+        self.centroids = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.pending = {}   # id -> unit vector
+        self._row_of = {}   # id -> row in main storage
+
+    # ---------------- build ----------------
+
+    @classmethod
+    def build(cls, ids, vectors, nlist=ANN_NLIST, nprobe=ANN_NPROBE):
+        index = cls(nprobe=nprobe)
+        vectors = l2_normalize(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+
+        if nlist <= 0:
+            nlist = max(1, int(np.sqrt(len(ids))))
+        nlist = min(nlist, len(ids))
+
+        index.centroids = train_centroids(vectors, nlist)
+        labels = _assign(vectors, index.centroids)
+        order = np.argsort(labels, kind="stable")
+
+        index.ids = ids[order]
+        index.vectors = np.ascontiguousarray(vectors[order])
+        index.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(labels, minlength=nlist))]
+        ).astype(np.int64)
+        index.alive = np.ones(len(ids), dtype=bool)
+        index._reindex()
+        return index
+
+    def _reindex(self):
+        self._row_of = {int(i): r for r, i in enumerate(self.ids)}
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self.pending)
+
+    def id_set(self):
+        return set(self.ids[self.alive].tolist()) | set(self.pending)
+
+    # ---------------- updates ----------------
+
+    def copy(self):
+        """
+        Index that can be updated without affecting this one. The large
+        arrays are shared (updates never write them in place); only the
+        tombstones and the pending buffer are copied.
+        """
+        index = IVFIndex.__new__(IVFIndex)
+        index.__dict__.update(self.__dict__)
+        index.alive = self.alive.copy()
+        index.pending = dict(self.pending)
+        return index
+
+    def upsert(self, key, vector):
+        key = int(key)
+        row = self._row_of.get(key)
+        if row is not None:
+            self.alive[row] = False
+        self.pending[key] = l2_normalize(vector)[0]
+
+    def remove(self, key):
+        key = int(key)
+        row = self._row_of.get(key)
+        if row is not None:
+            self.alive[row] = False
+        self.pending.pop(key, None)
+
+    # ---------------- search ----------------
+
+    def search(self, queries, k=1, nprobe=None):
+        """
+        Top-k (ids, similarities) per query, shape (n_queries, k).
+        Missing slots are id -1 / similarity -inf.
+        """
+        queries = l2_normalize(queries)
+        nprobe = min(nprobe or self.nprobe, max(1, self.nlist))
+
+        out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        out_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+
+        if self.nlist:
+            probe = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :nprobe]
+        else:
+            probe = np.zeros((len(queries), 0), dtype=np.int64)
+
+        # scan each probed cluster once, for all queries that probe it
+        cand_ids = [[] for _ in range(len(queries))]
+        cand_sims = [[] for _ in range(len(queries))]
+        for c in np.unique(probe):
+            lo, hi = self.offsets[c], self.offsets[c + 1]
+            if hi == lo:
+                continue
+            q_rows = np.flatnonzero((probe == c).any(axis=1))
+            sims = queries[q_rows] @ self.vectors[lo:hi].T
+            sims[:, ~self.alive[lo:hi]] = -np.inf
+            for j, qi in enumerate(q_rows):
+                cand_ids[qi].append(self.ids[lo:hi])
+                cand_sims[qi].append(sims[j])
+
+        if self.pending:
+            pend_ids = np.fromiter(self.pending.keys(), dtype=np.int64)
+            pend_sims = queries @ np.stack(list(self.pending.values())).T
+            for qi in range(len(queries)):
+                cand_ids[qi].append(pend_ids)
+                cand_sims[qi].append(pend_sims[qi])
+
+        for qi in range(len(queries)):
+            if not cand_ids[qi]:
+                continue
+            ids = np.concatenate(cand_ids[qi])
+            sims = np.concatenate(cand_sims[qi])
+            kk = min(k, len(ids))
+            top = np.argpartition(-sims, kk - 1)[:kk]
+            top = top[np.argsort(-sims[top])]
+            out_ids[qi, :kk] = ids[top]
+            out_sims[qi, :kk] = sims[top]
+
+        return out_ids, out_sims
+
+    # ---------------- persistence ----------------
+
+    def save(self, path=ANN_INDEX_PATH):
+        """Write the full snapshot atomically and truncate the delta log."""
+        self.compact()
+        # unique per writer: two processes may rebuild the index at once
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npz"
+        np.savez(
+            tmp,
+            centroids=self.centroids,
+            ids=self.ids,
+            vectors=self.vectors,
+            offsets=self.offsets,
+            nprobe=np.int64(self.nprobe),
+        )
+        os.replace(tmp, path)
+        if os.path.exists(_delta_path(path)):
+            os.remove(_delta_path(path))
+
+    @classmethod
+    def load(cls, path=ANN_INDEX_PATH):
+        """Load a snapshot and replay its delta log (None if missing)."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            index = cls(nprobe=int(data["nprobe"]))
+            index.centroids = data["centroids"]
+            index.ids = data["ids"]
+            index.vectors = data["vectors"]
+            index.offsets = data["offsets"]
+        index.alive = np.ones(len(index.ids), dtype=bool)
+        index._reindex()
+
+        for key, vector in read_delta_log(path):
+            if vector is None:
+                index.remove(key)
+            else:
+                index.upsert(key, vector)
+        return index
+
+    def compact(self):
+        """Fold pending vectors into their nearest clusters, drop tombstones."""
+        if not self.pending and self.alive.all():
+            return
+        ids = self.ids[self.alive]
+        vecs = self.vectors[self.alive]
+        if self.pending:
+            ids = np.concatenate([ids, np.fromiter(self.pending.keys(), dtype=np.int64)])
+            vecs = np.concatenate([vecs, np.stack(list(self.pending.values()))])
+
+        if self.nlist == 0:
+            rebuilt = IVFIndex.build(ids, vecs, nprobe=self.nprobe)
+            self.__dict__.update(rebuilt.__dict__)
+            return
+
+        labels = _assign(vecs, self.centroids)
+        order = np.argsort(labels, kind="stable")
+        self.ids = ids[order]
+        self.vectors = np.ascontiguousarray(vecs[order])
+        self.offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(labels, minlength=self.nlist))]
+        ).astype(np.int64)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self.pending = {}
+        self._reindex()
+
+
+# -------------------------------------------------------
+# DELTA LOG (incremental updates)
+# -------------------------------------------------------
+# record = int64 face template id + float32[512]; an all-zero vector = removal
+
+_RECORD = np.dtype([("id", "<i8"), ("vec", "<f4", (EMBEDDING_DIM,))])
+
+
+def _delta_path(index_path):
+    return index_path + ".delta"
+
+
+def append_delta(key, vector, path=ANN_INDEX_PATH):
+    """
+    Record one gallery change. No-op when no index has been persisted yet
+    (the next build picks the change up from the DB anyway).
+    """
+    append_deltas([(key, vector)], path)
+
+
+def append_deltas(changes, path=ANN_INDEX_PATH):
+    """Record many (key, vector or None = removed) changes with one write."""
+    if not os.path.exists(path) or not changes:
+        return
+    recs = np.zeros(len(changes), dtype=_RECORD)
+    for rec, (key, vector) in zip(recs, changes):
+        rec["id"] = int(key)
+        if vector is not None:
+            rec["vec"] = np.asarray(vector, dtype=np.float32).reshape(-1)
+    with open(_delta_path(path), "ab") as f:
+        f.write(recs.tobytes())
+
+
+def read_delta_log(path=ANN_INDEX_PATH):
+    """Yield (key, vector or None) from the delta log, oldest first."""
+    delta = _delta_path(path)
+    if not os.path.exists(delta):
+        return
+    with open(delta, "rb") as f:
+        raw = f.read()
+    usable = len(raw) - len(raw) % _RECORD.itemsize   # ignore a torn last write
+    for rec in np.frombuffer(raw[:usable], dtype=_RECORD):
+        vec = rec["vec"]
+        yield int(rec["id"]), (None if not vec.any() else vec.copy())
+
+
+# -------------------------------------------------------
+# GALLERY INTEGRATION
+# -------------------------------------------------------
+
+def load_or_build_index(gallery, path=ANN_INDEX_PATH):
+    """
+    Persisted index for this gallery; rebuilt (and saved) when missing or
+    out of sync with the face templates.
+    """
+    index = None
+    try:
+        index = IVFIndex.load(path)
+    except (OSError, ValueError, KeyError):
+        index = None
+
+    if index is None or index.id_set() != set(gallery.keys):
+        index = IVFIndex.build(gallery.keys, gallery.matrix)
+        index.save(path)
+    elif len(index.pending) > max(1000, len(gallery) // 10):
+        index.save(path)   # fold a long delta log back into the snapshot
+    return index
@@ -10,18 +10,25 @@ import pandas as pd
 
 sns.set_style("whitegrid")
 
-from config import APP_TITLE
+import metrics
+from config import (
+    APP_TITLE,
+    BURST_FRAMES,
+    BURST_INTERVAL,
+    CAMERA_SOURCE,
+    FACE_TEMPLATES_MAX,
+    GALLERY_SCOPE_FALLBACK,
+)
 from db import (
     init_db,
     create_student,
     get_students,
     get_student_by_username,
     update_student,
-    delete_student,
     update_attendance_status,
     delete_attendance_record,
     delete_all_attendance,
-    clear_all_face_encodings,
+    get_class_sections,
 )
 from auth import (
     init_session_state,
@@ -32,13 +39,15 @@ from auth import (
     require_role,
 )
 from face_utils import (
-    encode_single_face_from_frame,
     save_student_face_encoding,
-    load_known_face_encodings,
-    recognize_faces_in_frame,
+    load_face_gallery,
     draw_face_boxes,
     mark_attendance_from_results,
 )
+from face_templates import compact_all_templates, remove_student, clear_all_templates
+from inference_service import get_inference_service, apply_warmup_policy
+from streaming import StreamPipeline, open_source
+from liveness import LivenessStage
 from attendance_utils import (
     mark_manual_attendance,
     attendance_to_dataframe,
@@ -60,35 +69,6 @@ from multirole import get_allowed_pages_for_role
 # GLOBALS / HELPERS
 # ============================================================
 
-MOTION_LIVENESS_THRESHOLD = 7.0  # simple motion-based liveness
-
-
-def compute_motion_score(prev_gray, curr_gray, location):
-    """Very simple anti-spoof: mean abs diff in face ROI."""
-    if prev_gray is None or curr_gray is None:
-        return 0.0
-
-    top, right, bottom, left = location
-    h, w = curr_gray.shape[:2]
-
-    top = max(0, top)
-    left = max(0, left)
-    bottom = min(h, bottom)
-    right = min(w, right)
-
-    if bottom <= top or right <= left:
-        return 0.0
-
-    roi_curr = curr_gray[top:bottom, left:right]
-    roi_prev = prev_gray[top:bottom, left:right]
-
-    if roi_curr.size == 0 or roi_prev.size == 0:
-        return 0.0
-
-    diff = cv2.absdiff(roi_curr, roi_prev)
-    return float(np.mean(diff))
-
-
 if "current_page" not in st.session_state:
     st.session_state["current_page"] = "Login / Signup"
 
@@ -185,6 +165,9 @@ def main():
 
     init_session_state()
 
+    # face model / inference workers load lazily; optionally warm up without blocking
+    apply_warmup_policy()
+
     user = st.session_state.get("user")
 
     # Top hero header (like marketing page)
@@ -611,7 +594,7 @@ def register_student_page():
     if img:
         data = np.frombuffer(img.read(), np.uint8)
         frame = cv2.imdecode(data, 1)
-        enc = encode_single_face_from_frame(frame)
+        enc = get_inference_service().encode(frame)
         if enc is None:
             st.error("No face detected.")
         else:
@@ -625,12 +608,22 @@ def train_encodings_page():
     st.markdown('<div class="white-card">', unsafe_allow_html=True)
     st.subheader("🧠 Train / Load Face Encodings")
 
-    if st.button("Load Encodings"):
-        ids, names, encs = load_known_face_encodings()
-        st.session_state["known_ids"] = ids
-        st.session_state["known_names"] = names
-        st.session_state["known_encodings"] = encs
-        st.success(f"Loaded {len(ids)} encodings.")
+    # new / changed students are applied incrementally; "Rebuild" re-reads everything
+    c1, c2 = st.columns(2)
+    if c1.button("Load Encodings"):
+        gallery = load_face_gallery()
+        st.success(f"Loaded {len(gallery)} face templates of {len(set(gallery.ids))} students.")
+    if c2.button("Rebuild From Database"):
+        gallery = load_face_gallery(force=True)
+        st.success(f"Rebuilt {len(gallery)} face templates of {len(set(gallery.ids))} students.")
+
+    st.caption(
+        f"Each face capture is kept as a template (up to {FACE_TEMPLATES_MAX} per student); "
+        "compaction merges the most similar templates of students above that cap."
+    )
+    if st.button("Compact Templates"):
+        n = compact_all_templates()
+        st.success(f"Compacted templates of {n} students.")
     st.markdown("</div>", unsafe_allow_html=True)
 
 
@@ -665,17 +658,13 @@ def auto_register_unknown_face_ui():
             if not success or sid_db is None:
                 st.error("Could not create student. Maybe roll no already exists.")
             else:
-                emb = encode_single_face_from_frame(face_img)
+                emb = get_inference_service().encode(face_img)
                 if emb is None:
                     st.error("Could not extract face embedding from captured face.")
                 else:
                     save_student_face_encoding(sid_db, emb)
                     st.success(f"Student {name} registered and face saved ✅")
                     st.session_state["pending_unknown_face"] = None
-                    ids, names, encs = load_known_face_encodings()
-                    st.session_state["known_ids"] = ids
-                    st.session_state["known_names"] = names
-                    st.session_state["known_encodings"] = encs
     st.markdown("</div>", unsafe_allow_html=True)
 
 
@@ -688,18 +677,19 @@ def mark_attendance_camera_page():
     Auto-capture based attendance:
     - NO continuous video loop (so no freezing)
     - On button click: capture short burst of frames
-    - Use last frame to recognise faces
+    - Detect faces in every burst frame, recognise the sharpest crop per person
+    - Match against the chosen class / section first (camera_scope_picker)
     - Mark attendance, show logs, done
+    "Continuous stream" mode runs streaming.StreamPipeline instead.
     """
     require_role(["admin", "teacher", "supervisor"])
     st.subheader("📸 Auto-Capture Attendance (Single Snapshot)")
 
-    known_ids = st.session_state.get("known_ids", [])
-    known_encs = st.session_state.get("known_encodings", [])
-    known_names = st.session_state.get("known_names", [])
+    # shared, memory-mapped gallery - refreshes itself when encodings change
+    gallery = load_face_gallery()
 
-    if not known_encs:
-        st.warning("Please load face encodings first from 'Train / Load Encodings'.")
+    if not gallery:
+        st.warning("No face encodings found. Register student faces first from 'Register Student & Capture Face'.")
         return
 
     if "marked_today" not in st.session_state:
@@ -707,6 +697,13 @@ def mark_attendance_camera_page():
     if "pending_unknown_face" not in st.session_state:
         st.session_state.pending_unknown_face = None
 
+    scope = camera_scope_picker()
+
+    mode = st.radio("Mode", ["Snapshot", "Continuous stream"], horizontal=True)
+    if mode == "Continuous stream":
+        stream_attendance_ui(scope)
+        return
+
     # If previous capture had unknown face, ask to register first
     if st.session_state.pending_unknown_face is not None:
         auto_register_unknown_face_ui()
@@ -726,19 +723,20 @@ def mark_attendance_camera_page():
 
     if st.button("Capture & Mark Attendance"):
         # ---- 1) Open camera and grab a short burst ----
-        cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+        cap = open_source(CAMERA_SOURCE)
         if not cap.isOpened():
             st.error("Could not open camera. Please check your webcam.")
             st.markdown("</div>", unsafe_allow_html=True)
             return
 
         frames = []
-        for _ in range(5):
-            ret, frame = cap.read()
+        for _ in range(BURST_FRAMES):
+            with metrics.timer("camera_grab"):
+                ret, frame = cap.read()
             if not ret or frame is None:
                 continue
             frames.append(frame.copy())
-            time.sleep(0.15)
+            time.sleep(BURST_INTERVAL)
 
         cap.release()
 
@@ -748,20 +746,19 @@ def mark_attendance_camera_page():
             return
 
         frame = frames[-1]
-        first_gray = cv2.cvtColor(frames[0], cv2.COLOR_BGR2GRAY) if len(frames) > 1 else None
-        last_gray = cv2.cvtColor(frames[-1], cv2.COLOR_BGR2GRAY)
 
-        # ---- 2) Recognise faces ----
-        results = recognize_faces_in_frame(frame, known_encs, known_ids, known_names)
+        # ---- 2) Recognise faces across the burst (inference worker pool) ----
+        results = get_inference_service().recognize_burst(frames, scope)
+        blurry = [r for r in results if r.get("skipped")]
+        results = [r for r in results if not r.get("skipped")]
 
-        for r in results:
-            if first_gray is not None:
-                score = compute_motion_score(first_gray, last_gray, r["location"])
-                r["motion_score"] = score
-                r["is_live"] = score >= MOTION_LIVENESS_THRESHOLD
-            else:
-                r["motion_score"] = 0.0
-                r["is_live"] = True
+        # ---- liveness for all faces at once (one optical flow per burst) ----
+        liveness = LivenessStage()
+        live, failed, stats = liveness(frames, [r["location"] for r in results])
+        for i, r in enumerate(results):
+            r["is_live"] = bool(live[i])
+            r["liveness_failed"] = failed[i]
+            r["liveness"] = {name: float(values[i]) for name, values in stats.items()}
 
         live_known_faces = [r for r in results if r["student_id"] is not None and r["is_live"]]
         spoof_suspects = [r for r in results if r["student_id"] is not None and not r["is_live"]]
@@ -781,11 +778,22 @@ def mark_attendance_camera_page():
         else:
             logs.append("ℹ️ No known (registered) faces detected in this snapshot.")
 
-        # ---- 4) Spoof suspects (very low motion) ----
+        if blurry:
+            logs.append(f"ℹ️ {len(blurry)} face(s) too blurry in every frame - not recognised.")
+        for r in live_known_faces:
+            if r.get("visiting"):
+                logs.append(f"ℹ️ {r['name']} is visiting from another class.")
+
+        # ---- 4) Spoof suspects (failed a liveness check) ----
         for r in spoof_suspects:
             logs.append(
                 f"⚠️ Spoof suspected for {r['name']} "
-                f"(very low motion: {r['motion_score']:.1f}). Attendance not marked."
+                f"(failed: {', '.join(r['liveness_failed'])}). Attendance not marked."
+            )
+        if results:
+            logs.append(
+                f"ℹ️ Liveness: {liveness.last_ms_per_frame:.1f} ms/frame over "
+                f"{len(frames)} frame(s), {len(results)} face(s)."
             )
 
         # ---- 5) Auto-register unknown live face (largest face) ----
@@ -835,6 +843,89 @@ def mark_attendance_camera_page():
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+def camera_scope_picker():
+    """
+    Class / section whose students are matched first (a cached gallery
+    partition: faster, and no false matches against other classes).
+    Returns (class, section, fallback) or None for the whole school.
+    """
+    pairs = get_class_sections()
+    classes = sorted({c for c, _ in pairs})
+
+    c1, c2, c3 = st.columns([1, 1, 2])
+    cls = c1.selectbox("Class", ["All classes"] + classes)
+    if cls == "All classes":
+        return None
+    sections = sorted({s for c, s in pairs if c == cls and s})
+    sec = c2.selectbox("Section", ["All sections"] + sections)
+    fallback = c3.checkbox(
+        "Also recognise students from other classes (visiting)",
+        value=GALLERY_SCOPE_FALLBACK,
+    )
+    return (cls, None if sec == "All sections" else sec, fallback)
+
+
+def stream_attendance_ui(scope=None):
+    """
+    Continuous attendance over CAMERA_SOURCE (or any URL / file) using the
+    background pipeline in streaming.py. The page only polls its status, so
+    Stop stays responsive while frames are being processed.
+    """
+    st.markdown('<div class="white-card">', unsafe_allow_html=True)
+    source = st.text_input("Video source (camera index, RTSP URL or file path)", value=CAMERA_SOURCE)
+
+    pipeline = st.session_state.get("stream_pipeline")
+    running = pipeline is not None and pipeline.running
+
+    c1, c2 = st.columns(2)
+    if c1.button("Start stream", disabled=running):
+        pipeline = StreamPipeline(source, user_id=st.session_state["user"]["id"], scope=scope)
+        if not pipeline.start():
+            st.error(pipeline.error)
+        st.session_state["stream_pipeline"] = pipeline
+        running = pipeline.running
+    if c2.button("Stop stream", disabled=not running):
+        pipeline.stop()
+        pipeline.wait(timeout=5)
+        running = False
+
+    if pipeline is None:
+        st.info("Press **Start stream** to mark attendance continuously from the video source.")
+        st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    metrics_box = st.empty()
+    frame_box = st.empty()
+    log_box = st.empty()
+
+    while True:
+        status = pipeline.status()
+        with metrics_box.container():
+            m1, m2, m3, m4, m5 = st.columns(5)
+            m1.metric("State", status["state"])
+            m2.metric("FPS", f"{status['fps']:.1f}")
+            m3.metric("Latency p95", f"{status['latency_p95_ms']:.0f} ms")
+            m4.metric("Dropped", status["dropped"])
+            m5.metric("Marked", status["marked"])
+            if status["error"]:
+                st.error(status["error"])
+
+        if status["latest"] is not None:
+            frame, results = status["latest"]
+            frame_render = draw_face_boxes(frame.copy(), results)
+            frame_box.image(cv2.cvtColor(frame_render, cv2.COLOR_BGR2RGB), channels="RGB")
+
+        with log_box.container():
+            for line in reversed(status["log"][-10:]):
+                st.info(line)
+
+        if not pipeline.running:
+            break
+        time.sleep(0.5)
+
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
 # ============================================================
 # MANUAL ATTENDANCE + REPORTS
 # ============================================================
@@ -968,7 +1059,7 @@ def student_management_page():
                     key=f"chk_{s['id']}",
                     value=False,
                 )
-                delete_student(s["id"], delete_attendance=delete_att)
+                remove_student(s["id"], delete_attendance=delete_att)
                 st.warning("Student deleted.")
                 st.rerun()
 
@@ -1032,27 +1123,66 @@ def live_admin_monitor_page():
     df = get_attendance_dataframe()
     if df.empty:
         st.info("No attendance data yet.")
-        st.markdown("</div>", unsafe_allow_html=True)
-        return
+    else:
+        today = datetime.now().strftime("%Y-%m-%d")
+        today_df = df[df["date"] == today]
 
-    today = datetime.now().strftime("%Y-%m-%d")
-    today_df = df[df["date"] == today]
+        total_classes = today_df["class"].nunique()
+        total_present = (today_df["status"] == "Present").sum()
+        total_absent = (today_df["status"] == "Absent").sum()
 
-    total_classes = today_df["class"].nunique()
-    total_present = (today_df["status"] == "Present").sum()
-    total_absent = (today_df["status"] == "Absent").sum()
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Classes Today", total_classes)
+        c2.metric("Present Today", total_present)
+        c3.metric("Absent Records Today", total_absent)
 
-    c1, c2, c3 = st.columns(3)
-    c1.metric("Classes Today", total_classes)
-    c2.metric("Present Today", total_present)
-    c3.metric("Absent Records Today", total_absent)
+        section_divider()
+        st.markdown("#### Latest 20 Attendance Events (Today)")
+        st.dataframe(today_df.head(20))
 
     section_divider()
-    st.markdown("#### Latest 20 Attendance Events (Today)")
-    st.dataframe(today_df.head(20))
+    pipeline_timings_panel()
     st.markdown("</div>", unsafe_allow_html=True)
 
 
+def pipeline_timings_panel():
+    """Per-stage latency percentiles from metrics.py (this server process)."""
+    st.markdown("#### ⏱ Recognition Pipeline Timings")
+
+    collecting = any(getattr(s, "name", None) == "memory" for s in metrics.sinks())
+    on = st.checkbox("Collect stage timings", value=collecting)
+    if on and not collecting:
+        metrics.add_sink("memory")
+    elif not on and collecting:
+        metrics.remove_sink("memory")
+
+    snap = metrics.snapshot()
+    if not snap["stages"]:
+        st.info("No timings yet. Turn collection on and capture from the camera or stream pages.")
+        return
+
+    counters = snap["counters"]
+    detected = counters.get("faces_detected", 0)
+    matched = counters.get("faces_matched", 0)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Faces Detected", detected)
+    c2.metric("Faces Matched", matched)
+    c3.metric("Match Rate", f"{matched / detected * 100:.0f}%" if detected else "-")
+
+    table = pd.DataFrame(snap["stages"]).rename(columns={
+        "stage": "Stage", "count": "Calls", "mean_ms": "Mean ms",
+        "p50_ms": "p50 ms", "p95_ms": "p95 ms", "p99_ms": "p99 ms", "max_ms": "Max ms",
+    })
+    st.dataframe(table.round(2))
+    st.caption(
+        "Percentiles over the latest samples of each stage, since "
+        f"{datetime.fromtimestamp(snap['since']).strftime('%H:%M:%S')}."
+    )
+    if st.button("Reset Timings"):
+        metrics.reset()
+        st.rerun()
+
+
 def insights_alerts_page():
     require_role(["admin", "principal"])
     st.markdown('<div class="white-card">', unsafe_allow_html=True)
@@ -1134,10 +1264,7 @@ def database_control_center_page():
                 st.success("All attendance records deleted successfully.")
         with c2:
             if st.button("🧹 Clear ALL Face Encodings"):
-                clear_all_face_encodings()
-                st.session_state["known_ids"] = []
-                st.session_state["known_names"] = []
-                st.session_state["known_encodings"] = []
+                clear_all_templates()
                 st.success("All face encodings cleared. Please re-register faces.")
         st.markdown("</div>", unsafe_allow_html=True)
 
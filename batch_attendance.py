@@ -0,0 +1,268 @@
+# batch_attendance.py
+"""
+Offline Batch Attendance (CLI)
+------------------------------
+Processes a directory of classroom photos / videos without the UI:
+
+    python batch_attendance.py                      # DATASET_DIR, dry run
+    python batch_attendance.py photos/ --commit --marked-by 1
+    python batch_attendance.py photos/ --date 2024-07-01 --report report.csv
+
+- files are decoded AND recognised in worker processes (InferenceService),
+  so only paths travel to the workers and every core is used
+- videos are sampled every BATCH_VIDEO_SAMPLE_SECONDS
+- the attendance date / time of a file is its modification time unless
+  --date is given
+- every finished file is appended to a checkpoint (JSON lines); a rerun
+  skips files already in it (same path, size and mtime), so a large
+  backlog can be stopped and resumed. Files that failed are retried.
+- without --commit nothing is written: a dry-run report lists who would be
+  marked; with --commit all rows go in one transaction
+  (db.bulk_insert_attendance, one row per student per date)
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import as_completed
+from datetime import datetime
+
+import cv2
+
+from config import (
+    DATASET_DIR,
+    BATCH_IMAGE_EXTENSIONS,
+    BATCH_VIDEO_EXTENSIONS,
+    BATCH_VIDEO_SAMPLE_SECONDS,
+    BATCH_CHECKPOINT_NAME,
+)
+
+
+# -------------------------------------------------------
+# FILES
+# -------------------------------------------------------
+
+def find_media(root):
+    """Sorted image / video paths under root (recursive)."""
+    exts = BATCH_IMAGE_EXTENSIONS + BATCH_VIDEO_EXTENSIONS
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if os.path.splitext(name)[1].lower() in exts:
+                paths.append(os.path.join(dirpath, name))
+    return sorted(paths)
+
+
+def file_key(path):
+    st = os.stat(path)
+    return f"{os.path.abspath(path)}|{st.st_size}|{int(st.st_mtime)}"
+
+
+# -------------------------------------------------------
+# WORKER SIDE
+# -------------------------------------------------------
+
+def _video_frames(path, every_seconds=BATCH_VIDEO_SAMPLE_SECONDS):
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, int(round(fps * every_seconds)))
+    index = 0
+    try:
+        while True:
+            if not cap.grab():
+                break
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok and frame is not None:
+                    yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def recognize_file(path):
+    """
+    Decode one image / video and recognise everyone in it (runs in a
+    worker). Returns {"faces", "matches": [{student_id, name, distance}]}
+    with the best distance per student.
+    """
+    import face_utils
+
+    gallery = face_utils.load_face_gallery()
+    if os.path.splitext(path)[1].lower() in BATCH_VIDEO_EXTENSIONS:
+        frames = _video_frames(path)
+    else:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError("could not decode image")
+        frames = [frame]
+
+    faces = 0
+    best = {}
+    for frame in frames:
+        for r in face_utils.recognize_faces_in_frame(frame, gallery):
+            faces += 1
+            sid = r["student_id"]
+            if sid is None:
+                continue
+            if sid not in best or r["distance"] < best[sid]["distance"]:
+                best[sid] = {"student_id": sid, "name": r["name"], "distance": float(r["distance"])}
+
+    return {"faces": faces, "matches": sorted(best.values(), key=lambda m: m["distance"])}
+
+
+# -------------------------------------------------------
+# CHECKPOINT
+# -------------------------------------------------------
+
+def load_checkpoint(path):
+    """{file_key: entry} of files finished by earlier runs."""
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue   # half-written last line of an interrupted run
+            if not entry.get("error"):
+                done[entry["key"]] = entry
+    return done
+
+
+def append_checkpoint(f, entry):
+    f.write(json.dumps(entry) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+# -------------------------------------------------------
+# RUN
+# -------------------------------------------------------
+
+def process_directory(root, checkpoint_path, workers):
+    """
+    Recognise every new file under root; returns all checkpoint entries
+    (old + new) for files that are still present.
+    """
+    from inference_service import InferenceService
+
+    paths = find_media(root)
+    done = load_checkpoint(checkpoint_path)
+    keys = {p: file_key(p) for p in paths}
+    todo = [p for p in paths if keys[p] not in done]
+    print(f"{len(paths)} file(s), {len(paths) - len(todo)} already in checkpoint, "
+          f"{len(todo)} to process with {workers} worker(s)")
+
+    service = InferenceService(num_workers=workers)
+    t0 = time.perf_counter()
+    skipped = 0
+    try:
+        with open(checkpoint_path, "a", encoding="utf-8") as ckpt:
+            futures = {service.submit(p, "recognize_file"): p for p in todo}
+            for n, future in enumerate(as_completed(futures), 1):
+                path = futures[future]
+                try:
+                    taken = datetime.fromtimestamp(os.path.getmtime(path))
+                except OSError as e:
+                    # moved / deleted while queued: not checkpointed, so a rerun retries it
+                    print(f"  skipped {path}: {e}")
+                    skipped += 1
+                else:
+                    entry = {
+                        "key": keys[path],
+                        "path": path,
+                        "date": taken.strftime("%Y-%m-%d"),
+                        "time": taken.strftime("%H:%M:%S"),
+                    }
+                    try:
+                        entry.update(future.result())
+                    except Exception as e:
+                        entry.update(faces=0, matches=[], error=str(e))
+                    append_checkpoint(ckpt, entry)
+                    done[entry["key"]] = entry
+
+                if n % 50 == 0 or n == len(todo):
+                    rate = n / (time.perf_counter() - t0)
+                    print(f"  {n}/{len(todo)} files ({rate:.1f} files/s)")
+    finally:
+        service.shutdown()
+    if skipped:
+        print(f"{skipped} file(s) skipped (no longer readable)")
+
+    present = set(keys.values())
+    return [e for k, e in done.items() if k in present]
+
+
+def attendance_records(entries, marked_by=None, date=None):
+    """
+    One (student_id, date, time, status, marked_by) per student per date
+    (earliest time). `date` overrides the file dates.
+    """
+    first = {}
+    for e in entries:
+        day = date or e["date"]
+        for m in e.get("matches", []):
+            key = (m["student_id"], day)
+            if key not in first or e["time"] < first[key][2]:
+                first[key] = (m["student_id"], day, e["time"], "Present", marked_by)
+    return sorted(first.values(), key=lambda r: (r[1], r[2]))
+
+
+def write_report(path, entries):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["file", "date", "time", "faces", "recognised", "error"])
+        for e in sorted(entries, key=lambda e: e["path"]):
+            names = "; ".join(f"{m['name']} ({m['distance']:.2f})" for m in e.get("matches", []))
+            writer.writerow([e["path"], e["date"], e["time"], e.get("faces", 0), names, e.get("error", "")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mark attendance from a folder of photos / videos.")
+    parser.add_argument("directory", nargs="?", default=DATASET_DIR)
+    parser.add_argument("--commit", action="store_true", help="write attendance (default: dry run)")
+    parser.add_argument("--date", help="attendance date YYYY-MM-DD (default: file modification date)")
+    parser.add_argument("--marked-by", type=int, default=None, help="user id recorded as marker")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--checkpoint", help=f"default: <directory>/{BATCH_CHECKPOINT_NAME}")
+    parser.add_argument("--report", help="write a per-file CSV report here")
+    args = parser.parse_args()
+
+    from db import init_db, bulk_insert_attendance
+
+    init_db()
+    checkpoint = args.checkpoint or os.path.join(args.directory, BATCH_CHECKPOINT_NAME)
+    entries = process_directory(args.directory, checkpoint, args.workers)
+    records = attendance_records(entries, args.marked_by, args.date)
+
+    errors = [e for e in entries if e.get("error")]
+    faces = sum(e.get("faces", 0) for e in entries)
+    print(f"\n{len(entries)} file(s), {faces} face(s), {len(errors)} error(s), "
+          f"{len(records)} student-day(s) recognised")
+    for e in errors[:10]:
+        print(f"  ! {e['path']}: {e['error']}")
+
+    if args.report:
+        write_report(args.report, entries)
+        print(f"Report written to {args.report}")
+
+    if not args.commit:
+        by_date = {}
+        for r in records:
+            by_date[r[1]] = by_date.get(r[1], 0) + 1
+        for d, n in sorted(by_date.items()):
+            print(f"  {d}: {n} student(s) would be marked present")
+        print("Dry run - nothing written. Re-run with --commit to save attendance.")
+        return
+
+    inserted = bulk_insert_attendance(records)
+    print(f"Marked {len(inserted)} attendance row(s); "
+          f"{len(records) - len(inserted)} already present.")
+
+
+if __name__ == "__main__":
+    main()
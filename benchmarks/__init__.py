@@ -0,0 +1,6 @@
+# benchmarks/__init__.py
+"""
+Performance benchmarks. Run from the project root, e.g.:
+
+    python -m benchmarks.bench_gallery_matching
+"""
@@ -0,0 +1,55 @@
+# benchmarks/bench_ann_index.py
+"""
+IVF index recall / latency trade-off vs. exact FaceGallery search.
+
+For each nprobe value, reports the share of queries whose top-1 id matches
+exact search (recall@1) and the per-frame search time.
+
+    python -m benchmarks.bench_ann_index --gallery 50000 --nprobe 1 4 8 16 32
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IVFIndex
+from benchmarks.common import time_call, synthetic_embeddings, noisy_queries, print_table
+from gallery import FaceGallery
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--gallery", type=int, default=50_000)
+    parser.add_argument("--faces", type=int, default=40, help="queries per frame")
+    parser.add_argument("--nlist", type=int, default=0, help="0 = sqrt(gallery)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    embs = synthetic_embeddings(args.gallery)
+    ids = np.arange(1, args.gallery + 1)
+    queries, _ = noisy_queries(embs, args.faces)
+
+    gallery = FaceGallery(ids, ids.astype(str), embs, normalized=True)
+    exact_idx, _ = gallery.search(queries)
+    exact_ids = ids[exact_idx]
+    _, exact_t = time_call(lambda: gallery.search(queries))
+
+    t0 = time.perf_counter()
+    index = IVFIndex.build(ids, embs, nlist=args.nlist)
+    build_s = time.perf_counter() - t0
+    print(f"gallery={args.gallery} nlist={index.nlist} build={build_s:.2f}s "
+          f"exact={exact_t * 1e3:.2f} ms/frame\n")
+
+    rows = []
+    for nprobe in args.nprobe:
+        got, _ = index.search(queries, k=1, nprobe=nprobe)
+        recall = float(np.mean(got[:, 0] == exact_ids))
+        _, t = time_call(lambda: index.search(queries, k=1, nprobe=nprobe))
+        rows.append([nprobe, f"{recall:.3f}", f"{t * 1e3:.2f}", f"{exact_t / t:.1f}x"])
+
+    print_table(["nprobe", "recall@1", "ms/frame", "vs exact"], rows)
+
+
+if __name__ == "__main__":
+    main()
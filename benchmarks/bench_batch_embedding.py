@@ -0,0 +1,51 @@
+# benchmarks/bench_batch_embedding.py
+"""
+Recognizer time per frame: one ONNX call per face vs. one batched call.
+
+Feeds N aligned 112x112 crops (content does not affect ONNX cost) through
+the ArcFace recognizer, either face by face (the old FaceAnalysis.get path)
+or as one NCHW batch via face_utils.embed_aligned_faces.
+Needs the InsightFace model files.
+
+    python -m benchmarks.bench_batch_embedding --faces 1 5 10 20 40
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import time_call, print_table
+from face_model import get_face_app
+from face_utils import embed_aligned_faces
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, nargs="+", default=[1, 5, 10, 20, 40])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rec = get_face_app().models["recognition"]
+    size = rec.input_size[0]
+    rng = np.random.default_rng(0)
+
+    rows = []
+    for n in args.faces:
+        crops = [rng.integers(0, 255, (size, size, 3), dtype=np.uint8) for _ in range(n)]
+
+        _, loop_t = time_call(lambda: [rec.get_feat(c) for c in crops], repeat=args.repeat)
+        _, batch_t = time_call(lambda: embed_aligned_faces(crops), repeat=args.repeat)
+
+        rows.append([
+            n,
+            f"{loop_t * 1e3:.1f}",
+            f"{batch_t * 1e3:.1f}",
+            f"{batch_t / n * 1e3:.2f}",
+            f"{loop_t / batch_t:.2f}x",
+        ])
+
+    print_table(["faces", "per-face ms", "batched ms", "ms/face", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
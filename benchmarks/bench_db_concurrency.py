@@ -0,0 +1,202 @@
+# benchmarks/bench_db_concurrency.py
+"""
+SQLite under concurrent sessions: readers + writers, per journal setup.
+
+Copies the attendance DB (default: DB_PATH, i.e. attendance_system.db) to
+a temporary file - the original is never written - seeds it with students
+and attendance rows, then runs N reader and M writer workers for a fixed
+time and reports reads/s, writes/s, p95 write latency and "database is
+locked" errors, for each profile:
+
+- legacy: rollback journal, no PRAGMAs, a new connection per call
+  (how db.py ran before the pool / WAL settings)
+- tuned:  DB_JOURNAL_MODE + DB_PRAGMAS + pooled connections from config.py
+
+Readers run the attendance report query and the student list (like admins
+on the report pages); writers mark attendance with insert_attendance_once
+and edit statuses (like teachers on the camera / manual pages). Workers
+are threads by default (Streamlit sessions share one server process);
+--processes runs them as separate processes. Does not need the ONNX model.
+
+    python -m benchmarks.bench_db_concurrency --readers 8 --writers 4 --seconds 10
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+
+import numpy as np
+
+import db
+from benchmarks.common import print_table
+from config import DB_PATH, DB_POOL_SIZE, DB_PRAGMAS, DB_JOURNAL_MODE
+
+PROFILES = {
+    "legacy": {"journal_mode": "DELETE", "pragmas": {}, "pool_size": 0},
+    "tuned": {"journal_mode": DB_JOURNAL_MODE, "pragmas": DB_PRAGMAS, "pool_size": DB_POOL_SIZE},
+}
+
+
+def _is_lock_error(e):
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def use_profile(path, profile):
+    """Point db.py at `path` with the profile's pool (in this process)."""
+    db.DB_PATH = path
+    old = db._pools.pop(path, None)
+    if old is not None:
+        old.close_all()
+    db._pools[path] = db.ConnectionPool(path, profile["pool_size"], profile["pragmas"])
+
+
+def prepare_db(source, path, students, rows, journal_mode):
+    """Copy of `source` with at least `students` students and `rows` attendance rows."""
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(path)
+    src.backup(dst)
+    src.close()
+    dst.close()
+    use_profile(path, PROFILES["legacy"])
+    db.init_db()
+
+    conn = sqlite3.connect(path)
+    have = conn.execute("SELECT COUNT(*) FROM students").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO students (student_id, name, class, section) VALUES (?, ?, ?, ?)",
+        [(f"STRESS{i}", f"Student {i}", str(i % 12 + 1), "ABCD"[i % 4]) for i in range(max(0, students - have))],
+    )
+    pks = [r[0] for r in conn.execute("SELECT id FROM students")]
+    day0 = date(2001, 1, 1).toordinal()
+    conn.executemany(
+        "INSERT INTO attendance (student_id, date, time, status, marked_by) VALUES (?, ?, ?, ?, ?)",
+        [(pks[i % len(pks)], date.fromordinal(day0 + i // len(pks)).isoformat(), "09:00:00", "Present", 1)
+         for i in range(rows)],
+    )
+    conn.commit()
+    mode = conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+    conn.close()
+    return pks, mode
+
+
+# -------------------------------------------------------
+# WORKERS
+# -------------------------------------------------------
+
+def worker(role, worker_id, path, profile, pks, seconds, start_at):
+    """Runs in a thread or a process; returns counters + write latencies."""
+    if db.DB_PATH != path or path not in db._pools:
+        use_profile(path, profile)
+
+    rng = random.Random(worker_id)
+    day = date(2040, 1, 1).toordinal() + worker_id * 10_000
+    ops, errors, latencies = 0, 0, []
+
+    time.sleep(max(0.0, start_at - time.time()))
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        t0 = time.perf_counter()
+        try:
+            if role == "reader":
+                if rng.random() < 0.5:
+                    db.get_all_attendance_records()
+                else:
+                    db.get_students()
+            elif rng.random() < 0.8:
+                db.insert_attendance_once(
+                    rng.choice(pks), date.fromordinal(day + ops // len(pks)).isoformat(),
+                    "10:00:00", "Present", worker_id,
+                )
+            else:
+                db.update_attendance_status(rng.randint(1, 1000), rng.choice(["Present", "Absent"]))
+        except sqlite3.OperationalError as e:
+            if not _is_lock_error(e):
+                raise
+            errors += 1
+            continue
+        ops += 1
+        if role == "writer":
+            latencies.append(time.perf_counter() - t0)
+    return {"role": role, "ops": ops, "errors": errors, "latencies": latencies}
+
+
+def run_profile(name, args, tmpdir):
+    profile = PROFILES[name]
+    path = os.path.join(tmpdir, f"{name}.db")
+    pks, mode = prepare_db(args.db, path, args.students, args.rows, profile["journal_mode"])
+    use_profile(path, profile)
+
+    roles = ["reader"] * args.readers + ["writer"] * args.writers
+    start_at = time.time() + (3.0 if args.processes else 0.2)
+    if args.processes:
+        executor = ProcessPoolExecutor(len(roles), mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(len(roles))
+    with executor:
+        futures = [
+            executor.submit(worker, role, i, path, profile, pks, args.seconds, start_at)
+            for i, role in enumerate(roles)
+        ]
+        results = [f.result() for f in futures]
+
+    reads = [r for r in results if r["role"] == "reader"]
+    writes = [r for r in results if r["role"] == "writer"]
+    latencies = np.array([t for r in writes for t in r["latencies"]]) * 1e3
+    return {
+        "profile": name,
+        "journal_mode": mode,
+        "readers": args.readers,
+        "writers": args.writers,
+        "reads_per_s": sum(r["ops"] for r in reads) / args.seconds,
+        "writes_per_s": sum(r["ops"] for r in writes) / args.seconds,
+        "write_p95_ms": float(np.percentile(latencies, 95)) if latencies.size else 0.0,
+        "read_lock_errors": sum(r["errors"] for r in reads),
+        "write_lock_errors": sum(r["errors"] for r in writes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--db", default=DB_PATH, help="DB to copy (never modified)")
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=20_000, help="attendance rows seeded before the run")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--processes", action="store_true", help="workers as processes, not threads")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_db_concurrency_")
+    try:
+        results = [run_profile(name, args, tmpdir) for name in args.profiles]
+    finally:
+        for pool in db._pools.values():
+            pool.close_all()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print_table(
+        ["profile", "journal", "readers", "writers", "reads/s", "writes/s", "write p95 ms",
+         "read lock errors", "write lock errors"],
+        [[r["profile"], r["journal_mode"], r["readers"], r["writers"], f"{r['reads_per_s']:.0f}",
+          f"{r['writes_per_s']:.0f}", f"{r['write_p95_ms']:.1f}", r["read_lock_errors"],
+          r["write_lock_errors"]] for r in results],
+    )
+
+
+if __name__ == "__main__":
+    main()
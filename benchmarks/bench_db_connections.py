@@ -0,0 +1,143 @@
+# benchmarks/bench_db_connections.py
+"""
+SQLite attendance write path: a new connection per call vs. the pool.
+
+Times single operations on a temporary DB, first with a fresh
+sqlite3.connect for every call (DB_POOL_SIZE=0, no PRAGMAs - the old
+get_connection) and then with pooled connections:
+
+- get_connection + close
+- has_attendance_for_date / insert_attendance
+- old camera path per face (has_attendance_for_date + insert_attendance)
+- insert_attendance_once (check + insert in one transaction)
+- mark_attendance_from_results, per face
+
+Does not need the ONNX model.
+
+    python -m benchmarks.bench_db_connections --ops 2000
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import date
+
+import db
+from benchmarks.common import print_table
+from config import DB_POOL_SIZE
+
+
+def per_op(fn, ops):
+    """Mean microseconds per fn(i) over i = 0 .. ops-1 (after a short warm-up)."""
+    for i in range(min(20, ops)):
+        fn(-1 - i)
+    t0 = time.perf_counter()
+    for i in range(ops):
+        fn(i)
+    return (time.perf_counter() - t0) / ops * 1e6
+
+
+def run(pks, ops, pooled):
+    from face_utils import mark_attendance_from_results
+
+    path = db.DB_PATH
+    old = db._pools.pop(path, None)
+    if old is not None:
+        old.close_all()
+    db._pools[path] = db.ConnectionPool(path, DB_POOL_SIZE, None) if pooled \
+        else db.ConnectionPool(path, 0, {})
+
+    base = date(2000, 1, 1).toordinal() + (0 if pooled else 50_000)
+
+    def slot(i):
+        """A (student, date) pair no other op uses."""
+        return pks[i % len(pks)], date.fromordinal(base + 25_000 + i // len(pks)).isoformat()
+
+    def connect(i):
+        db.get_connection().close()
+
+    def has_row(i):
+        db.has_attendance_for_date(*slot(i))
+
+    def insert(i):
+        db.insert_attendance(*slot(i), "10:00:00", "Present", 1)
+
+    def old_camera_path(i):
+        sid, day = slot(i + ops)
+        if not db.has_attendance_for_date(sid, day):
+            db.insert_attendance(sid, day, "10:00:00", "Present", 1)
+
+    def insert_once(i):
+        db.insert_attendance_once(*slot(i + 2 * ops), "10:00:00", "Present", 1)
+
+    def clear():
+        conn = db.get_connection()
+        conn.execute("DELETE FROM attendance")
+        conn.commit()
+        conn.close()
+
+    results = {
+        "get_connection + close": per_op(connect, ops),
+        "has_attendance_for_date": per_op(has_row, ops),
+        "insert_attendance": per_op(insert, ops),
+        "has + insert (old camera path)": per_op(old_camera_path, ops),
+        "insert_attendance_once": per_op(insert_once, ops),
+    }
+
+    faces = 20
+    batch = [{"student_id": pk, "name": str(pk)} for pk in pks[:faces]]
+    timings = []
+    for _ in range(max(1, ops // (faces * 4))):
+        clear()
+        t0 = time.perf_counter()
+        mark_attendance_from_results(batch, 1, set())
+        timings.append(time.perf_counter() - t0)
+    results["mark_attendance_from_results (per face)"] = sorted(timings)[len(timings) // 2] / faces * 1e6
+    clear()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ops", type=int, default=1000, help="operations per measurement")
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_db_")
+    db.DB_PATH = os.path.join(tmpdir, "bench.db")
+    db.init_db()
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO students (student_id, name) VALUES (?, ?)",
+        [(f"R{i}", f"Student {i}") for i in range(args.students)],
+    )
+    conn.commit()
+    pks = [r[0] for r in conn.execute("SELECT id FROM students ORDER BY id")]
+    conn.close()
+
+    try:
+        per_call = run(pks, args.ops, pooled=False)
+        pooled = run(pks, args.ops, pooled=True)
+    finally:
+        db.get_pool().close_all()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"per_call_us": per_call, "pooled_us": pooled}, indent=2))
+        return
+
+    print_table(
+        ["operation", "connect per call us", "pooled us", "speedup"],
+        [[name, f"{per_call[name]:.0f}", f"{pooled[name]:.0f}", f"{per_call[name] / pooled[name]:.2f}x"]
+         for name in per_call],
+    )
+    print(f"\nold camera path (per call) -> insert_attendance_once (pooled): "
+          f"{per_call['has + insert (old camera path)'] / pooled['insert_attendance_once']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_embedding_storage.py
+"""
+Gallery load time and DB size: JSON text vs. binary BLOB embeddings.
+
+Builds a temporary SQLite DB with N students stored as legacy JSON, times a
+JSON gallery load, runs migrate_face_encodings_to_blob(), then times the
+binary load. Does not need the ONNX model.
+
+    python -m benchmarks.bench_embedding_storage --students 20000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import numpy as np
+
+import db
+from benchmarks.common import time_call, synthetic_embeddings, print_table
+from embedding_codec import decode_embeddings
+
+
+def load_json_gallery():
+    # the pre-BLOB loader: json.loads + np.array per row
+    encs = []
+    for r in db.get_all_students_with_encodings():
+        encs.append(np.array(json.loads(r["face_encoding"]), dtype="float32"))
+    return encs
+
+
+def load_blob_gallery():
+    rows = db.get_all_students_with_encodings()
+    return decode_embeddings([r["face_encoding"] for r in rows])
+
+
+def db_size(path):
+    conn = db.get_connection()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--students", type=int, default=20_000)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_storage_")
+    db.DB_PATH = os.path.join(tmpdir, "bench.db")
+    db.init_db()
+
+    embs = synthetic_embeddings(args.students)
+    conn = db.get_connection()
+    conn.executemany(
+        "INSERT INTO students (student_id, name, face_encoding) VALUES (?, ?, ?)",
+        [(f"R{i}", f"Student {i}", json.dumps(e.tolist())) for i, e in enumerate(embs)],
+    )
+    conn.commit()
+    conn.close()
+
+    json_size = db_size(db.DB_PATH)
+    _, json_t = time_call(load_json_gallery, repeat=3)
+
+    migrated = db.migrate_face_encodings_to_blob()
+    blob_size = db_size(db.DB_PATH)
+    _, blob_t = time_call(load_blob_gallery, repeat=3)
+
+    assert migrated == args.students
+    assert np.allclose(load_blob_gallery(), embs)
+
+    print_table(
+        ["format", "students", "load s", "db MB"],
+        [
+            ["json", args.students, f"{json_t:.3f}", f"{json_size / 2**20:.1f}"],
+            ["blob", args.students, f"{blob_t:.3f}", f"{blob_size / 2**20:.1f}"],
+        ],
+    )
+    print(f"\nload speedup {json_t / blob_t:.1f}x, size reduction {json_size / blob_size:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# benchmarks/bench_gallery_matching.py
+"""
+Gallery matching: per-pair Python loop vs. one matrix product.
+
+Compares the old recognize_faces_in_frame inner loop (cosine_distance for
+every face x known embedding) with FaceGallery.search for 100 .. 100k
+identities. Does not need the ONNX model.
+
+    python -m benchmarks.bench_gallery_matching --faces 40
+"""
+
+import argparse
+
+import numpy as np
+
+from benchmarks.common import time_call, synthetic_embeddings, noisy_queries, print_table
+from gallery import FaceGallery
+
+
+def cosine_distance(a, b):
+    # verbatim copy of the pre-vectorization helper in face_utils
+    a = np.array(a)
+    b = np.array(b)
+    if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
+        return 1.0
+    return 1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
+
+
+def loop_match(queries, known_encs):
+    out = []
+    for emb in queries:
+        best_dist = 10
+        best_idx = -1
+        for i, known_emb in enumerate(known_encs):
+            d = cosine_distance(known_emb, emb)
+            if d < best_dist:
+                best_dist = d
+                best_idx = i
+        out.append(best_idx)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=40, help="faces per frame")
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[100, 1_000, 3_000, 10_000, 100_000])
+    parser.add_argument("--loop-max", type=int, default=3_000,
+                        help="skip the (slow) loop baseline above this gallery size")
+    args = parser.parse_args()
+
+    rows = []
+    for n in args.sizes:
+        embs = synthetic_embeddings(n)
+        queries, truth = noisy_queries(embs, args.faces)
+        known_encs = list(embs)
+        gallery = FaceGallery(list(range(n)), [str(i) for i in range(n)], known_encs)
+
+        _, vec_t = time_call(lambda: gallery.search(queries), repeat=5)
+        vec_idx, _ = gallery.search(queries)
+        assert np.array_equal(vec_idx, truth), "vectorized search lost a match"
+
+        if n <= args.loop_max:
+            _, loop_t = time_call(lambda: loop_match(queries, known_encs), repeat=1, warmup=0)
+            loop_ms = f"{loop_t * 1e3:.1f}"
+            speedup = f"{loop_t / vec_t:.0f}x"
+        else:
+            loop_ms, speedup = "-", "-"
+
+        rows.append([n, args.faces, loop_ms, f"{vec_t * 1e3:.2f}", speedup])
+
+    print_table(["gallery", "faces", "loop ms", "matrix ms", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/bench_model_modules.py
+"""
+Per-frame and per-face latency for model pack / module selections.
+
+Runs FaceAnalysis.get on one image for:
+- all heads of the pack (detection, recognition, landmarks, genderage)
+- detection + recognition only (FACE_MODEL_MODULES default)
+and for each requested pack. Needs the InsightFace model files.
+
+    python -m benchmarks.bench_model_modules --packs buffalo_l buffalo_s
+    python -m benchmarks.bench_model_modules --image class_photo.jpg
+"""
+
+import argparse
+
+import cv2
+
+from benchmarks.common import time_call, print_table
+from face_model import build_face_app
+
+
+MODES = {
+    "all heads": None,
+    "det + rec": ["detection", "recognition"],
+}
+
+
+def load_image(path):
+    if path:
+        img = cv2.imread(path)
+        if img is None:
+            raise SystemExit(f"Could not read image: {path}")
+        return img
+    from insightface.data import get_image
+    return get_image("t1")  # bundled group photo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--packs", nargs="+", default=["buffalo_l", "buffalo_s"])
+    parser.add_argument("--image", default=None, help="default: insightface sample 't1'")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    frame = load_image(args.image)
+
+    rows = []
+    for pack in args.packs:
+        for mode, modules in MODES.items():
+            try:
+                face_app = build_face_app(pack=pack, modules=modules)
+            except Exception as e:
+                rows.append([pack, mode, "-", "-", "-", f"load failed: {e}"[:50]])
+                continue
+
+            n_faces = len(face_app.get(frame))
+            _, t = time_call(lambda: face_app.get(frame), repeat=args.repeat)
+            per_face = f"{t / n_faces * 1e3:.1f}" if n_faces else "-"
+            rows.append([pack, mode, n_faces, f"{t * 1e3:.1f}", per_face, "ok"])
+
+    print_table(["pack", "modules", "faces", "ms/frame", "ms/face", "status"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# benchmarks/bench_ort_tuning.py
+"""
+ONNX Runtime settings sweep: session creation time and throughput.
+
+For every combination of intra-op threads x graph optimization level x
+execution mode, builds the detection + recognition models and reports:
+- load s       model/session creation time
+- det fps      detector frames per second on one image
+- rec faces/s  recognizer throughput on a batch of aligned crops
+Needs the InsightFace model files.
+
+    python -m benchmarks.bench_ort_tuning --threads 1 2 4 0 --opt basic all
+    python -m benchmarks.bench_ort_tuning --cache-dir /tmp/onnx_cache
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from benchmarks.common import time_call, print_table
+from face_model import build_face_app, ort_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 0],
+                        help="intra-op threads (0 = ORT default)")
+    parser.add_argument("--opt", nargs="+", default=["basic", "all"],
+                        help="graph optimization levels")
+    parser.add_argument("--modes", nargs="+", default=["sequential", "parallel"])
+    parser.add_argument("--batch", type=int, default=16, help="crops per recognizer call")
+    parser.add_argument("--cache-dir", default="", help="optimized model cache dir")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from insightface.data import get_image
+    frame = get_image("t1")
+
+    rows = []
+    for threads, opt, mode in itertools.product(args.threads, args.opt, args.modes):
+        settings = ort_settings(
+            intra_op_threads=threads,
+            graph_opt_level=opt,
+            execution_mode=mode,
+            optimized_model_dir=args.cache_dir,
+        )
+
+        t0 = time.perf_counter()
+        face_app = build_face_app(modules=["detection", "recognition"], settings=settings)
+        load_s = time.perf_counter() - t0
+
+        rec = face_app.models["recognition"]
+        size = rec.input_size[0]
+        crops = list(np.random.default_rng(0).integers(
+            0, 255, (args.batch, size, size, 3), dtype=np.uint8))
+
+        _, det_t = time_call(lambda: face_app.det_model.detect(frame), repeat=args.repeat)
+        _, rec_t = time_call(lambda: rec.get_feat(crops), repeat=args.repeat)
+
+        rows.append([
+            threads or "auto", opt, mode,
+            f"{load_s:.2f}", f"{1 / det_t:.1f}", f"{args.batch / rec_t:.1f}",
+        ])
+
+    print_table(["threads", "opt", "mode", "load s", "det fps", "rec faces/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# benchmarks/bench_recognition_suite.py
+"""
+Recognition regression suite: face_utils hot paths on synthetic galleries.
+
+For each gallery size (1k .. 100k synthetic identities, enrolled into a
+temporary SQLite DB) times:
+
+- load_known_face_encodings      decode every student row from the DB
+- load_face_gallery              full shared-gallery reload (force=True)
+- match                          FaceGallery.match for one frame's faces
+- recognize_faces_in_frame       detect + align + embed + match per frame
+- mark_attendance_from_results   one frame's attendance writes (fresh day)
+
+Half of the faces are enrolled students, half impostors. Results are
+written as JSON together with the machine / library / config details, so
+runs can be compared over time (--compare; exit code 1 on a regression).
+
+Runs offline on a CPU-only machine. --stub-model replaces the ONNX model
+with benchmarks/stub_model.py (no weights needed; recognize_faces_in_frame
+then times alignment + matching only). With the real model pass recorded
+frames (--frames folder or video): synthetic frames contain no faces.
+
+    python -m benchmarks.bench_recognition_suite --stub-model --output base.json
+    python -m benchmarks.bench_recognition_suite --stub-model --compare base.json
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.common import (
+    time_call,
+    synthetic_embeddings,
+    noisy_queries,
+    synthetic_frames,
+    load_frames,
+    print_table,
+)
+
+
+def timed_runs(fn, setup, repeat):
+    """Like time_call, but setup() runs (untimed) before every call."""
+    setup()
+    fn()
+    timings = []
+    for _ in range(repeat):
+        setup()
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def environment():
+    """Machine, library and config details stored with every run."""
+    import config
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(config.__file__)), timeout=10,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    try:
+        import onnxruntime
+        ort_version = onnxruntime.__version__
+    except ImportError:
+        ort_version = None
+
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "onnxruntime": ort_version,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "config": {
+            name: getattr(config, name)
+            for name in (
+                "MATCH_THRESHOLD", "MATCH_TEMPLATE_AGG", "ANN_MIN_GALLERY", "DET_MODE", "FACE_MODEL_PACK",
+                "ORT_INTRA_OP_THREADS",
+            )
+        },
+    }
+
+
+# -------------------------------------------------------
+# SUITE
+# -------------------------------------------------------
+
+def enroll(db, start, stop):
+    """Synthetic students start..stop-1 (row i = synthetic embedding i)."""
+    from embedding_codec import encode_embedding
+
+    embs = synthetic_embeddings(stop)[start:]
+    rows = [
+        (f"B{i:06d}", f"Student {i}", str(i % 12 + 1), "ABCD"[i % 4], None, encode_embedding(e))
+        for i, e in zip(range(start, stop), embs)
+    ]
+    created, _ = db.bulk_create_students(rows)
+    return [pk for _, pk, _ in created]
+
+
+def run_size(n, pks, args, frames):
+    import db
+    import face_utils
+
+    embs = synthetic_embeddings(n)
+    known, _ = noisy_queries(embs, args.faces - args.faces // 2, seed=n)
+    queries = np.concatenate([known, synthetic_embeddings(args.faces // 2, seed=n + 1)])
+    if args.stub_model:
+        from benchmarks.stub_model import install_stub_model
+        install_stub_model(queries, args.faces)
+
+    face_utils.load_face_gallery(force=True)   # also builds the ANN index when needed
+    timings = {}
+
+    timings["load_known_face_encodings"] = time_call(face_utils.load_known_face_encodings, repeat=args.repeat)
+    timings["load_face_gallery"] = time_call(lambda: face_utils.load_face_gallery(force=True), repeat=args.repeat)
+    gallery = face_utils.load_face_gallery()
+
+    timings["match"] = time_call(lambda: gallery.match(queries, face_utils.MATCH_THRESHOLD), repeat=args.repeat * 4)
+
+    frame_cycle = itertools.cycle(frames)
+    timings["recognize_faces_in_frame"] = time_call(
+        lambda: face_utils.recognize_faces_in_frame(next(frame_cycle), gallery),
+        repeat=args.repeat * 2,
+    )
+
+    results = [
+        {"student_id": pk, "name": str(pk), "location": (0, 1, 1, 0), "distance": 0.1}
+        for pk in pks[:args.faces]
+    ]
+
+    def clear_attendance():
+        conn = db.get_connection()
+        conn.execute("DELETE FROM attendance")
+        conn.commit()
+        conn.close()
+
+    timings["mark_attendance_from_results"] = timed_runs(
+        lambda: face_utils.mark_attendance_from_results(results, 1, set()),
+        clear_attendance, args.repeat,
+    )
+    clear_attendance()
+
+    return [
+        {
+            "bench": bench, "gallery": n, "faces": args.faces,
+            "ann": gallery.index is not None,
+            "best_ms": best * 1e3, "median_ms": median * 1e3,
+        }
+        for bench, (best, median) in timings.items()
+    ]
+
+
+def run_suite(args):
+    import db
+
+    db.init_db()
+    if args.frames:
+        frames = load_frames(args.frames, args.max_frames)
+        if not frames:
+            sys.exit(f"No frames read from {args.frames}")
+    else:
+        frames = synthetic_frames(min(args.max_frames, 4))
+        if not args.stub_model:
+            print("warning: synthetic frames contain no faces - with the real model "
+                  "recognize_faces_in_frame times detection only (pass --frames)")
+
+    results, pks, enrolled = [], [], 0
+    for n in sorted(args.sizes):
+        t0 = time.perf_counter()
+        pks += enroll(db, enrolled, n)
+        enrolled = n
+        print(f"gallery {n}: enrolled in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+        results.extend(run_size(n, pks, args, frames))
+    return results
+
+
+# -------------------------------------------------------
+# COMPARISON
+# -------------------------------------------------------
+
+def compare(results, baseline, tolerance):
+    """Rows (bench, gallery, base ms, now ms, ratio, flag); flag = slower than tolerance."""
+    base = {(r["bench"], r["gallery"], r["faces"]): r for r in baseline["results"]}
+    rows = []
+    for r in results:
+        old = base.get((r["bench"], r["gallery"], r["faces"]))
+        if old is None:
+            continue
+        ratio = r["median_ms"] / old["median_ms"] if old["median_ms"] > 0 else float("inf")
+        rows.append((r["bench"], r["gallery"], old["median_ms"], r["median_ms"], ratio, ratio > 1 + tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--faces", type=int, default=20, help="faces per frame")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--stub-model", action="store_true", help="no ONNX model (benchmarks/stub_model.py)")
+    parser.add_argument("--frames", help="folder of images or a video file (default: synthetic frames)")
+    parser.add_argument("--max-frames", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON results here")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="median slowdown that counts as a regression (0.2 = 20%%)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of tables")
+    args = parser.parse_args()
+
+    # everything goes to a throwaway DB / embedding store; config reads these
+    # at import time, so the project modules are imported only after this
+    tmpdir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["ATTENDANCE_DB_PATH"] = os.path.join(tmpdir, "bench.db")
+    os.environ["EMBEDDING_STORE_DIR"] = os.path.join(tmpdir, "store")
+
+    run = {"env": environment(), "stub_model": args.stub_model, "frames": args.frames or "synthetic"}
+    try:
+        run["results"] = run_suite(args)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(run, f, indent=2)
+    if args.json:
+        print(json.dumps(run, indent=2))
+    else:
+        print_table(
+            ["bench", "gallery", "faces", "ann", "best ms", "median ms"],
+            [[r["bench"], r["gallery"], r["faces"], "yes" if r["ann"] else "-",
+              f"{r['best_ms']:.2f}", f"{r['median_ms']:.2f}"] for r in run["results"]],
+        )
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(run["results"], baseline, args.tolerance)
+        print(f"\nvs. {args.compare} ({baseline['env'].get('commit')}, {baseline['env'].get('time')})")
+        print_table(
+            ["bench", "gallery", "base ms", "now ms", "ratio", ""],
+            [[b, g, f"{o:.2f}", f"{n:.2f}", f"{r:.2f}x", "REGRESSION" if bad else ""]
+             for b, g, o, n, r, bad in rows],
+        )
+        if any(row[-1] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_startup.py
+"""
+Time-to-first-render of the login page for each model warm-up policy.
+
+Each run starts a fresh Python process (cold imports) and renders app.py
+once with Streamlit's AppTest against a throw-away DB:
+
+- eager:       model loaded before rendering (the old import-time behaviour)
+- background:  warm-up thread started, rendering not blocked
+- off:         model loaded on first camera/registration use only
+
+    python -m benchmarks.bench_startup --runs 3
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import print_table
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, time
+from streamlit.testing.v1 import AppTest
+t0 = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=600).run()
+elapsed = time.perf_counter() - t0
+print(json.dumps({
+    "seconds": elapsed,
+    "errors": [str(e.value) for e in at.exception],
+    "login_rendered": any("Login" in s.value for s in at.subheader),
+}))
+"""
+
+
+def render_once(policy):
+    tmpdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(
+        os.environ,
+        FACE_MODEL_WARMUP=policy,
+        ATTENDANCE_DB_PATH=os.path.join(tmpdir, "bench.db"),
+        EMBEDDING_STORE_DIR=os.path.join(tmpdir, "store"),
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=env,
+        capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        return {"seconds": float("nan"), "errors": [out.stderr.strip()[-200:]],
+                "login_rendered": False}
+    # warm-up threads/workers may log after the result line
+    line = next(l for l in out.stdout.splitlines() if l.startswith('{"seconds"'))
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--policies", nargs="+", default=["eager", "background", "off"])
+    args = parser.parse_args()
+
+    rows = []
+    for policy in args.policies:
+        results = [render_once(policy) for _ in range(args.runs)]
+        times = sorted(r["seconds"] for r in results)
+        ok = all(r["login_rendered"] and not r["errors"] for r in results)
+        note = "ok" if ok else "; ".join(results[0]["errors"])[:60] or "login not rendered"
+        rows.append([policy, f"{times[0]:.2f}", f"{times[len(times) // 2]:.2f}", note])
+
+    print_table(["policy", "best s", "median s", "status"], rows)
+
+
+if __name__ == "__main__":
+    main()
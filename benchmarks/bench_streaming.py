@@ -0,0 +1,67 @@
+# benchmarks/bench_streaming.py
+"""
+Streaming pipeline: headless fps / end-to-end latency report for a video file.
+
+Runs streaming.StreamPipeline over a local file without the UI and without
+writing attendance. By default the file is processed as fast as possible
+(every frame); --realtime paces it at the file's fps and drops frames like
+a live camera would. Needs the InsightFace model files.
+
+    python -m benchmarks.bench_streaming --source classroom.mp4
+    python -m benchmarks.bench_streaming --source classroom.mp4 --realtime
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.common import print_table
+from face_model import get_face_app
+from streaming import StreamPipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", required=True, help="video file (or camera index / URL)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="pace at the source fps and drop frames under backpressure")
+    parser.add_argument("--max-seconds", type=float, default=0,
+                        help="stop after this long (0 = until the file ends)")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # load the model and the alignment code before the clock starts
+    get_face_app()
+    import insightface.utils.face_align  # noqa: F401
+
+    pipeline = StreamPipeline(args.source, realtime=args.realtime or None, persist=False)
+    if not pipeline.start():
+        raise SystemExit(pipeline.error)
+
+    deadline = time.perf_counter() + args.max_seconds if args.max_seconds else None
+    while pipeline.running:
+        if deadline and time.perf_counter() > deadline:
+            pipeline.stop()
+        time.sleep(0.2)
+    pipeline.wait()
+
+    status = pipeline.status()
+    if status["error"]:
+        raise SystemExit(status["error"])
+
+    report = {k: status[k] for k in (
+        "elapsed", "captured", "dropped", "processed", "fps",
+        "latency_p50_ms", "latency_p95_ms", "recognitions", "marked",
+    )}
+    report["faces_per_frame_seen"] = pipeline.tracker.detections_seen / max(status["processed"], 1)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print_table(["metric", "value"],
+                [[k, f"{v:.2f}" if isinstance(v, float) else v] for k, v in report.items()])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_tracker.py
+"""
+Tracker: recognizer calls per second with and without FaceTracker.
+
+Simulates steady classroom video (students sitting still with small
+jitter, some walking across the frame, a few faces that never match) and
+counts how many faces would be sent to the recognizer. Uses the tracker
+only - no ONNX model needed.
+
+    python -m benchmarks.bench_tracker --faces 30 --seconds 60 --fps 15
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table
+from tracker import FaceTracker
+
+
+def simulate(faces, frames, movers, unknown, seed=0):
+    """Per-frame detection arrays (n, 5) + the identity distance of each face."""
+    rng = np.random.default_rng(seed)
+    cols = int(np.ceil(np.sqrt(faces)))
+    base = np.array([[80 + 120 * (i % cols), 60 + 140 * (i // cols)] for i in range(faces)],
+                    dtype=np.float32)
+    velocity = np.zeros_like(base)
+    velocity[:movers, 0] = 4.0   # px per frame
+
+    distance = np.full(faces, 0.15, dtype=np.float32)
+    distance[faces - unknown:] = 0.6
+
+    for f in range(frames):
+        centre = base + velocity * f + rng.normal(0, 1.5, base.shape)
+        boxes = np.concatenate([centre - 30, centre + 30, np.full((faces, 1), 0.9)], axis=1)
+        yield boxes.astype(np.float32), distance
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--faces", type=int, default=30)
+    parser.add_argument("--seconds", type=int, default=60)
+    parser.add_argument("--fps", type=int, default=15)
+    parser.add_argument("--movers", type=int, default=3, help="faces walking across the frame")
+    parser.add_argument("--unknown", type=int, default=2, help="faces that never match")
+    args = parser.parse_args()
+
+    frames = args.seconds * args.fps
+    tracker = FaceTracker()
+
+    t0 = time.perf_counter()
+    for boxes, distance in simulate(args.faces, frames, args.movers, args.unknown):
+        assigned = tracker.update(boxes)
+        for j in tracker.pending(assigned):
+            tracker.record(assigned[j], j, str(j), float(distance[j]))
+    elapsed = time.perf_counter() - t0
+
+    baseline = tracker.detections_seen
+    rows = [
+        ["every face, every frame", baseline / args.seconds, "-"],
+        ["FaceTracker", tracker.recognitions / args.seconds,
+         f"{baseline / max(tracker.recognitions, 1):.0f}x"],
+    ]
+    rows = [[name, f"{rate:.1f}", red] for name, rate, red in rows]
+
+    print_table(["mode", "recognitions/s", "reduction"], rows)
+    print(f"\ntracker overhead: {elapsed / frames * 1e3:.3f} ms/frame, "
+          f"{len(tracker.tracks)} live tracks at the end")
+
+
+if __name__ == "__main__":
+    main()
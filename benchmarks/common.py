@@ -0,0 +1,98 @@
+# benchmarks/common.py
+"""
+Shared helpers for the benchmark scripts: timing and synthetic data.
+"""
+
+import time
+
+import numpy as np
+
+
+def time_call(fn, repeat=5, warmup=1):
+    """
+    Run fn() `warmup + repeat` times and return the best and median
+    wall-clock time (seconds) of the measured runs.
+    """
+    for _ in range(warmup):
+        fn()
+
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+
+    timings.sort()
+    return timings[0], timings[len(timings) // 2]
+
+
+def synthetic_embeddings(n, dim=512, seed=0):
+    """n random unit-norm float32 embeddings (ArcFace-like)."""
+    rng = np.random.default_rng(seed)
+    embs = rng.standard_normal((n, dim)).astype(np.float32)
+    embs /= np.linalg.norm(embs, axis=1, keepdims=True)
+    return embs
+
+
+def noisy_queries(gallery_embs, n, noise=0.5, seed=1):
+    """
+    n queries that are perturbed copies of random gallery rows.
+    Returns (queries, true_row_indices).
+    """
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(gallery_embs), size=n)
+    q = gallery_embs[rows] + noise * rng.standard_normal(
+        (n, gallery_embs.shape[1])
+    ).astype(np.float32) / np.sqrt(gallery_embs.shape[1])
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    return q.astype(np.float32), rows
+
+
+def synthetic_frames(n, height=720, width=1280, seed=2):
+    """n random BGR frames (no real faces - pair them with the stub model)."""
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def load_frames(path, limit=20):
+    """
+    Up to `limit` BGR frames from a folder of images or a video file
+    (video frames are spread evenly over the file).
+    """
+    import glob
+    import os
+
+    import cv2
+    from config import BATCH_IMAGE_EXTENSIONS
+
+    if os.path.isdir(path):
+        files = sorted(
+            p for p in glob.glob(os.path.join(glob.escape(path), "*"))
+            if p.lower().endswith(BATCH_IMAGE_EXTENSIONS)
+        )
+        frames = [cv2.imread(p) for p in files[:limit]]
+        return [f for f in frames if f is not None]
+
+    cap = cv2.VideoCapture(path)
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or limit
+    frames = []
+    for pos in np.linspace(0, max(total - 1, 0), num=min(limit, total)).astype(int):
+        cap.set(cv2.CAP_PROP_POS_FRAMES, int(pos))
+        ok, frame = cap.read()
+        if ok and frame is not None:
+            frames.append(frame)
+    cap.release()
+    return frames
+
+
+def print_table(headers, rows):
+    """Plain fixed-width table for console output."""
+    widths = [
+        max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h))
+        for i, h in enumerate(headers)
+    ]
+    line = "  ".join(str(h).rjust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for r in rows:
+        print("  ".join(str(v).rjust(w) for v, w in zip(r, widths)))
@@ -0,0 +1,71 @@
+# benchmarks/stub_model.py
+"""
+Stand-in for the InsightFace model, for benchmarks that time everything
+around the model (matching, gallery loads, DB writes) on machines without
+the ONNX weights.
+
+- the detector returns `faces` evenly spaced boxes with ArcFace-style
+  landmarks for any image, in microseconds
+- the recognizer returns the given embeddings in turn (e.g. noisy copies
+  of gallery rows + impostors), so matching does real work
+
+Alignment (insightface.utils.face_align) still runs for real.
+"""
+
+import numpy as np
+
+# ArcFace reference landmarks for a 112x112 crop
+_REF_LANDMARKS = np.array(
+    [[38.29, 51.70], [73.53, 51.50], [56.03, 71.74], [41.55, 92.37], [70.73, 92.20]],
+    dtype=np.float32,
+) / 112.0
+
+
+class StubDetector:
+    def __init__(self, faces, max_face=160):
+        self.faces = faces
+        self.max_face = max_face
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        h, w = img.shape[:2]
+        cols = int(np.ceil(np.sqrt(self.faces)))
+        rows = int(np.ceil(self.faces / cols)) if self.faces else 0
+        if not rows:
+            return np.zeros((0, 5), dtype=np.float32), np.zeros((0, 5, 2), dtype=np.float32)
+
+        cell = min(w / cols, h / rows)
+        size = min(cell * 0.8, self.max_face)
+        i = np.arange(self.faces)
+        x1 = (i % cols) * cell + (cell - size) / 2
+        y1 = (i // cols) * cell + (cell - size) / 2
+        boxes = np.stack([x1, y1, x1 + size, y1 + size, np.full(self.faces, 0.9)], axis=1)
+        kpss = _REF_LANDMARKS[None] * size + np.stack([x1, y1], axis=1)[:, None]
+        return boxes.astype(np.float32), kpss.astype(np.float32)
+
+
+class StubRecognizer:
+    input_size = (112, 112)
+    input_shape = ["None", 3, 112, 112]
+
+    def __init__(self, embeddings):
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self._next = 0
+
+    def get_feat(self, imgs):
+        rows = (np.arange(len(imgs)) + self._next) % len(self.embeddings)
+        self._next += len(imgs)
+        return self.embeddings[rows]
+
+
+class StubFaceApp:
+    def __init__(self, embeddings, faces):
+        self.det_model = StubDetector(faces)
+        self.models = {"detection": self.det_model, "recognition": StubRecognizer(embeddings)}
+
+
+def install_stub_model(embeddings, faces):
+    """Make face_model.get_face_app() return the stub in this process."""
+    import face_model
+
+    face_model._face_app = StubFaceApp(embeddings, faces)
+    return face_model._face_app
@@ -0,0 +1,318 @@
+# bulk_enroll.py
+"""
+Bulk Student Enrollment (CLI)
+-----------------------------
+Onboards a whole roster from a CSV file plus a folder of ID photos:
+
+    python bulk_enroll.py roster.csv photos/ --report enroll_report.csv
+    python bulk_enroll.py roster.csv photos/ --dry-run
+
+Roster columns: student_id, name (required), class, section, email and an
+optional `images` column (";"-separated paths relative to the photo
+folder). Without it, photos are found by roll number:
+<student_id>.jpg, <student_id>_2.jpg, ... or <student_id>/<any>.jpg.
+
+- photos are decoded, detected and embedded in worker processes
+  (InferenceService), BULK_ENROLL_CHUNK photos per task, with one batched
+  recognizer call per chunk
+- several photos of a student are averaged into one face template; a
+  photo far from the others (BULK_ENROLL_MAX_SPREAD) is left out
+- problems never abort the run; they are reported per student:
+  no face, multiple faces, unreadable photo, duplicate roll number (in the
+  roster or the DB), or a face that already belongs to someone else
+- all students are inserted in ONE transaction (executemany, BLOB
+  encodings) and the gallery generation is bumped once
+"""
+
+import argparse
+import csv
+import glob
+import os
+import time
+from concurrent.futures import as_completed
+
+import cv2
+import numpy as np
+
+from config import (
+    BATCH_IMAGE_EXTENSIONS,
+    BULK_ENROLL_CHUNK,
+    BULK_ENROLL_MAX_SPREAD,
+    BULK_ENROLL_SECONDARY_FACE,
+)
+
+
+# -------------------------------------------------------
+# WORKER SIDE
+# -------------------------------------------------------
+
+def embed_enrollment_images(paths):
+    """
+    [(path, status, embedding or None)] for a chunk of ID photos (runs in a
+    worker). status is "ok", "no_face", "multiple_faces" or "unreadable".
+    Faces smaller than BULK_ENROLL_SECONDARY_FACE x the largest one
+    (background people, posters) are ignored.
+    """
+    import face_utils
+
+    out, crops, crop_rows = [], [], []
+    for path in paths:
+        frame = cv2.imread(path)
+        if frame is None:
+            out.append([path, "unreadable", None])
+            continue
+
+        bboxes, kpss = face_utils.detect_faces(frame, mode="registration")
+        if len(bboxes) == 0:
+            out.append([path, "no_face", None])
+            continue
+
+        heights = bboxes[:, 3] - bboxes[:, 1]
+        biggest = int(np.argmax(heights))
+        if (heights >= heights[biggest] * BULK_ENROLL_SECONDARY_FACE).sum() > 1:
+            out.append([path, "multiple_faces", None])
+            continue
+
+        crops.extend(face_utils.align_faces(frame, kpss[biggest:biggest + 1]))
+        crop_rows.append(len(out))
+        out.append([path, "ok", None])
+
+    embs = face_utils.embed_aligned_faces(crops)
+    for row, emb in zip(crop_rows, embs):
+        out[row][2] = emb
+    return [tuple(r) for r in out]
+
+
+# -------------------------------------------------------
+# ROSTER
+# -------------------------------------------------------
+
+def _find_images(images_dir, roll):
+    """<roll>.ext, <roll>_<n>.ext (n numeric, so S1 does not pick up S1_A) or <roll>/*.ext."""
+    base = glob.escape(images_dir)
+    found = []
+    for ext in BATCH_IMAGE_EXTENSIONS:
+        found += glob.glob(os.path.join(base, glob.escape(roll) + ext))
+        found += [
+            p for p in glob.glob(os.path.join(base, glob.escape(roll) + "_*" + ext))
+            if os.path.basename(p)[len(roll) + 1:-len(ext)].isdigit()
+        ]
+        found += glob.glob(os.path.join(base, glob.escape(roll), "*" + ext))
+    return sorted(set(found))
+
+
+def read_roster(csv_path, images_dir):
+    """
+    Returns (students, failures). students: dicts with student_id, name,
+    class, section, email, images. failures: (student_id, name, reason).
+    """
+    students, failures, seen = [], [], set()
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        for line_no, row in enumerate(csv.DictReader(f), start=2):
+            row = {(k or "").strip().lower(): (v or "").strip() for k, v in row.items()}
+            roll, name = row.get("student_id", ""), row.get("name", "")
+
+            if not roll or not name:
+                failures.append((roll or f"line {line_no}", name, "missing student_id or name"))
+                continue
+            if roll in seen:
+                failures.append((roll, name, "duplicate student_id in roster"))
+                continue
+            seen.add(roll)
+
+            if row.get("images"):
+                images = [os.path.join(images_dir, p.strip()) for p in row["images"].split(";") if p.strip()]
+            else:
+                images = _find_images(images_dir, roll)
+            if not images:
+                failures.append((roll, name, "no photos found"))
+                continue
+
+            students.append({
+                "student_id": roll,
+                "name": name,
+                "class": row.get("class") or None,
+                "section": row.get("section") or None,
+                "email": row.get("email") or None,
+                "images": images,
+            })
+    return students, failures
+
+
+# -------------------------------------------------------
+# TEMPLATES
+# -------------------------------------------------------
+
+def build_template(embs):
+    """
+    Average of unit embeddings -> unit template. Photos further than
+    BULK_ENROLL_MAX_SPREAD (cosine distance) from the first average are
+    dropped and the template is recomputed. Returns (template, kept mask).
+    """
+    from gallery import l2_normalize
+
+    embs = l2_normalize(np.asarray(embs, dtype=np.float32))
+    mean = l2_normalize(embs.mean(axis=0, keepdims=True))[0]
+    keep = (1.0 - embs @ mean) <= BULK_ENROLL_MAX_SPREAD
+    if keep.sum() == 0:
+        keep[:] = True
+    template = l2_normalize(embs[keep].mean(axis=0, keepdims=True))[0]
+    return template, keep
+
+
+def embed_all(students, workers):
+    """{path: (status, embedding)} for every photo of every student."""
+    from inference_service import InferenceService
+
+    paths = [p for s in students for p in s["images"]]
+    chunks = [paths[i:i + BULK_ENROLL_CHUNK] for i in range(0, len(paths), BULK_ENROLL_CHUNK)]
+    print(f"Embedding {len(paths)} photo(s) in {len(chunks)} chunk(s) with {workers} worker(s)")
+
+    results = {}
+    service = InferenceService(num_workers=workers)
+    t0 = time.perf_counter()
+    try:
+        futures = {service.submit(chunk, "enroll_batch"): chunk for chunk in chunks}
+        for n, future in enumerate(as_completed(futures), 1):
+            try:
+                for path, status, emb in future.result():
+                    results[path] = (status, emb)
+            except Exception as e:
+                for path in futures[future]:
+                    results[path] = (f"error: {e}", None)
+            if n % 10 == 0 or n == len(chunks):
+                print(f"  {n}/{len(chunks)} chunks ({len(results) / (time.perf_counter() - t0):.0f} photos/s)")
+    finally:
+        service.shutdown()
+    return results
+
+
+def _describe_photo_problems(statuses):
+    counts = {}
+    for st in statuses:
+        counts[st] = counts.get(st, 0) + 1
+    return ", ".join(f"{st.replace('_', ' ')} in {n} photo(s)" for st, n in sorted(counts.items()))
+
+
+# -------------------------------------------------------
+# RUN
+# -------------------------------------------------------
+
+def enroll(csv_path, images_dir, workers, dry_run=False, allow_face_duplicates=False):
+    """
+    Full pipeline. Returns report rows:
+    (student_id, name, status, photos_used, detail).
+    """
+    from db import bulk_create_students, get_students
+    from embedding_codec import encode_embedding
+    from face_utils import load_face_gallery, MATCH_THRESHOLD
+    from ann_index import append_deltas
+
+    students, failures = read_roster(csv_path, images_dir)
+    report = [(roll, name, "failed", 0, reason) for roll, name, reason in failures]
+
+    existing = {s["student_id"] for s in get_students()}
+    pending = []
+    for s in students:
+        if s["student_id"] in existing:
+            report.append((s["student_id"], s["name"], "failed", 0, "student_id already enrolled"))
+        else:
+            pending.append(s)
+
+    photos = embed_all(pending, workers)
+
+    # ---- templates ----
+    ready = []
+    for s in pending:
+        got = [(p, photos.get(p, ("missing", None))) for p in s["images"]]
+        embs = [e for _, (st, e) in got if st == "ok"]
+        problems = [st for _, (st, _) in got if st != "ok"]
+        if not embs:
+            report.append((s["student_id"], s["name"], "failed", 0, _describe_photo_problems(problems)))
+            continue
+        template, keep = build_template(embs)
+        notes = []
+        if problems:
+            notes.append(_describe_photo_problems(problems))
+        if not keep.all():
+            notes.append(f"{int((~keep).sum())} inconsistent photo(s) left out")
+        ready.append((s, template, int(keep.sum()), "; ".join(notes)))
+
+    # ---- face duplicates (against the gallery and within the batch) ----
+    if ready and not allow_face_duplicates:
+        gallery = load_face_gallery()
+        templates = np.stack([t for _, t, _, _ in ready])
+        known = gallery.match(templates, MATCH_THRESHOLD) if len(gallery) else [(None, None, None)] * len(ready)
+
+        # one product for every pair in the batch; same test as gallery.match
+        close = (1.0 - templates @ templates.T) <= MATCH_THRESHOLD
+        taken = np.zeros(len(ready), dtype=bool)
+        for i, ((s, t, used, note), (sid, name, dist)) in enumerate(zip(ready, known)):
+            if sid is not None:
+                report.append((s["student_id"], s["name"], "failed", used,
+                               f"face already enrolled as {name} (distance {dist:.2f})"))
+                continue
+            twins = np.flatnonzero(close[i, :i] & taken[:i])
+            if len(twins):
+                report.append((s["student_id"], s["name"], "failed", used,
+                               f"same face as {ready[twins[0]][0]['student_id']} in this roster"))
+                continue
+            taken[i] = True
+        ready = [r for r, ok in zip(ready, taken) if ok]
+
+    if dry_run:
+        report.extend((s["student_id"], s["name"], "would enroll", used, note) for s, _, used, note in ready)
+        return report
+
+    # ---- one transaction ----
+    rows = [
+        (s["student_id"], s["name"], s["class"], s["section"], s["email"], encode_embedding(t))
+        for s, t, _, _ in ready
+    ]
+    created, skipped = bulk_create_students(rows)
+    template_of = {roll: template_id for roll, _, template_id in created}
+    append_deltas([(template_of[s["student_id"]], t) for s, t, _, _ in ready if s["student_id"] in template_of])
+
+    skipped = set(skipped)
+    for s, _, used, note in ready:
+        if s["student_id"] in skipped:
+            report.append((s["student_id"], s["name"], "failed", used, "student_id already enrolled"))
+        else:
+            report.append((s["student_id"], s["name"], "enrolled", used, note))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll students from a CSV roster and a photo folder.")
+    parser.add_argument("roster", help="CSV with student_id, name[, class, section, email, images]")
+    parser.add_argument("images", help="folder with ID photos")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--dry-run", action="store_true", help="check everything, write nothing")
+    parser.add_argument("--allow-face-duplicates", action="store_true",
+                        help="do not reject faces that match another student (e.g. twins)")
+    parser.add_argument("--report", help="write a per-student CSV report here")
+    args = parser.parse_args()
+
+    from db import init_db
+
+    init_db()
+    report = enroll(args.roster, args.images, args.workers, args.dry_run, args.allow_face_duplicates)
+
+    counts = {}
+    for row in report:
+        counts[row[2]] = counts.get(row[2], 0) + 1
+    print("\n" + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+    for roll, name, status, _, detail in report:
+        if status == "failed":
+            print(f"  ! {roll} {name}: {detail}")
+
+    if args.report:
+        with open(args.report, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["student_id", "name", "status", "photos_used", "detail"])
+            writer.writerows(sorted(report))
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+# camera_scheduler.py
+"""
+Multi-Camera Room Scheduler
+---------------------------
+Runs one camera per classroom on one box. Every source gets a capture
+thread that only keeps its newest frame (older ones are dropped), plus its
+own face tracker. A single dispatcher time-slices a shared pool of
+SCHEDULER_WORKERS inference threads between the sources:
+
+- fps cap:   a source is not served more often than its max_fps
+- priority:  a source's share of the pool is proportional to its priority
+- fairness:  start-time fair queuing - each source has a virtual time that
+             grows by (inference seconds / priority) per served frame, and
+             the eligible source with the smallest virtual time goes next.
+             A busy lecture hall (many faces, slow frames) pays for its
+             cost and cannot starve the small rooms.
+
+At most one frame per source is in flight, so a source's tracker is never
+used by two threads at once. ONNX Runtime releases the GIL, so the pool
+threads run inference in parallel in this process.
+
+The pool is deliberately not the InferenceService process pool: every
+frame runs detect -> tracker.update -> embed only the tracks that need it
+(face_utils.recognize_tracked_frame), and the tracker lives here. A worker
+process would need the whole frame pickled across twice per frame (detect,
+then embed), or would have to embed every face and lose the tracker's
+savings.
+
+Each source matches against its own class / section gallery partition
+(face_utils.load_scoped_gallery), with the school-wide gallery as fallback
+for visiting students when GALLERY_SCOPE_FALLBACK is set.
+
+Recognised students are written with the same semantics as the camera page
+(face_utils.mark_attendance_from_results -> insert_attendance, once per
+student per day), and additionally per period when the source has one.
+
+Sources can be listed in a JSON file (CAMERAS_CONFIG):
+
+    [{"name": "room-101", "source": "rtsp://...", "class": "10", "section": "A",
+      "period": "1", "priority": 2, "max_fps": 5}, ...]
+"""
+
+import json
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import metrics
+from config import (
+    CAMERAS_CONFIG,
+    SCHEDULER_WORKERS,
+    SCHEDULER_DEFAULT_FPS,
+    STREAM_MIN_TRACK_HITS,
+)
+from streaming import open_source, is_file_source
+
+
+# -------------------------------------------------------
+# SOURCES
+# -------------------------------------------------------
+
+class CameraSource:
+    """One camera (or recorded video) and its scheduling state."""
+
+    def __init__(self, name, source, class_=None, section=None, period=None,
+                 priority=1.0, max_fps=SCHEDULER_DEFAULT_FPS, marked_by=None, loop=False):
+        from tracker import FaceTracker
+
+        self.name = name
+        self.source = source
+        self.class_ = class_
+        self.section = section
+        self.period = period
+        self.priority = max(float(priority), 1e-3)
+        self.max_fps = float(max_fps)
+        self.marked_by = marked_by
+        self.loop = loop            # restart recorded videos at the end (simulation)
+
+        self.tracker = FaceTracker()
+        self.vtime = 0.0            # fair-queuing virtual time
+        self.next_due = 0.0         # earliest time the fps cap allows another frame
+        self.in_flight = False
+        self.ended = False
+
+        self._lock = threading.Lock()
+        self._latest = None         # (frame, t_capture)
+        self.marked = set()
+
+        self.stats = {"captured": 0, "dropped": 0, "processed": 0,
+                      "busy_seconds": 0.0, "marked": 0}
+        self.latencies = deque(maxlen=500)
+
+    # ---------------- capture side ----------------
+
+    def offer(self, frame):
+        with self._lock:
+            if self._latest is not None:
+                self.stats["dropped"] += 1
+            self._latest = (frame, time.perf_counter())
+            self.stats["captured"] += 1
+
+    def take(self):
+        with self._lock:
+            latest, self._latest = self._latest, None
+            return latest
+
+    def has_frame(self):
+        return self._latest is not None
+
+    def describe(self):
+        parts = [p for p in (self.class_, self.section) if p]
+        room = "-".join(parts) if parts else "any class"
+        return f"{self.name} ({room}{', period ' + str(self.period) if self.period else ''})"
+
+
+def load_camera_sources(path=CAMERAS_CONFIG, marked_by=None):
+    """CameraSource list from a JSON file (see module docstring)."""
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [
+        CameraSource(
+            name=e.get("name") or str(e["source"]),
+            source=e["source"],
+            class_=e.get("class"),
+            section=e.get("section"),
+            period=e.get("period"),
+            priority=e.get("priority", 1.0),
+            max_fps=e.get("max_fps", SCHEDULER_DEFAULT_FPS),
+            marked_by=e.get("marked_by", marked_by),
+        )
+        for e in entries
+    ]
+
+
+# -------------------------------------------------------
+# SCHEDULER
+# -------------------------------------------------------
+
+class CameraScheduler:
+    """Fair, priority-weighted sharing of one inference pool by many cameras."""
+
+    def __init__(self, sources, workers=SCHEDULER_WORKERS, persist=True):
+        self.sources = list(sources)
+        self.workers = workers
+        self.persist = persist
+
+        self._stop = threading.Event()
+        self._slots = threading.Semaphore(workers)
+        self._pool = None
+        self._threads = []
+        self._persist_lock = threading.Lock()
+        self._already_today = set()
+        self._day = None            # date _already_today / source.marked refer to
+        self.log = deque(maxlen=100)
+        self.started_at = None
+        self.error = None
+
+    # ---------------- lifecycle ----------------
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sched-infer")
+
+        for src in self.sources:
+            t = threading.Thread(target=self._capture_loop, args=(src,),
+                                 name=f"cam-{src.name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+        t = threading.Thread(target=self._dispatch_loop, name="cam-dispatcher", daemon=True)
+        t.start()
+        self._threads.append(t)
+
+    def stop(self, wait=True):
+        self._stop.set()
+        if wait:
+            for t in self._threads:
+                t.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+
+    @property
+    def running(self):
+        return not self._stop.is_set() and not all(s.ended for s in self.sources)
+
+    # ---------------- capture ----------------
+
+    def _capture_loop(self, src):
+        cap = open_source(src.source)
+        if not cap.isOpened():
+            self.log.append(f"{src.describe()}: could not open source")
+            src.ended = True
+            return
+
+        # recorded video plays at its own fps, like a live camera would
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        interval = 1.0 / fps if fps > 0 and is_file_source(src.source) else 0
+        next_t = time.perf_counter()
+
+        try:
+            while not self._stop.is_set():
+                if interval:
+                    next_t += interval
+                    time.sleep(max(0.0, next_t - time.perf_counter()))
+                with metrics.timer("camera_grab"):
+                    ok, frame = cap.read()
+                if not ok or frame is None:
+                    if src.loop and is_file_source(src.source):
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    break
+                src.offer(frame)
+        finally:
+            cap.release()
+            src.ended = True
+
+    # ---------------- scheduling ----------------
+
+    def pick(self, now):
+        """
+        Eligible source with the smallest virtual time, or None. Eligible =
+        has a new frame, nothing in flight, and its fps cap allows it.
+        """
+        eligible = [
+            s for s in self.sources
+            if not s.in_flight and s.has_frame() and now >= s.next_due
+        ]
+        if not eligible:
+            return None
+        return min(eligible, key=lambda s: s.vtime)
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            if not self._slots.acquire(timeout=0.1):
+                continue
+
+            src = self.pick(time.perf_counter())
+            if src is None:
+                self._slots.release()
+                if all(s.ended and not s.has_frame() for s in self.sources):
+                    break
+                time.sleep(0.002)
+                continue
+
+            latest = src.take()
+            if latest is None:
+                self._slots.release()
+                continue
+
+            # a source that was idle does not bank credit: catch it up to
+            # the slowest source that is still competing
+            active = [s.vtime for s in self.sources
+                      if s is not src and (s.in_flight or s.has_frame())]
+            if active:
+                src.vtime = max(src.vtime, min(active))
+
+            src.in_flight = True
+            now = time.perf_counter()
+            src.next_due = now + (1.0 / src.max_fps if src.max_fps > 0 else 0.0)
+            self._pool.submit(self._run_job, src, *latest)
+
+        self._stop.set()
+
+    def _run_job(self, src, frame, t_capture):
+        from face_utils import load_scoped_gallery, recognize_tracked_frame
+
+        t0 = time.perf_counter()
+        try:
+            gallery = load_scoped_gallery(src.class_, src.section)
+            results = recognize_tracked_frame(frame, src.tracker, gallery)
+            self._persist(src, results)
+        except Exception as e:
+            self.error = f"{src.name}: {e}"
+            self.log.append(self.error)
+        finally:
+            cost = time.perf_counter() - t0
+            src.vtime += cost / src.priority
+            src.stats["processed"] += 1
+            src.stats["busy_seconds"] += cost
+            src.latencies.append(time.perf_counter() - t_capture)
+            src.in_flight = False
+            self._slots.release()
+
+    # ---------------- attendance ----------------
+
+    def _persist(self, src, results):
+        """Mark stable, identified tracks once per student (per source period)."""
+        from face_utils import mark_attendance_from_results
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self._day:
+            self._new_day(today)
+
+        hits = {t.track_id: t.hits for t in src.tracker.active_tracks()}
+        ready = {}
+        for r in results:
+            sid = r["student_id"]
+            if sid is None or sid in src.marked or sid in ready:
+                continue
+            if hits.get(r["track_id"], 0) >= STREAM_MIN_TRACK_HITS:
+                ready[sid] = r
+        if not ready:
+            return
+
+        ready = list(ready.values())
+        with self._persist_lock:
+            src.marked.update(r["student_id"] for r in ready)
+            if not self.persist:
+                self.log.extend(f"{src.describe()}: recognised {r['name']} (not saved)" for r in ready)
+                src.stats["marked"] += len(ready)
+                return
+
+            new, logs = mark_attendance_from_results(ready, src.marked_by, self._already_today)
+            src.stats["marked"] += len(new)
+            self.log.extend(f"{src.describe()}: {line}" for line in logs)
+
+            if src.period:
+                from timetable import get_period_attendance, mark_period_attendance
+                done = {row["student_id"] for row in get_period_attendance(
+                    src.class_, src.section, src.period, today)}
+                for r in ready:
+                    if r["student_id"] not in done:
+                        mark_period_attendance(r["student_id"], src.class_, src.section,
+                                               src.period, "Present", src.marked_by)
+
+    def _new_day(self, today):
+        """Forget who was marked once the date changes (runs across midnight)."""
+        with self._persist_lock:
+            if today == self._day:
+                return
+            self._day = today
+            self._already_today.clear()
+            for s in self.sources:
+                s.marked.clear()
+
+    # ---------------- status ----------------
+
+    def status(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        rows = []
+        for s in self.sources:
+            lat = np.array(s.latencies, dtype=np.float64)
+            rows.append({
+                "name": s.name,
+                "class": s.class_,
+                "section": s.section,
+                "period": s.period,
+                "priority": s.priority,
+                "max_fps": s.max_fps,
+                "fps": s.stats["processed"] / elapsed if elapsed > 0 else 0.0,
+                "pool_share": s.stats["busy_seconds"],
+                "latency_p95_ms": float(np.percentile(lat, 95) * 1e3) if lat.size else 0.0,
+                "ended": s.ended,
+                **s.stats,
+            })
+        busy_total = sum(r["pool_share"] for r in rows) or 1.0
+        for r in rows:
+            r["pool_share"] = r["pool_share"] / busy_total
+        return {"elapsed": elapsed, "sources": rows, "log": list(self.log), "error": self.error}
+
+
+# -------------------------------------------------------
+# HEADLESS RUNNER
+# -------------------------------------------------------
+
+def main():
+    """python camera_scheduler.py [cameras.json] - run until Ctrl+C."""
+    import sys
+    from db import init_db
+
+    init_db()
+    sources = load_camera_sources(sys.argv[1] if len(sys.argv) > 1 else CAMERAS_CONFIG)
+    scheduler = CameraScheduler(sources)
+    scheduler.start()
+    print(f"Scheduling {len(sources)} camera(s) on {scheduler.workers} inference thread(s).")
+
+    try:
+        while scheduler.running:
+            time.sleep(1.0)
+            while scheduler.log:
+                print(scheduler.log.popleft())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
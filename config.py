@@ -5,8 +5,36 @@ import os
 # Base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# SQLite DB path
-DB_PATH = os.path.join(BASE_DIR, "attendance_system.db")
+# SQLite DB path (override with ATTENDANCE_DB_PATH, e.g. for benchmarks)
+DB_PATH = os.environ.get("ATTENDANCE_DB_PATH", os.path.join(BASE_DIR, "attendance_system.db"))
+# Idle SQLite connections kept for reuse (db.ConnectionPool); 0 = connect per call
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "8"))
+# Journal mode set by init_db (stored in the DB file). WAL lets report readers
+# run while a teacher's write commits; use "DELETE" on network filesystems,
+# where WAL's shared-memory index does not work.
+DB_JOURNAL_MODE = os.environ.get("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")   # NORMAL is crash-safe in WAL mode
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", "5000"))  # wait this long for a lock
+DB_CACHE_SIZE_KB = int(os.environ.get("DB_CACHE_SIZE_KB", "16384"))     # page cache per connection
+DB_MMAP_SIZE_MB = int(os.environ.get("DB_MMAP_SIZE_MB", "256"))         # 0 = no memory-mapped reads
+# Applied to every new connection
+DB_PRAGMAS = {
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+    "synchronous": DB_SYNCHRONOUS,
+    "cache_size": -DB_CACHE_SIZE_KB,          # negative = KiB instead of pages
+    "mmap_size": DB_MMAP_SIZE_MB * 1024 * 1024,
+    "temp_store": "MEMORY",   # sort / temp B-trees of reports stay off disk
+}
+
+# Shared, memory-mapped gallery snapshots (see embedding_store.py)
+# Kept next to the DB (like ANN_INDEX_PATH): snapshots are keyed by the DB's
+# gallery generation, so another DB must never read them.
+EMBEDDING_STORE_DIR = os.environ.get(
+    "EMBEDDING_STORE_DIR", os.path.splitext(DB_PATH)[0] + ".embeddings"
+)
+# Open galleries apply logged changes instead of reloading (see db.gallery_changes)
+GALLERY_CHANGELOG_KEEP = 1000   # generations kept in the change log
+GALLERY_SNAPSHOT_EVERY = 50     # generations applied incrementally before a fresh snapshot is written
 
 # Dataset folder (if needed later)
 DATASET_DIR = os.path.join(BASE_DIR, "dataset")
@@ -15,6 +43,117 @@ os.makedirs(DATASET_DIR, exist_ok=True)
 # App configs
 APP_TITLE = "Automatic Facial Recognition Attendance System"
 
+# Face model loading: "off" (on first use), "background" (warm-up thread
+# started on first page render) or "eager" (load before rendering)
+FACE_MODEL_WARMUP = os.environ.get("FACE_MODEL_WARMUP", "background")
+
+# InsightFace model pack: "buffalo_l" (accurate) or "buffalo_s" (light, low-end CPUs)
+FACE_MODEL_PACK = os.environ.get("FACE_MODEL_PACK", "buffalo_l")
+
+# Model heads to load/run. Attendance only needs boxes + embeddings; add
+# "landmark_2d_106", "landmark_3d_68" or "genderage" only if a feature uses them.
+FACE_MODEL_MODULES = [
+    m.strip()
+    for m in os.environ.get("FACE_MODEL_MODULES", "detection,recognition").split(",")
+    if m.strip()
+]
+
+# Face detection resolution (see detection.py)
+DET_MODE = os.environ.get("DET_MODE", "auto")  # auto | full | tiled (classroom frames)
+DET_SIZE = 640                 # detector input for full frames and tiles
+DET_SIZE_REGISTRATION = 320    # close-up registration / portal captures
+DET_TILE_GRID = 2              # tiles per side for wide classroom frames
+DET_TILE_OVERLAP = 0.2         # tile overlap (fraction), so border faces are not cut
+DET_TILE_MIN_SIDE = 1280       # only frames with a longer side than this get tiled
+DET_SMALL_FACE_PX = 48         # a face smaller than this (px) in the full pass triggers tiling
+DET_NMS_IOU = 0.4              # IoU for merging full-frame and tile detections
+
+# ONNX Runtime session tuning (env overrides in brackets).
+# On shared servers keep intra-op threads low so ONNX does not fight with
+# Streamlit and other processes; 0 = ONNX Runtime default (all cores).
+ORT_PROVIDERS = [
+    p.strip()
+    for p in os.environ.get("ORT_PROVIDERS", "CPUExecutionProvider").split(",")
+    if p.strip()
+]
+ORT_INTRA_OP_THREADS = int(os.environ.get("ORT_INTRA_OP_THREADS", "0"))
+ORT_INTER_OP_THREADS = int(os.environ.get("ORT_INTER_OP_THREADS", "0"))
+ORT_GRAPH_OPT_LEVEL = os.environ.get("ORT_GRAPH_OPT_LEVEL", "all")        # disable | basic | extended | all
+ORT_EXECUTION_MODE = os.environ.get("ORT_EXECUTION_MODE", "sequential")   # sequential | parallel
+ORT_CPU_MEM_ARENA = os.environ.get("ORT_CPU_MEM_ARENA", "1") == "1"
+# Cache of pre-optimized, serialized graphs (faster session creation);
+# empty = disabled. Cached graphs are tied to the ORT version and CPU.
+ORT_OPTIMIZED_MODEL_DIR = os.environ.get("ORT_OPTIMIZED_MODEL_DIR", "")
+
+# Inference worker processes (see inference_service.py); each loads its own
+# model, so budget ~300 MB RAM per worker. 0 = run inference in-process.
+INFERENCE_WORKERS = int(os.environ.get("INFERENCE_WORKERS", "2"))
+INFERENCE_TIMEOUT = 60  # seconds to wait for one frame
+
+# Max aligned faces per recognizer call (all faces of a frame/burst are batched)
+FACE_EMBED_BATCH = int(os.environ.get("FACE_EMBED_BATCH", "64"))
+
+# Capture burst + face quality (see face_quality.py): detection runs on every
+# frame of the burst, faces are linked across frames and only the best crop
+# of each person is embedded. Crops below QUALITY_MIN_SHARPNESS are skipped.
+BURST_FRAMES = 5
+BURST_INTERVAL = 0.15          # seconds between burst frames
+QUALITY_MIN_SHARPNESS = 20.0   # Laplacian variance below this = too blurry to embed
+QUALITY_SHARPNESS_REF = 300.0  # Laplacian variance that counts as fully sharp
+QUALITY_SIZE_REF = 112         # face height (px) that counts as full size
+QUALITY_MAX_YAW = 0.6          # nose offset / eye distance where pose score reaches 0
+QUALITY_WEIGHTS = {"sharpness": 0.4, "pose": 0.3, "det_score": 0.2, "size": 0.1}
+
+# Cross-frame face tracker (see tracker.py): tracks keep their identity and
+# are only re-recognized when new, low confidence or stale.
+TRACK_IOU = 0.3              # min IoU between predicted track box and detection
+TRACK_MAX_MISSES = 10        # frames a track survives without a detection
+TRACK_CONFIDENT_DIST = 0.25  # cosine distance below which an identity is trusted
+TRACK_RETRY_FRAMES = 5       # low-confidence / unknown tracks: retry every N frames
+TRACK_REFRESH_FRAMES = 150   # confident tracks: re-check every N frames (~5 s at 30 fps)
+
+# Video source for the camera page and the streaming pipeline (streaming.py):
+# a device index ("0"), an RTSP/HTTP URL or a video file path.
+CAMERA_SOURCE = os.environ.get("CAMERA_SOURCE", "0")
+STREAM_QUEUE_SIZE = 2       # items buffered between stages; more are dropped (live sources)
+STREAM_MIN_TRACK_HITS = 3   # frames a recognised face must be tracked before it is marked
+
+# Multi-camera scheduler (camera_scheduler.py): sources are listed in a JSON
+# file and share SCHEDULER_WORKERS inference threads.
+CAMERAS_CONFIG = os.environ.get("CAMERAS_CONFIG", os.path.join(BASE_DIR, "cameras.json"))
+SCHEDULER_WORKERS = int(os.environ.get("SCHEDULER_WORKERS", "2"))
+SCHEDULER_DEFAULT_FPS = 5.0   # per-source frame-rate cap unless the source sets max_fps
+
+# Offline batch attendance (batch_attendance.py)
+BATCH_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+BATCH_VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+BATCH_VIDEO_SAMPLE_SECONDS = 1.0            # recognise one video frame per this many seconds
+BATCH_CHECKPOINT_NAME = ".batch_attendance.jsonl"   # progress file inside the processed folder
+
+# Bulk enrollment from a roster + photo folder (bulk_enroll.py)
+BULK_ENROLL_CHUNK = 64              # photos per worker task (one recognizer batch)
+BULK_ENROLL_MAX_SPREAD = 0.4        # photos further than this from the student's average are dropped
+BULK_ENROLL_SECONDARY_FACE = 0.5    # other faces at least this big (vs. largest) = "multiple faces"
+
+# Burst liveness (liveness.py): a face is live when every listed check passes
+LIVENESS_CHECKS = ("motion", "texture")
+LIVENESS_THRESHOLDS = {
+    "motion": 0.2,     # mean optical-flow magnitude in the face, px / frame
+    "nonrigid": 0.1,   # spread of the flow inside the face (a moved photo has ~0)
+    "blink": 3.0,      # change of eye-band vs face brightness over the burst (grey levels)
+    "texture": 15.0,   # Laplacian variance of the face (prints / screens are flat)
+}
+LIVENESS_FLOW_SCALE = 0.35  # optical flow runs on the faces' region downscaled by this factor
+
+# Per-stage pipeline timings (metrics.py). Off by default; a comma list of
+# sinks turns them on: "memory" (Live Admin Monitor), "log", "csv".
+METRICS_SINKS = tuple(
+    s.strip() for s in os.environ.get("PIPELINE_METRICS", "").split(",")
+    if s.strip() and s.strip() != "off"
+)
+METRICS_WINDOW = 2048   # latest samples per stage kept for p50 / p95 / p99
+METRICS_CSV_PATH = os.environ.get("METRICS_CSV_PATH", os.path.join(BASE_DIR, "pipeline_metrics.csv"))
+
 # DeepFace configs
 # Model options: VGG-Face, Facenet, Facenet512, OpenFace, DeepFace, DeepID, ArcFace, Dlib, SFace
 MODEL_NAME = "Facenet"
@@ -24,3 +163,22 @@ DETECTOR_BACKEND = "opencv"  # or "retinaface" if you install extra deps
 # We'll use cosine distance; lower is more similar
 DISTANCE_METRIC = "cosine"
 MATCH_THRESHOLD = 0.35  # tweak if needed (lower = stricter, higher = more lenient)
+
+# Approximate nearest-neighbour (IVF) index for large galleries
+# Stored next to the DB; exact search is used below ANN_MIN_GALLERY gallery rows
+# (face templates - a student with several templates counts several times).
+ANN_INDEX_PATH = os.path.splitext(DB_PATH)[0] + ".ann.npz"
+ANN_MIN_GALLERY = 20000  # template rows; smaller galleries use exact (brute-force) search
+ANN_NLIST = 0            # number of clusters; 0 = auto (sqrt of gallery size)
+ANN_NPROBE = 16          # clusters scanned per query (higher = better recall, slower)
+ANN_RERANK_K = 10        # index candidates re-scored exactly over all templates of their students
+
+# Class / section scoped matching (camera page scope, camera_scheduler sources):
+# faces unknown to the class are also matched school-wide ("visiting") when True
+GALLERY_SCOPE_FALLBACK = True
+
+# Several face templates per student (glasses / no glasses, lighting, angle)
+FACE_TEMPLATES_MAX = 5   # captures beyond this are merged into the closest template
+# How a student's templates are combined into one score:
+# "max" = best single template, "mean" = average similarity over all templates
+MATCH_TEMPLATE_AGG = os.environ.get("MATCH_TEMPLATE_AGG", "max")
@@ -1,19 +1,154 @@
 import sqlite3
 import json
-from config import DB_PATH
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from config import (
+    DB_PATH,
+    DB_POOL_SIZE,
+    DB_PRAGMAS,
+    DB_JOURNAL_MODE,
+    DB_BUSY_TIMEOUT_MS,
+    GALLERY_CHANGELOG_KEEP,
+)
+from embedding_codec import json_to_blob
 
 
 # ------------------------- CONNECTION ------------------------- #
 
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection whose close() hands it back to its pool (open
+    transactions are rolled back, as a real close would). Still a
+    sqlite3.Connection, so pandas.read_sql etc. accept it.
+    """
+
+    pool = None
+    idle = False
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def really_close(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Idle connections to one DB file, shared by all threads. Every
+    get_connection() gets a connection of its own (nested calls never share
+    a transaction); close() returns it. size=0 connects on every call.
+    """
+
+    def __init__(self, path, size=DB_POOL_SIZE, pragmas=None):
+        self.path = path
+        self.size = size
+        self.pragmas = DB_PRAGMAS if pragmas is None else pragmas
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        conn.idle = False
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def release(self, conn):
+        if conn.idle:
+            return              # closed twice
+        if conn.in_transaction:
+            conn.rollback()
+        with self._lock:
+            if len(self._idle) < self.size:
+                conn.idle = True
+                self._idle.append(conn)
+                return
+        conn.really_close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.really_close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=None):
+    """The ConnectionPool of `path` (default: the current DB_PATH)."""
+    path = path or DB_PATH
+    pool = _pools.get(path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(path, ConnectionPool(path))
+    return pool
+
+
 def get_connection():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """A pooled connection; conn.close() returns it to the pool."""
+    return get_pool().acquire()
+
+
+@contextmanager
+def transaction(immediate=False):
+    """
+    with transaction() as conn: ... - commits on success, rolls back on an
+    exception. immediate=True takes the write lock up front (BEGIN
+    IMMEDIATE), for read-then-write sequences.
+    """
+    conn = get_connection()
+    try:
+        if immediate:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _in_transaction(conn=None, immediate=False):
+    """The caller's connection (already in a transaction), or a new transaction()."""
+    return transaction(immediate) if conn is None else nullcontext(conn)
 
 
 # ------------------------- INIT DB ------------------------- #
 
+def set_journal_mode(mode=DB_JOURNAL_MODE):
+    """Persistent journal mode of the DB file (e.g. "WAL"); returns the mode in effect."""
+    conn = get_connection()
+    try:
+        return conn.execute(f"PRAGMA journal_mode = {mode}").fetchone()[0]
+    finally:
+        conn.close()
+
+
 def init_db():
+    set_journal_mode()
+
     conn = get_connection()
     cur = conn.cursor()
 
@@ -37,7 +172,7 @@ def init_db():
             class TEXT,
             section TEXT,
             email TEXT,
-            face_encoding TEXT               -- JSON encoded embedding
+            face_encoding BLOB               -- binary embedding (embedding_codec)
         )
     """)
 
@@ -55,10 +190,214 @@ def init_db():
         )
     """)
 
+    # Gallery generation counter (bumped whenever encodings/names change,
+    # so shared embedding snapshots know when to refresh)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS gallery_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            generation INTEGER NOT NULL
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO gallery_state (id, generation) VALUES (1, 0)")
+
+    # Random id of this DB, created once: embedding snapshots are stamped
+    # with it, so a restored / recreated DB never picks up another DB's files
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS db_identity (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            uid TEXT NOT NULL
+        )
+    """)
+    cur.execute("INSERT OR IGNORE INTO db_identity (id, uid) VALUES (1, ?)", (uuid.uuid4().hex,))
+
+    # Which students each generation touched, so open galleries can apply
+    # just those changes (student_id NULL = everything, reload in full)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS gallery_changes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            generation INTEGER NOT NULL,
+            student_id INTEGER
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_gallery_changes_generation ON gallery_changes(generation)")
+
+    # Face templates: up to FACE_TEMPLATES_MAX embeddings per student
+    # (students.face_encoding keeps their weighted average)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS face_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            embedding BLOB NOT NULL,          -- binary embedding (embedding_codec)
+            weight REAL NOT NULL DEFAULT 1,   -- captures merged into this template
+            created_at TEXT,
+            FOREIGN KEY(student_id) REFERENCES students(id)
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_face_templates_student ON face_templates(student_id)")
+
+    conn.commit()
+    conn.close()
+
+    migrated = migrate_face_encodings_to_blob()
+    migrated += migrate_face_encodings_to_templates()
+    if migrated:
+        bump_gallery_generation()
+
+
+def migrate_face_encodings_to_blob():
+    """
+    Convert legacy JSON-text face encodings to binary BLOBs in place.
+    Safe to run on every start: only TEXT rows are touched.
+    Returns the number of rows converted.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT id, face_encoding FROM students WHERE typeof(face_encoding) = 'text'")
+    rows = cur.fetchall()
+
+    updates = []
+    for r in rows:
+        try:
+            updates.append((json_to_blob(r["face_encoding"]), r["id"]))
+        except (ValueError, TypeError):
+            # unreadable legacy value - leave it, the loader skips it
+            continue
+
+    if updates:
+        cur.executemany("UPDATE students SET face_encoding = ? WHERE id = ?", updates)
+        conn.commit()
+    conn.close()
+    return len(updates)
+
+
+def migrate_face_encodings_to_templates():
+    """
+    Give every student that has a face_encoding but no face_templates rows
+    one template with that encoding. Safe to run on every start.
+    Returns the number of templates created.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO face_templates (student_id, embedding, weight, created_at)
+        SELECT s.id, s.face_encoding, 1, datetime('now')
+        FROM students s
+        WHERE typeof(s.face_encoding) = 'blob'
+          AND NOT EXISTS (SELECT 1 FROM face_templates t WHERE t.student_id = s.id)
+        """
+    )
+    n = cur.rowcount
+    conn.commit()
+    conn.close()
+    return max(n, 0)
+
+
+# ------------------------- GALLERY GENERATION ------------------------- #
+
+def _bump_generation(cur, student_pks=None):
+    """
+    Increment the gallery generation inside the caller's transaction and
+    log which students changed (None = unknown / all of them).
+    """
+    cur.execute("UPDATE gallery_state SET generation = generation + 1 WHERE id = 1")
+    cur.execute("SELECT generation FROM gallery_state WHERE id = 1")
+    generation = cur.fetchone()[0]
+
+    if student_pks is None:
+        cur.execute("INSERT INTO gallery_changes (generation, student_id) VALUES (?, NULL)", (generation,))
+    else:
+        cur.executemany(
+            "INSERT INTO gallery_changes (generation, student_id) VALUES (?, ?)",
+            [(generation, pk) for pk in set(student_pks)],
+        )
+    cur.execute(
+        "DELETE FROM gallery_changes WHERE generation <= ?",
+        (generation - GALLERY_CHANGELOG_KEEP,),
+    )
+
+
+def bump_gallery_generation():
+    conn = get_connection()
+    cur = conn.cursor()
+    _bump_generation(cur)
     conn.commit()
     conn.close()
 
 
+def get_gallery_generation() -> int:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT generation FROM gallery_state WHERE id = 1")
+    row = cur.fetchone()
+    conn.close()
+    return row[0] if row else 0
+
+
+def get_gallery_state():
+    """(gallery generation, DB identity uid) in one query."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT g.generation, i.uid FROM gallery_state g, db_identity i WHERE g.id = 1 AND i.id = 1"
+    )
+    row = cur.fetchone()
+    conn.close()
+    return (row[0], row[1]) if row else (0, None)
+
+
+def get_gallery_changes(since: int):
+    """
+    What changed after generation `since`: (generation, student PKs,
+    template rows of those students as in get_all_face_templates()).
+    Generations without rows changed no student. None when the change log
+    cannot tell (pruned below `since`, a change of everything, or `since`
+    ahead of the DB, e.g. after a restore) - the caller must reload in full.
+    """
+    conn = get_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT generation FROM gallery_state WHERE id = 1")
+        generation = cur.fetchone()[0]
+        if generation < since:
+            return None
+        if generation == since:
+            return generation, [], []
+
+        # pruning removes the oldest generations, so the log covers
+        # everything after `since` only if it still reaches down to since + 1
+        cur.execute("SELECT MIN(generation) FROM gallery_changes")
+        oldest = cur.fetchone()[0]
+        if oldest is None or oldest > since + 1:
+            return None
+
+        cur.execute(
+            "SELECT generation, student_id FROM gallery_changes WHERE generation > ? AND generation <= ?",
+            (since, generation),
+        )
+        rows = cur.fetchall()
+        if any(r[1] is None for r in rows):
+            return None
+
+        pks = sorted({r[1] for r in rows})
+        templates = []
+        for i in range(0, len(pks), 500):
+            chunk = pks[i:i + 500]
+            cur.execute(
+                f"""
+                SELECT t.id, t.student_id, s.name, t.embedding
+                FROM face_templates t JOIN students s ON s.id = t.student_id
+                WHERE t.student_id IN ({','.join('?' * len(chunk))})
+                ORDER BY t.student_id, t.id
+                """,
+                chunk,
+            )
+            templates.extend(cur.fetchall())
+        return generation, pks, templates
+    finally:
+        conn.close()
+
+
 # ------------------------- USERS ------------------------- #
 
 def get_user_by_username(username: str):
@@ -116,6 +455,61 @@ def create_student(student_id, name, cls, sec, email):
         conn.close()
 
 
+def bulk_create_students(rows):
+    """
+    Create many students with their face encodings in ONE transaction.
+    rows: (student_id, name, cls, sec, email, encoding_blob).
+    Roll numbers that already exist are skipped, not fatal.
+    Every student also gets one face_templates row with the encoding.
+    Returns (created [(student_id, pk, template_id)], skipped [student_id]).
+    """
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT student_id FROM students")
+        existing = {r[0] for r in cur.fetchall()}
+
+        fresh, skipped = [], []
+        for row in rows:
+            if row[0] in existing:
+                skipped.append(row[0])
+            else:
+                existing.add(row[0])
+                fresh.append(tuple(row))
+
+        cur.executemany(
+            """
+            INSERT INTO students (student_id, name, class, section, email, face_encoding)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            fresh,
+        )
+        cur.executemany(
+            """
+            INSERT INTO face_templates (student_id, embedding, weight, created_at)
+            SELECT id, face_encoding, 1, datetime('now') FROM students WHERE student_id = ?
+            """,
+            [(r[0],) for r in fresh],
+        )
+
+        created = []
+        rolls = [r[0] for r in fresh]
+        for i in range(0, len(rolls), 500):
+            chunk = rolls[i:i + 500]
+            cur.execute(
+                f"""
+                SELECT s.student_id, s.id, t.id
+                FROM students s JOIN face_templates t ON t.student_id = s.id
+                WHERE s.student_id IN ({','.join('?' * len(chunk))})
+                """,
+                chunk,
+            )
+            created.extend((r[0], r[1], r[2]) for r in cur.fetchall())
+
+        if fresh:
+            _bump_generation(cur, [pk for _, pk, _ in created])
+        return created, skipped
+
+
 def get_students(cls=None, sec=None):
     conn = get_connection()
     cur = conn.cursor()
@@ -138,6 +532,42 @@ def get_students(cls=None, sec=None):
     return [dict(r) for r in rows]
 
 
+def get_student_pks(cls=None, sec=None):
+    """Primary keys of the students in a class / section (None = any)."""
+    conn = get_connection()
+    cur = conn.cursor()
+
+    query = "SELECT id FROM students WHERE 1=1"
+    params = []
+    if cls:
+        query += " AND class = ?"
+        params.append(cls)
+    if sec:
+        query += " AND section = ?"
+        params.append(sec)
+
+    cur.execute(query, params)
+    pks = [r[0] for r in cur.fetchall()]
+    conn.close()
+    return pks
+
+
+def get_class_sections():
+    """Distinct (class, section) pairs of enrolled students, sorted."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT DISTINCT class, section FROM students
+        WHERE class IS NOT NULL AND class != ''
+        ORDER BY class, section
+        """
+    )
+    rows = [(r[0], r[1]) for r in cur.fetchall()]
+    conn.close()
+    return rows
+
+
 def get_student_by_student_id(roll_no: str):
     """Find student profile by roll number (used for reports)."""
     conn = get_connection()
@@ -169,15 +599,92 @@ def get_all_students_with_encodings():
     return rows
 
 
-def update_student_face_encoding(student_id: int, encoding_json: str):
+# ------------------------- FACE TEMPLATES ------------------------- #
+
+def get_all_face_templates():
+    """(template id, student id, name, embedding BLOB), grouped by student."""
     conn = get_connection()
     cur = conn.cursor()
     cur.execute(
-        "UPDATE students SET face_encoding = ? WHERE id = ?",
-        (encoding_json, student_id),
+        """
+        SELECT t.id, t.student_id, s.name, t.embedding
+        FROM face_templates t JOIN students s ON s.id = t.student_id
+        ORDER BY t.student_id, t.id
+        """
     )
-    conn.commit()
+    rows = cur.fetchall()
     conn.close()
+    return rows
+
+
+def get_face_templates(student_pk: int, conn=None):
+    """(template id, embedding BLOB, weight) of one student."""
+    with _in_transaction(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, embedding, weight FROM face_templates WHERE student_id = ? ORDER BY id",
+            (student_pk,),
+        )
+        return cur.fetchall()
+
+
+def get_template_counts():
+    """{student PK: number of templates}."""
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT student_id, COUNT(*) FROM face_templates GROUP BY student_id")
+    counts = {r[0]: r[1] for r in cur.fetchall()}
+    conn.close()
+    return counts
+
+
+def add_face_template(student_pk: int, encoding: bytes, centroid: bytes, weight: float = 1.0, conn=None):
+    """
+    Add one template and store the new average in students.face_encoding,
+    in one transaction (the caller's, when `conn` is given). Returns the
+    new template id.
+    """
+    with _in_transaction(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO face_templates (student_id, embedding, weight, created_at)
+            VALUES (?, ?, ?, datetime('now'))
+            """,
+            (student_pk, encoding, weight),
+        )
+        template_id = cur.lastrowid
+        cur.execute("UPDATE students SET face_encoding = ? WHERE id = ?", (centroid, student_pk))
+        _bump_generation(cur, [student_pk])
+        return template_id
+
+
+def replace_face_templates(student_pk: int, templates, centroid: bytes, conn=None):
+    """
+    Swap a student's templates for `templates` [(encoding, weight)] (e.g.
+    after compaction) in one transaction (the caller's, when `conn` is
+    given). Returns (removed template ids, new template ids).
+    """
+    with _in_transaction(conn, immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM face_templates WHERE student_id = ?", (student_pk,))
+        removed = [r[0] for r in cur.fetchall()]
+        cur.execute("DELETE FROM face_templates WHERE student_id = ?", (student_pk,))
+
+        added = []
+        for encoding, weight in templates:
+            cur.execute(
+                """
+                INSERT INTO face_templates (student_id, embedding, weight, created_at)
+                VALUES (?, ?, ?, datetime('now'))
+                """,
+                (student_pk, encoding, weight),
+            )
+            added.append(cur.lastrowid)
+
+        cur.execute("UPDATE students SET face_encoding = ? WHERE id = ?", (centroid, student_pk))
+        _bump_generation(cur, [student_pk])
+        return removed, added
 
 
 # NEW: update student basic details (admin/teacher edit)
@@ -192,19 +699,24 @@ def update_student(student_pk: int, student_id: str, name: str, cls: str, sec: s
         """,
         (student_id, name, cls, sec, email, student_pk),
     )
+    _bump_generation(cur, [student_pk])
     conn.commit()
     conn.close()
 
 
 # NEW: delete student (and optionally related attendance)
 def delete_student(student_pk: int, delete_attendance: bool = False):
-    conn = get_connection()
-    cur = conn.cursor()
-    if delete_attendance:
-        cur.execute("DELETE FROM attendance WHERE student_id = ?", (student_pk,))
-    cur.execute("DELETE FROM students WHERE id = ?", (student_pk,))
-    conn.commit()
-    conn.close()
+    """Returns the ids of the removed face templates (for the ANN delta log)."""
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        if delete_attendance:
+            cur.execute("DELETE FROM attendance WHERE student_id = ?", (student_pk,))
+        cur.execute("SELECT id FROM face_templates WHERE student_id = ?", (student_pk,))
+        removed = [r[0] for r in cur.fetchall()]
+        cur.execute("DELETE FROM face_templates WHERE student_id = ?", (student_pk,))
+        cur.execute("DELETE FROM students WHERE id = ?", (student_pk,))
+        _bump_generation(cur, [student_pk])
+        return removed
 
 
 # ------------------------- ATTENDANCE ------------------------- #
@@ -223,6 +735,62 @@ def insert_attendance(student_id, date, time, status, marked_by):
     conn.close()
 
 
+def insert_attendance_once(student_id, date, time, status, marked_by) -> bool:
+    """
+    Insert the row unless the student already has one for `date`; check
+    and insert are one transaction, so two sessions cannot both mark the
+    same student. Returns True when a row was inserted.
+    """
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT 1 FROM attendance WHERE student_id = ? AND date = ? LIMIT 1",
+            (student_id, date),
+        )
+        if cur.fetchone() is not None:
+            return False
+        cur.execute(
+            """
+            INSERT INTO attendance (student_id, date, time, status, marked_by)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (student_id, date, time, status, marked_by),
+        )
+        return True
+
+
+def bulk_insert_attendance(records):
+    """
+    Insert many (student_id, date, time, status, marked_by) rows in one
+    transaction, skipping students that already have a row for that date
+    (same rule as the camera page). Returns the rows actually inserted.
+    """
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        dates = sorted({r[1] for r in records})
+        existing = set()
+        for date in dates:
+            cur.execute("SELECT student_id FROM attendance WHERE date = ?", (date,))
+            existing.update((row[0], date) for row in cur.fetchall())
+
+        to_insert = []
+        for r in records:
+            key = (r[0], r[1])
+            if key in existing:
+                continue
+            existing.add(key)
+            to_insert.append(tuple(r))
+
+        cur.executemany(
+            """
+            INSERT INTO attendance (student_id, date, time, status, marked_by)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            to_insert,
+        )
+        return to_insert
+
+
 def has_attendance_for_date(student_id, date):
     conn = get_connection()
     cur = conn.cursor()
@@ -292,9 +860,15 @@ def delete_all_attendance():
 
 
 def clear_all_face_encodings():
-    """Remove all face encodings but keep student records."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE students SET face_encoding = NULL")
-    conn.commit()
-    conn.close()
+    """
+    Remove all face encodings but keep student records. Returns the ids of
+    the removed face templates (for the ANN delta log).
+    """
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE students SET face_encoding = NULL")
+        cur.execute("SELECT id FROM face_templates")
+        removed = [r[0] for r in cur.fetchall()]
+        cur.execute("DELETE FROM face_templates")
+        _bump_generation(cur)
+        return removed
@@ -0,0 +1,133 @@
+# detection.py
+"""
+Adaptive Face Detection
+-----------------------
+Chooses the detector resolution per call instead of a fixed 640x640:
+
+- "registration": close-up shots, small input (DET_SIZE_REGISTRATION)
+- "full":         one pass over the whole frame at DET_SIZE
+- "tiled":        full pass + overlapping tiles at DET_SIZE, merged with NMS
+- "auto":         full pass first; tiles are added only for large frames where
+                  the full pass found no faces or small (far away) faces
+
+A tile covers a fraction of the frame but is fed to the detector at the
+same DET_SIZE, so back-row faces are seen at up to DET_TILE_GRID x the
+resolution. The extra passes are only paid for when the room needs them.
+"""
+
+import numpy as np
+
+from config import (
+    DET_SIZE,
+    DET_SIZE_REGISTRATION,
+    DET_TILE_GRID,
+    DET_TILE_OVERLAP,
+    DET_TILE_MIN_SIDE,
+    DET_SMALL_FACE_PX,
+    DET_NMS_IOU,
+)
+
+
+# -------------------------------------------------------
+# GEOMETRY
+# -------------------------------------------------------
+
+def nms(boxes, scores, iou_thresh=DET_NMS_IOU):
+    """Greedy non-maximum suppression; returns kept indices (best first)."""
+    if len(boxes) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = np.maximum(0, x2 - x1) * np.maximum(0, y2 - y1)
+    order = np.argsort(-scores)
+
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.maximum(0, np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]))
+        h = np.maximum(0, np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]))
+        inter = w * h
+        iou = inter / np.maximum(areas[i] + areas[rest] - inter, 1e-6)
+        order = rest[iou <= iou_thresh]
+
+    return np.array(keep, dtype=np.int64)
+
+
+def tile_grid(height, width, grid=DET_TILE_GRID, overlap=DET_TILE_OVERLAP):
+    """(x0, y0, x1, y1) of grid x grid overlapping tiles covering the frame."""
+    def spans(length):
+        size = int(np.ceil(length / (grid - (grid - 1) * overlap)))
+        size = min(size, length)
+        if grid == 1:
+            return [(0, length)]
+        step = (length - size) / (grid - 1)
+        return [(int(round(i * step)), int(round(i * step)) + size) for i in range(grid)]
+
+    return [(x0, y0, x1, y1) for (y0, y1) in spans(height) for (x0, x1) in spans(width)]
+
+
+# -------------------------------------------------------
+# DETECTION
+# -------------------------------------------------------
+
+def _detect(det_model, img, size):
+    bboxes, kpss = det_model.detect(img, input_size=(size, size), max_num=0, metric="default")
+    if kpss is None:
+        kpss = np.zeros((len(bboxes), 5, 2), dtype=np.float32)
+    return bboxes, kpss
+
+
+def detect_tiled(det_model, frame, size=DET_SIZE, full=None):
+    """Full-frame pass + tile passes, merged with NMS."""
+    h, w = frame.shape[:2]
+    all_boxes, all_kps = [], []
+
+    if full is None:
+        full = _detect(det_model, frame, size)
+    all_boxes.append(full[0])
+    all_kps.append(full[1])
+
+    for x0, y0, x1, y1 in tile_grid(h, w):
+        boxes, kps = _detect(det_model, frame[y0:y1, x0:x1], size)
+        if len(boxes) == 0:
+            continue
+        boxes = boxes.copy()
+        boxes[:, [0, 2]] += x0
+        boxes[:, [1, 3]] += y0
+        all_boxes.append(boxes)
+        all_kps.append(kps + np.array([x0, y0], dtype=np.float32))
+
+    boxes = np.concatenate(all_boxes)
+    kpss = np.concatenate(all_kps)
+    keep = nms(boxes[:, :4], boxes[:, 4])
+    return boxes[keep], kpss[keep]
+
+
+def needs_tiling(frame, boxes):
+    """Large frame and the full pass saw nothing, or some face is tiny."""
+    if max(frame.shape[:2]) < DET_TILE_MIN_SIDE:
+        return False
+    if len(boxes) == 0:
+        return True
+    heights = boxes[:, 3] - boxes[:, 1]
+    return bool(heights.min() < DET_SMALL_FACE_PX)
+
+
+def detect_adaptive(det_model, frame, mode="auto"):
+    """
+    Detection with a per-call resolution strategy (see module docstring).
+    Returns (bboxes (n, 5), kpss (n, 5, 2)) in frame coordinates.
+    """
+    if mode == "registration":
+        boxes, kpss = _detect(det_model, frame, DET_SIZE_REGISTRATION)
+        if len(boxes):
+            return boxes, kpss
+        # tiny/odd capture - fall back to the standard size
+        return _detect(det_model, frame, DET_SIZE)
+
+    full = _detect(det_model, frame, DET_SIZE)
+    if mode == "tiled" or (mode == "auto" and needs_tiling(frame, full[0])):
+        return detect_tiled(det_model, frame, DET_SIZE, full=full)
+    return full
@@ -0,0 +1,90 @@
+# embedding_codec.py
+"""
+Binary Embedding Codec
+----------------------
+Face embeddings are stored in `students.face_encoding` as raw BLOBs:
+
+    8-byte header  = magic b"FE" | version (u8) | dtype code (u8) | dim (u32)
+    payload        = dim little-endian values (float32 by default)
+
+A 512-D float32 embedding is 2 KB instead of ~10 KB of JSON text, and a whole
+gallery of same-shaped rows decodes with ONE np.frombuffer call.
+Legacy JSON rows are still readable (see decode_embedding).
+"""
+
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b"FE"
+VERSION = 1
+HEADER = struct.Struct("<2sBBI")
+
+DTYPE_CODES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+CODE_FOR_DTYPE = {v: k for k, v in DTYPE_CODES.items()}
+
+
+# -------------------------------------------------------
+# ENCODE
+# -------------------------------------------------------
+
+def encode_embedding(emb, dtype="<f4"):
+    """numpy vector -> header + raw little-endian bytes."""
+    dtype = np.dtype(dtype)
+    vec = np.asarray(emb, dtype=dtype).reshape(-1)
+    return HEADER.pack(MAGIC, VERSION, CODE_FOR_DTYPE[dtype], vec.size) + vec.tobytes()
+
+
+def json_to_blob(text):
+    """Convert a legacy JSON text embedding into the binary format."""
+    return encode_embedding(np.array(json.loads(text), dtype=np.float32))
+
+
+# -------------------------------------------------------
+# DECODE
+# -------------------------------------------------------
+
+def is_blob(value):
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:2]) == MAGIC
+
+
+def read_header(blob):
+    magic, version, code, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC or version != VERSION or code not in DTYPE_CODES:
+        raise ValueError("Unsupported face encoding header.")
+    return DTYPE_CODES[code], dim
+
+
+def decode_embedding(value):
+    """Single stored value (BLOB or legacy JSON text) -> float32 vector."""
+    if is_blob(value):
+        dtype, dim = read_header(value)
+        return np.frombuffer(value, dtype=dtype, count=dim, offset=HEADER.size).astype(np.float32)
+    return np.array(json.loads(value), dtype=np.float32)
+
+
+def decode_embeddings(blobs):
+    """
+    Many BLOBs with the same header -> (N, dim) float32 matrix.
+
+    The rows are concatenated and viewed through a structured dtype
+    (header, vector) so the whole gallery is decoded in one frombuffer.
+    """
+    if not blobs:
+        return np.zeros((0, 0), dtype=np.float32)
+
+    header = bytes(blobs[0][:HEADER.size])
+    dtype, dim = read_header(header)
+    record = np.dtype([("hdr", "V%d" % HEADER.size), ("vec", dtype, (dim,))])
+
+    raw = b"".join(blobs)
+    if len(raw) != record.itemsize * len(blobs):
+        raise ValueError("Face encodings have mixed shapes.")
+
+    rows = np.frombuffer(raw, dtype=record)
+    if not (rows["hdr"] == np.void(header)).all():
+        raise ValueError("Face encodings have mixed headers.")
+
+    return rows["vec"].astype(np.float32)
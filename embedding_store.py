@@ -0,0 +1,229 @@
+# embedding_store.py
+"""
+Shared Embedding Store (memory-mapped)
+--------------------------------------
+One gallery snapshot per process instead of one copy per browser session.
+
+On disk (EMBEDDING_STORE_DIR):
+- gallery-<gen>.npy    L2-normalized float32 matrix (N x 512)
+- gallery-<gen>.json   sidecar: {"generation", "db_uid", "ids", "names", "keys"}
+- current.json         manifest pointing at the newest generation
+
+The matrix is opened with np.load(mmap_mode="r"), so every session, thread
+and worker process on the box shares the same page-cache pages (zero copy).
+
+Freshness comes from `gallery_state.generation` in SQLite, which db.py bumps
+in the same transaction as every encoding / student change, logging the
+students it touched (gallery_changes). When the generation moves, only those
+students are re-read and applied to the gallery in memory; a full snapshot
+is rebuilt when the log cannot cover the gap, and re-written once the
+in-memory gallery is GALLERY_SNAPSHOT_EVERY generations ahead of it. Files are written to a temp name and
+os.replace()d, so readers never see a half-written snapshot.
+"""
+
+import glob
+import json
+import os
+import threading
+
+import numpy as np
+
+from config import EMBEDDING_STORE_DIR, GALLERY_SNAPSHOT_EVERY
+from db import get_gallery_state
+from gallery import FaceGallery, l2_normalize, EMBEDDING_DIM
+
+
+_lock = threading.Lock()
+_current = None   # FaceGallery for the newest generation seen by this process
+
+
+# -------------------------------------------------------
+# FILE LAYOUT
+# -------------------------------------------------------
+
+def _paths(generation, store_dir=EMBEDDING_STORE_DIR):
+    base = os.path.join(store_dir, f"gallery-{generation}")
+    return base + ".npy", base + ".json"
+
+
+def _manifest_path(store_dir=EMBEDDING_STORE_DIR):
+    return os.path.join(store_dir, "current.json")
+
+
+def _atomic_write(path, write_fn):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        write_fn(f)
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------------
+# WRITE / READ SNAPSHOTS
+# -------------------------------------------------------
+
+def write_snapshot(generation, ids, names, encodings, store_dir=EMBEDDING_STORE_DIR, keys=None,
+                   db_uid=None):
+    """Persist one generation of the DB `db_uid` and point the manifest at it."""
+    os.makedirs(store_dir, exist_ok=True)
+    npy_path, meta_path = _paths(generation, store_dir)
+
+    if len(ids):
+        matrix = np.ascontiguousarray(l2_normalize(encodings))
+    else:
+        matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+    _atomic_write(npy_path, lambda f: np.save(f, matrix))
+    meta = {
+        "generation": generation,
+        "db_uid": db_uid,
+        "ids": list(ids),
+        "names": list(names),
+        "keys": list(keys) if keys is not None else list(ids),
+    }
+    _atomic_write(meta_path, lambda f: f.write(json.dumps(meta).encode("utf-8")))
+    _atomic_write(
+        _manifest_path(store_dir),
+        lambda f: f.write(json.dumps({"generation": generation, "db_uid": db_uid}).encode("utf-8")),
+    )
+    _remove_old_generations(generation, store_dir)
+
+
+def read_snapshot(generation, store_dir=EMBEDDING_STORE_DIR, db_uid=None):
+    """
+    Memory-mapped FaceGallery for a generation, or None if not on disk or
+    written for another DB (identity stamp != db_uid).
+    """
+    npy_path, meta_path = _paths(generation, store_dir)
+    try:
+        with open(meta_path, "rb") as f:
+            meta = json.loads(f.read().decode("utf-8"))
+        if meta.get("db_uid") != db_uid:
+            return None
+        if meta["ids"]:
+            matrix = np.load(npy_path, mmap_mode="r")
+        else:
+            matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    gallery = FaceGallery(meta["ids"], meta["names"], matrix, normalized=True, keys=meta.get("keys"))
+    gallery.generation = generation
+    gallery.db_uid = db_uid
+    return gallery
+
+
+def _remove_old_generations(keep_from, store_dir):
+    """
+    Delete snapshots older than the previous generation.
+    Open memory maps stay valid on POSIX; on Windows a mapped file cannot be
+    removed yet, so it is simply retried on the next publish.
+    """
+    for path in glob.glob(os.path.join(store_dir, "gallery-*.*")):
+        stem = os.path.basename(path).split(".")[0]
+        try:
+            gen = int(stem.split("-", 1)[1])
+        except ValueError:
+            continue
+        if gen < keep_from - 1:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# -------------------------------------------------------
+# PROCESS-WIDE ACCESS
+# -------------------------------------------------------
+
+def _manifest_generation(store_dir=EMBEDDING_STORE_DIR, db_uid=None):
+    """Newest stored generation of the DB `db_uid` (None: none / another DB's)."""
+    try:
+        with open(_manifest_path(store_dir), "rb") as f:
+            manifest = json.loads(f.read().decode("utf-8"))
+        if manifest.get("db_uid") != db_uid:
+            return None
+        return int(manifest["generation"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _apply_changes(base, changes):
+    """
+    Bring `base` up to date from the DB change log; None when the log cannot
+    (then the caller reloads in full). Once the result is
+    GALLERY_SNAPSHOT_EVERY generations ahead of the snapshot it grew from,
+    a fresh snapshot is written, so new processes start close to current.
+    """
+    delta = changes(base.generation)
+    if delta is None:
+        return None
+    generation, student_pks, ids, names, encs, keys = delta
+    gallery = base.apply_changes(student_pks, ids, names, encs, keys)
+    gallery.generation = generation
+    gallery.db_uid = base.db_uid
+    gallery.incremental = base.incremental + (generation - base.generation)
+
+    if gallery.incremental >= GALLERY_SNAPSHOT_EVERY:
+        write_snapshot(generation, gallery.ids, gallery.names, gallery.matrix, keys=gallery.keys,
+                       db_uid=base.db_uid)
+        fresh = read_snapshot(generation, db_uid=base.db_uid)
+        if fresh is not None:
+            fresh.index = gallery.index
+            gallery = fresh
+    return gallery
+
+
+def _is_current(gallery, generation, db_uid):
+    return gallery is not None and gallery.generation == generation and gallery.db_uid == db_uid
+
+
+def get_shared_gallery(loader, force=False, changes=None):
+    """
+    The gallery for the current DB generation, shared by all callers in
+    this process.
+
+    `changes(since)` (optional) returns what changed after a generation as
+    (generation, student PKs, ids, names, encodings, keys), or None; with
+    it, a moved generation is applied incrementally (FaceGallery
+    .apply_changes) to this process's gallery, or to the newest snapshot
+    on disk at startup.
+
+    `loader()` must return (ids, names, encodings[, keys]) from the DB; it
+    only runs when neither works (no snapshot yet, log pruned, force=True).
+
+    Only a gallery of exactly the DB's generation and identity is served:
+    snapshots of another DB, or from a generation the DB has not reached
+    (restored / recreated DB), are never used.
+    """
+    global _current
+
+    generation, db_uid = get_gallery_state()
+    current = _current
+    if not force and _is_current(current, generation, db_uid):
+        return current
+
+    with _lock:
+        if not force and _is_current(_current, generation, db_uid):
+            return _current
+
+        gallery = None
+        if not force:
+            base = _current if _current is not None and _current.db_uid == db_uid else None
+            if base is None:
+                base = read_snapshot(generation, db_uid=db_uid)
+            if base is None:
+                on_disk = _manifest_generation(db_uid=db_uid)
+                base = read_snapshot(on_disk, db_uid=db_uid) if on_disk is not None else None
+            if base is not None and base.generation < generation and changes is not None:
+                base = _apply_changes(base, changes)
+            gallery = base if base is not None and base.generation == generation else None
+
+        if gallery is None:
+            # read rows *after* the generation: a concurrent write bumps the
+            # generation again, so the next call rebuilds
+            ids, names, encs, *keys = loader()
+            write_snapshot(generation, ids, names, encs, keys=keys[0] if keys else None, db_uid=db_uid)
+            gallery = read_snapshot(generation, db_uid=db_uid)
+
+        _current = gallery
+        return gallery
@@ -0,0 +1,277 @@
+# face_model.py
+"""
+Face Model Provider
+-------------------
+Lazily builds ONE InsightFace model per process and shares it between all
+Streamlit sessions (modules are cached, so this survives reruns).
+
+Nothing heavy happens at import time: the login page and reports never pay
+for ONNX model loading. The first camera / registration call loads it, or
+warm_up_in_background() starts loading it early on a daemon thread.
+
+ONNX Runtime sessions are created here (not by insightface's FaceAnalysis)
+so thread counts, graph optimization, execution mode and the memory arena
+can be tuned from config.py, and optimized graphs can be cached on disk.
+"""
+
+import glob
+import logging
+import os
+import platform
+import threading
+
+from config import (
+    DET_SIZE,
+    FACE_MODEL_PACK,
+    FACE_MODEL_MODULES,
+    ORT_PROVIDERS,
+    ORT_INTRA_OP_THREADS,
+    ORT_INTER_OP_THREADS,
+    ORT_GRAPH_OPT_LEVEL,
+    ORT_EXECUTION_MODE,
+    ORT_CPU_MEM_ARENA,
+    ORT_OPTIMIZED_MODEL_DIR,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_face_app = None
+_warmup_thread = None
+
+# task of each file in the stock buffalo packs, so unused heads are never opened
+KNOWN_MODEL_TASKS = {
+    "det_10g.onnx": "detection",
+    "det_500m.onnx": "detection",
+    "w600k_r50.onnx": "recognition",
+    "w600k_mbf.onnx": "recognition",
+    "2d106det.onnx": "landmark_2d_106",
+    "1k3d68.onnx": "landmark_3d_68",
+    "genderage.onnx": "genderage",
+}
+
+
+# -------------------------------------------------------
+# ONNX RUNTIME SESSIONS
+# -------------------------------------------------------
+
+def ort_settings(**overrides):
+    """Session settings from config.py, with optional overrides (benchmarks)."""
+    settings = {
+        "providers": ORT_PROVIDERS,
+        "intra_op_threads": ORT_INTRA_OP_THREADS,
+        "inter_op_threads": ORT_INTER_OP_THREADS,
+        "graph_opt_level": ORT_GRAPH_OPT_LEVEL,
+        "execution_mode": ORT_EXECUTION_MODE,
+        "cpu_mem_arena": ORT_CPU_MEM_ARENA,
+        "optimized_model_dir": ORT_OPTIMIZED_MODEL_DIR,
+    }
+    settings.update(overrides)
+    return settings
+
+
+def make_session_options(settings):
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+    modes = {
+        "sequential": ort.ExecutionMode.ORT_SEQUENTIAL,
+        "parallel": ort.ExecutionMode.ORT_PARALLEL,
+    }
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = settings["intra_op_threads"]
+    opts.inter_op_num_threads = settings["inter_op_threads"]
+    opts.graph_optimization_level = levels[settings["graph_opt_level"]]
+    opts.execution_mode = modes[settings["execution_mode"]]
+    opts.enable_cpu_mem_arena = settings["cpu_mem_arena"]
+    opts.log_severity_level = 3
+    return opts
+
+
+def _cached_model_path(onnx_file, settings):
+    """
+    File name for the optimized graph of `onnx_file`. Optimized graphs can be
+    hardware specific, so the key includes ORT version and CPU architecture.
+    """
+    import onnxruntime as ort
+
+    st = os.stat(onnx_file)
+    name = os.path.splitext(os.path.basename(onnx_file))[0]
+    key = f"{name}-{st.st_size}-{int(st.st_mtime)}-{settings['graph_opt_level']}" \
+          f"-ort{ort.__version__}-{platform.machine()}.onnx"
+    return os.path.join(settings["optimized_model_dir"], key)
+
+
+def create_session(onnx_file, settings):
+    """
+    InferenceSession with tuned options. With an optimized-model cache, the
+    first run serializes the optimized graph and later runs load it with
+    optimizations disabled (faster session creation).
+    """
+    import onnxruntime as ort
+
+    opts = make_session_options(settings)
+    model_path = onnx_file
+
+    cache_dir = settings["optimized_model_dir"]
+    if cache_dir and settings["graph_opt_level"] != "disable":
+        cached = _cached_model_path(onnx_file, settings)
+        if os.path.exists(cached):
+            model_path = cached
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f"{cached}.{os.getpid()}.tmp"
+            opts.optimized_model_filepath = tmp
+            session = ort.InferenceSession(onnx_file, sess_options=opts,
+                                           providers=settings["providers"])
+            if os.path.exists(tmp):
+                os.replace(tmp, cached)
+            return session
+
+    return ort.InferenceSession(model_path, sess_options=opts, providers=settings["providers"])
+
+
+def _wrap_model(onnx_file, session):
+    """
+    insightface model wrapper for a session (same routing rules as
+    insightface.model_zoo.ModelRouter). The original file is passed as
+    model_file because ArcFaceONNX inspects its graph for input scaling.
+    """
+    from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+    from insightface.model_zoo.retinaface import RetinaFace
+    from insightface.model_zoo.landmark import Landmark
+    from insightface.model_zoo.attribute import Attribute
+
+    inputs = session.get_inputs()
+    input_shape = inputs[0].shape
+    outputs = session.get_outputs()
+
+    if len(outputs) >= 5:
+        return RetinaFace(model_file=onnx_file, session=session)
+    if input_shape[2] == 192 and input_shape[3] == 192:
+        return Landmark(model_file=onnx_file, session=session)
+    if input_shape[2] == 96 and input_shape[3] == 96:
+        return Attribute(model_file=onnx_file, session=session)
+    if input_shape[2] == input_shape[3] and input_shape[2] >= 112 and input_shape[2] % 16 == 0:
+        return ArcFaceONNX(model_file=onnx_file, session=session)
+    return None
+
+
+# -------------------------------------------------------
+# FACE MODEL (FaceAnalysis-compatible)
+# -------------------------------------------------------
+
+class FaceModel:
+    """
+    Drop-in for insightface's FaceAnalysis (`models`, `det_model`,
+    `prepare`, `get`) whose sessions use our ONNX Runtime settings and
+    which only opens the ONNX files for the requested modules.
+    """
+
+    def __init__(self, pack, modules=None, settings=None, root="~/.insightface"):
+        from insightface.utils import ensure_available
+
+        settings = settings or ort_settings()
+        self.models = {}
+        self.model_dir = ensure_available("models", pack, root=root)
+
+        for onnx_file in sorted(glob.glob(os.path.join(self.model_dir, "*.onnx"))):
+            task = KNOWN_MODEL_TASKS.get(os.path.basename(onnx_file))
+            if modules is not None and task is not None and task not in modules:
+                continue
+
+            model = _wrap_model(onnx_file, create_session(onnx_file, settings))
+            if model is None or model.taskname in self.models:
+                continue
+            if modules is not None and model.taskname not in modules:
+                continue
+            self.models[model.taskname] = model
+
+        if "detection" not in self.models:
+            raise RuntimeError(f"No detection model found in pack '{pack}'.")
+        self.det_model = self.models["detection"]
+
+    def prepare(self, ctx_id, det_thresh=0.5, det_size=(640, 640)):
+        self.det_thresh = det_thresh
+        self.det_size = det_size
+        for taskname, model in self.models.items():
+            if taskname == "detection":
+                model.prepare(ctx_id, input_size=det_size, det_thresh=det_thresh)
+            else:
+                model.prepare(ctx_id)
+
+    def get(self, img, max_num=0):
+        from insightface.app.common import Face
+
+        bboxes, kpss = self.det_model.detect(img, max_num=max_num, metric="default")
+        faces = []
+        for i in range(bboxes.shape[0]):
+            face = Face(
+                bbox=bboxes[i, 0:4],
+                kps=kpss[i] if kpss is not None else None,
+                det_score=bboxes[i, 4],
+            )
+            for taskname, model in self.models.items():
+                if taskname != "detection":
+                    model.get(img, face)
+            faces.append(face)
+        return faces
+
+
+def build_face_app(pack=FACE_MODEL_PACK, modules=FACE_MODEL_MODULES, settings=None):
+    """
+    A new, prepared FaceModel for `pack`, running only `modules`
+    (None = every model in the pack). Use get_face_app() in the app.
+    """
+    face_app = FaceModel(pack, modules=modules, settings=settings)
+    face_app.prepare(ctx_id=0, det_size=(DET_SIZE, DET_SIZE))
+    return face_app
+
+
+# -------------------------------------------------------
+# PROCESS SINGLETON
+# -------------------------------------------------------
+
+def get_face_app(settings=None):
+    """
+    The shared face model instance (built on first use, thread-safe).
+    `settings` (see ort_settings) only apply to that first build.
+    """
+    global _face_app
+    if _face_app is None:
+        with _lock:
+            if _face_app is None:
+                _face_app = build_face_app(settings=settings)
+    return _face_app
+
+
+def is_face_app_loaded() -> bool:
+    return _face_app is not None
+
+
+def warm_up_in_background():
+    """Start loading the model on a daemon thread (once per process)."""
+    global _warmup_thread
+    with _lock:
+        if _face_app is not None or _warmup_thread is not None:
+            return
+        _warmup_thread = threading.Thread(
+            target=_warm_up, name="face-model-warmup", daemon=True
+        )
+        _warmup_thread.start()
+
+
+def _warm_up():
+    try:
+        get_face_app()
+    except Exception as e:
+        # the first real call will raise again with the same error
+        logger.warning("background warm-up failed: %s", e)
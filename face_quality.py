@@ -0,0 +1,90 @@
+# face_quality.py
+"""
+Face Quality Scoring
+--------------------
+Cheap per-detection quality used to pick the best crop of each person in a
+capture burst (and to skip hopeless crops before the recognizer runs):
+
+- sharpness: variance of the Laplacian of the face, resized to a fixed size
+             so near and far faces are comparable
+- pose:      how frontal the face is, from the 5 detector landmarks
+- det_score: detector confidence
+- size:      face height in pixels
+
+Each term is mapped to [0, 1] and combined with QUALITY_WEIGHTS.
+Nothing here touches the ONNX models.
+"""
+
+import cv2
+import numpy as np
+
+from config import (
+    QUALITY_WEIGHTS,
+    QUALITY_MIN_SHARPNESS,
+    QUALITY_SHARPNESS_REF,
+    QUALITY_SIZE_REF,
+    QUALITY_MAX_YAW,
+)
+
+_SHARPNESS_SIDE = 64  # faces are resized to this before the Laplacian
+
+
+# -------------------------------------------------------
+# INDIVIDUAL TERMS
+# -------------------------------------------------------
+
+def sharpness(frame, box):
+    """Laplacian variance of the face region (higher = sharper)."""
+    h, w = frame.shape[:2]
+    x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+    x2, y2 = min(w, int(box[2])), min(h, int(box[3]))
+    if x2 <= x1 or y2 <= y1:
+        return 0.0
+
+    roi = frame[y1:y2, x1:x2]
+    if roi.ndim == 3:
+        roi = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+    roi = cv2.resize(roi, (_SHARPNESS_SIDE, _SHARPNESS_SIDE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(roi, cv2.CV_64F).var())
+
+
+def frontalness(kps):
+    """
+    1.0 for a frontal face, 0.0 at QUALITY_MAX_YAW or beyond.
+    Landmarks: left eye, right eye, nose, left mouth, right mouth.
+    Yaw is approximated by the nose offset from the eye midpoint,
+    relative to the eye distance.
+    """
+    if kps is None:
+        return 0.5
+    kps = np.asarray(kps, dtype=np.float32)
+    eye_dist = float(np.linalg.norm(kps[1] - kps[0]))
+    if eye_dist < 1e-3:
+        return 0.0
+    yaw = abs(kps[2, 0] - (kps[0, 0] + kps[1, 0]) / 2) / eye_dist
+    return float(np.clip(1.0 - yaw / QUALITY_MAX_YAW, 0.0, 1.0))
+
+
+# -------------------------------------------------------
+# COMBINED SCORE
+# -------------------------------------------------------
+
+def face_quality(frame, box, kps=None):
+    """
+    Quality terms and the weighted total for one detection.
+    `box` is [x1, y1, x2, y2, score] as returned by the detector.
+    """
+    sharp = sharpness(frame, box)
+    terms = {
+        "sharpness": min(1.0, sharp / QUALITY_SHARPNESS_REF),
+        "pose": frontalness(kps),
+        "det_score": float(box[4]) if len(box) > 4 else 1.0,
+        "size": min(1.0, float(box[3] - box[1]) / QUALITY_SIZE_REF),
+    }
+    score = sum(QUALITY_WEIGHTS.get(k, 0.0) * v for k, v in terms.items())
+    return {
+        "score": float(score),
+        "laplacian_var": sharp,
+        "usable": sharp >= QUALITY_MIN_SHARPNESS,
+        **terms,
+    }
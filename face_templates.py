@@ -0,0 +1,151 @@
+# face_templates.py
+"""
+Face Templates (several embeddings per student)
+-----------------------------------------------
+One enrollment photo rarely covers how a student shows up in class
+(glasses / no glasses, lighting, head turned). Every capture is therefore
+kept as its own template in the `face_templates` table, and matching scores
+a student over all of their templates (gallery.py, MATCH_TEMPLATE_AGG).
+
+- at most FACE_TEMPLATES_MAX templates per student: when a capture would
+  exceed the cap, the two most similar templates are merged (weighted
+  average) until the cap holds, so distinct looks survive and near
+  duplicates collapse
+- students.face_encoding keeps the weighted average of the templates, for
+  code that wants one vector per student
+- every change is mirrored into the ANN delta log, keyed by template id;
+  delete students and clear templates through remove_student() and
+  clear_all_templates() so removals are logged too
+"""
+
+import numpy as np
+
+from config import FACE_TEMPLATES_MAX
+from gallery import l2_normalize
+from ann_index import append_deltas
+from embedding_codec import encode_embedding, decode_embedding
+from db import (
+    transaction,
+    add_face_template,
+    replace_face_templates,
+    get_face_templates,
+    get_template_counts,
+    delete_student,
+    clear_all_face_encodings,
+)
+
+
+# -------------------------------------------------------
+# AGGREGATION
+# -------------------------------------------------------
+
+def template_centroid(embs, weights):
+    """Weighted average of unit templates, as a unit vector."""
+    embs = l2_normalize(embs)
+    weights = np.asarray(weights, dtype=np.float32)[:, None]
+    return l2_normalize((embs * weights).sum(axis=0))[0]
+
+
+def merge_templates(embs, weights, k=FACE_TEMPLATES_MAX):
+    """
+    Greedy agglomerative merge down to k templates: repeatedly replace the
+    most similar pair by its weighted average. Returns (embs, weights).
+    """
+    embs = [row for row in l2_normalize(embs)]
+    weights = [float(w) for w in weights]
+
+    while len(embs) > max(k, 1):
+        mat = np.stack(embs)
+        sims = mat @ mat.T
+        np.fill_diagonal(sims, -np.inf)
+        i, j = np.unravel_index(np.argmax(sims), sims.shape)
+        i, j = min(i, j), max(i, j)
+
+        w = weights[i] + weights[j]
+        embs[i] = l2_normalize(embs[i] * weights[i] + embs[j] * weights[j])[0]
+        weights[i] = w
+        del embs[j], weights[j]
+
+    return np.stack(embs), weights
+
+
+# -------------------------------------------------------
+# WRITE PATHS
+# -------------------------------------------------------
+
+def _load(student_pk, conn=None):
+    rows = get_face_templates(student_pk, conn=conn)
+    ids = [r["id"] for r in rows]
+    embs = [decode_embedding(r["embedding"]) for r in rows]
+    weights = [r["weight"] for r in rows]
+    return ids, embs, weights
+
+
+def _replace(student_pk, embs, weights, conn):
+    """Store merged templates + centroid; returns the ANN log records of the swap."""
+    removed, added = replace_face_templates(
+        student_pk,
+        [(encode_embedding(e), w) for e, w in zip(embs, weights)],
+        encode_embedding(template_centroid(embs, weights)),
+        conn=conn,
+    )
+    return [(tid, None) for tid in removed] + list(zip(added, embs))
+
+
+def add_student_template(student_pk, emb, max_templates=FACE_TEMPLATES_MAX):
+    """
+    Add one capture as a template of a student; merges templates when the
+    student would exceed max_templates. Read, cap check and write happen
+    in one BEGIN IMMEDIATE transaction, so concurrent captures of the same
+    student cannot both slip under the cap.
+    """
+    emb = l2_normalize(emb)[0]
+    with transaction(immediate=True) as conn:
+        _, embs, weights = _load(student_pk, conn)
+        embs.append(emb)
+        weights.append(1.0)
+
+        if len(embs) > max_templates:
+            merged, merged_weights = merge_templates(embs, weights, max_templates)
+            deltas = _replace(student_pk, merged, merged_weights, conn)
+        else:
+            template_id = add_face_template(
+                student_pk,
+                encode_embedding(emb),
+                encode_embedding(template_centroid(embs, weights)),
+                conn=conn,
+            )
+            deltas = [(template_id, emb)]
+
+    # after the commit: the log must never mention uncommitted templates
+    append_deltas(deltas)
+
+
+def compact_all_templates(max_templates=FACE_TEMPLATES_MAX):
+    """
+    Merge every student down to max_templates (e.g. after lowering the cap).
+    Returns the number of students compacted.
+    """
+    compacted = 0
+    for student_pk, count in get_template_counts().items():
+        if count <= max_templates:
+            continue
+        with transaction(immediate=True) as conn:
+            _, embs, weights = _load(student_pk, conn)
+            merged, merged_weights = merge_templates(embs, weights, max_templates)
+            deltas = _replace(student_pk, merged, merged_weights, conn)
+        append_deltas(deltas)
+        compacted += 1
+    return compacted
+
+
+def remove_student(student_pk, delete_attendance=False):
+    """Delete a student (db.delete_student) and log removal of their templates."""
+    removed = delete_student(student_pk, delete_attendance=delete_attendance)
+    append_deltas([(tid, None) for tid in removed])
+
+
+def clear_all_templates():
+    """Drop every face template (db.clear_all_face_encodings) and log the removals."""
+    removed = clear_all_face_encodings()
+    append_deltas([(tid, None) for tid in removed])
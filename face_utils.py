@@ -2,25 +2,28 @@
 
 import cv2
 import numpy as np
-import json
 from datetime import datetime
-import insightface
-from insightface.app import FaceAnalysis
+
+import metrics
+from config import ANN_MIN_GALLERY, FACE_EMBED_BATCH, DET_MODE, GALLERY_SCOPE_FALLBACK
+from detection import detect_adaptive
+from face_quality import face_quality
+from tracker import FaceTracker
+from face_model import get_face_app
+from gallery import FaceGallery, l2_normalize
+from ann_index import load_or_build_index
+from face_templates import add_student_template
+from embedding_store import get_shared_gallery
+from embedding_codec import decode_embedding, decode_embeddings, is_blob
 
 from db import (
-    update_student_face_encoding,
     get_all_students_with_encodings,
-    has_attendance_for_date,
-    insert_attendance,
+    get_all_face_templates,
+    get_gallery_changes,
+    get_student_pks,
+    insert_attendance_once,
 )
 
-# -------------------------
-# INIT ARC FACE MODEL
-# -------------------------
-app = FaceAnalysis(name="buffalo_l", providers=['CPUExecutionProvider'])
-app.prepare(ctx_id=0, det_size=(640, 640))
-
-
 # -------------------------
 # HELPER: COSINE DISTANCE
 # -------------------------
@@ -32,6 +35,59 @@ def cosine_distance(a, b):
     return 1 - np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
 
 
+# -------------------------
+# DETECT + BATCH EMBED
+# -------------------------
+def detect_faces(frame, mode=DET_MODE):
+    """
+    Run only the detector, at a resolution chosen for `mode`
+    ("registration", "auto", "full" or "tiled" - see detection.py).
+    Returns (bboxes, kpss): bboxes is (n, 5) [x1, y1, x2, y2, score],
+    kpss is (n, 5, 2) landmarks used for alignment.
+    """
+    with metrics.timer("detect"):
+        bboxes, kpss = detect_adaptive(get_face_app().det_model, frame, mode)
+    metrics.count("faces_detected", len(bboxes))
+    return bboxes, kpss
+
+
+def align_faces(frame, kpss):
+    """Aligned recognizer-sized crops (list of HxWx3 BGR images)."""
+    from insightface.utils import face_align  # heavy import, model is loaded by now anyway
+
+    rec = get_face_app().models["recognition"]
+    size = rec.input_size[0]
+    with metrics.timer("align"):
+        return [face_align.norm_crop(frame, landmark=k, image_size=size) for k in kpss]
+
+
+def embed_aligned_faces(crops):
+    """
+    L2-normalized embeddings (n, 512) for aligned crops, computed with ONE
+    recognizer call per FACE_EMBED_BATCH crops instead of one per face.
+    Crops may come from several frames of a burst.
+    """
+    if len(crops) == 0:
+        return np.zeros((0, 512), dtype=np.float32)
+
+    rec = get_face_app().models["recognition"]
+    batch = rec.input_shape[0]
+    # models exported with a fixed batch dimension can only take that many
+    step = batch if isinstance(batch, int) and batch > 0 else FACE_EMBED_BATCH
+
+    with metrics.timer("embed"):
+        feats = [rec.get_feat(list(crops[i:i + step])) for i in range(0, len(crops), step)]
+    return l2_normalize(np.concatenate(feats))
+
+
+def detect_and_embed(frame, mode=DET_MODE):
+    """Detector, then recognizer once (batched). Returns (bboxes, embeddings)."""
+    bboxes, kpss = detect_faces(frame, mode)
+    if len(bboxes) == 0:
+        return bboxes, np.zeros((0, 512), dtype=np.float32)
+    return bboxes, embed_aligned_faces(align_faces(frame, kpss))
+
+
 # -------------------------
 # ENCODE FACE (REGISTRATION)
 # -------------------------
@@ -39,14 +95,14 @@ def encode_single_face_from_frame(frame):
     if frame is None:
         return None
 
-    faces = app.get(frame)
-    if len(faces) == 0:
+    bboxes, kpss = detect_faces(frame, mode="registration")
+    if len(bboxes) == 0:
         return None
 
     # pick the biggest face
-    faces = sorted(faces, key=lambda f: f.bbox[2] - f.bbox[0], reverse=True)
+    biggest = int(np.argmax(bboxes[:, 2] - bboxes[:, 0]))
 
-    emb = faces[0].normed_embedding  # 512D embedding
+    emb = embed_aligned_faces(align_faces(frame, kpss[biggest:biggest + 1]))[0]  # 512D
     emb = emb.astype("float32")
 
     return emb
@@ -56,79 +112,290 @@ def encode_single_face_from_frame(frame):
 # SAVE ENCODING TO DB
 # -------------------------
 def save_student_face_encoding(student_id, emb):
-    enc_json = json.dumps(emb.tolist())
-    update_student_face_encoding(student_id, enc_json)
+    """Add a capture as one more face template of the student (see face_templates.py)."""
+    add_student_template(student_id, emb)
 
 
 # -------------------------
 # LOAD KNOWN ENCODINGS
 # -------------------------
 def load_known_face_encodings():
+    """
+    Returns (ids, names, encs) with encs as an (N, 512) float32 matrix.
+    Binary rows are decoded in one pass; legacy JSON rows (not yet
+    migrated by init_db) are decoded individually.
+    """
     rows = get_all_students_with_encodings()
 
-    ids = []
-    names = []
-    encs = []
-
+    blob_rows = [r for r in rows if is_blob(r["face_encoding"])]
+    ids = [r["id"] for r in blob_rows]
+    names = [r["name"] for r in blob_rows]
+    try:
+        encs = decode_embeddings([r["face_encoding"] for r in blob_rows])
+    except ValueError:
+        # mixed dtypes (e.g. float16 + float32) - decode row by row
+        encs = np.stack([decode_embedding(r["face_encoding"]) for r in blob_rows]) \
+            if blob_rows else np.zeros((0, 0), dtype=np.float32)
+
+    legacy_ids, legacy_names, legacy_encs = [], [], []
     for r in rows:
+        if is_blob(r["face_encoding"]):
+            continue
         try:
-            arr = np.array(json.loads(r["face_encoding"]), dtype="float32")
-            ids.append(r["id"])
-            names.append(r["name"])
-            encs.append(arr)
-        except:
+            legacy_encs.append(decode_embedding(r["face_encoding"]))
+        except (ValueError, TypeError):
             continue
+        legacy_ids.append(r["id"])
+        legacy_names.append(r["name"])
+
+    if legacy_encs:
+        legacy = np.stack(legacy_encs)
+        encs = np.concatenate([encs, legacy]) if len(encs) else legacy
+        ids += legacy_ids
+        names += legacy_names
 
     return ids, names, encs
 
 
+def _template_rows_to_arrays(rows):
+    ids = [r["student_id"] for r in rows]
+    names = [r["name"] for r in rows]
+    keys = [r["id"] for r in rows]
+    if not rows:
+        return ids, names, np.zeros((0, 0), dtype=np.float32), keys
+    try:
+        encs = decode_embeddings([r["embedding"] for r in rows])
+    except ValueError:
+        encs = np.stack([decode_embedding(r["embedding"]) for r in rows])
+    return ids, names, encs, keys
+
+
+def load_face_templates():
+    """
+    Returns (ids, names, encs, keys): one row per face template, grouped by
+    student; keys are the template ids.
+    """
+    return _template_rows_to_arrays(get_all_face_templates())
+
+
+def load_gallery_changes(since):
+    """
+    Templates of the students changed after generation `since`, as
+    (generation, student PKs, ids, names, encs, keys); None = reload in full.
+    """
+    delta = get_gallery_changes(since)
+    if delta is None:
+        return None
+    generation, student_pks, rows = delta
+    return (generation, student_pks, *_template_rows_to_arrays(rows))
+
+
 # -------------------------
 # RECOGNIZE MULTIPLE FACES
 # -------------------------
 MATCH_THRESHOLD = 0.35
 
-def recognize_faces_in_frame(frame, known_encs, known_ids, known_names):
+def load_face_gallery(force=False):
+    """
+    Known encodings as a FaceGallery, shared process-wide through the
+    memory-mapped embedding store. Cheap to call on every capture: when the
+    DB gallery generation moved it applies just the changed students (an
+    enrollment costs O(1)); force=True reloads everything.
+    """
+    gallery = get_shared_gallery(load_face_templates, force=force, changes=load_gallery_changes)
+    if gallery.index is None and len(gallery) >= ANN_MIN_GALLERY:
+        gallery.index = load_or_build_index(gallery)
+    return gallery
+
+
+def load_scoped_gallery(cls=None, sec=None, fallback=GALLERY_SCOPE_FALLBACK):
+    """
+    The gallery partition of one class / section (the whole gallery when
+    neither is given). Partitions are cached on the shared gallery and
+    rebuilt after any student / encoding change. With fallback, faces not
+    found in the class are matched school-wide and flagged "visiting".
+    """
+    gallery = load_face_gallery()
+    if not cls and not sec:
+        return gallery
+    return gallery.partition((cls or None, sec or None), lambda: get_student_pks(cls, sec), fallback)
+
+
+def _is_visiting(gallery, sid):
+    """Matched through a partition's fallback, i.e. from another class."""
+    return sid is not None and gallery.fallback is not None and not gallery.has_student(sid)
+
+
+def recognize_faces_in_frame(frame, known_encs, known_ids=None, known_names=None):
+    """
+    Detect and identify every face in the frame.
+    `known_encs` may be a FaceGallery or the plain lists from
+    load_known_face_encodings(); all faces are matched in one matrix product.
+    """
     results = []
     if frame is None:
         return results
 
-    faces = app.get(frame)
-    if len(faces) == 0:
+    bboxes, embs = detect_and_embed(frame)
+    if len(bboxes) == 0:
         return results
 
-    for f in faces:
-        emb = f.normed_embedding.astype("float32")
-        bbox = f.bbox.astype(int)
-        top, left = bbox[1], bbox[0]
-        bottom, right = bbox[3], bbox[2]
-
-        # Match with known encodings
-        best_dist = 10
-        best_idx = -1
-
-        for i, known_emb in enumerate(known_encs):
-            d = cosine_distance(known_emb, emb)
-            if d < best_dist:
-                best_dist = d
-                best_idx = i
-
-        if best_dist <= MATCH_THRESHOLD:
-            sid = known_ids[best_idx]
-            name = known_names[best_idx]
-        else:
-            sid = None
-            name = "Unknown"
+    if isinstance(known_encs, FaceGallery):
+        gallery = known_encs
+    else:
+        gallery = FaceGallery(known_ids, known_names, known_encs)
+
+    matches = match_embeddings(gallery, embs)
 
+    for box, (sid, name, dist) in zip(bboxes, matches):
         results.append({
             "student_id": sid,
             "name": name,
-            "location": (top, right, bottom, left),
-            "distance": float(best_dist),
+            "location": _box_to_location(box),
+            "distance": dist,
+            "visiting": _is_visiting(gallery, sid),
         })
 
     return results
 
 
+def match_embeddings(gallery, embs):
+    """gallery.match at MATCH_THRESHOLD, timed as the "match" stage."""
+    with metrics.timer("match"):
+        matches = gallery.match(embs, MATCH_THRESHOLD)
+    metrics.count("faces_matched", sum(m[0] is not None for m in matches))
+    return matches
+
+
+def _box_to_location(box):
+    """[x1, y1, x2, y2, ...] -> (top, right, bottom, left) ints."""
+    bbox = np.asarray(box[:4]).astype(int)
+    return (bbox[1], bbox[2], bbox[3], bbox[0])
+
+
+# -------------------------
+# RECOGNIZE A CAPTURE BURST
+# -------------------------
+def link_burst_detections(detections):
+    """
+    Group per-frame detections into people with the cross-frame tracker.
+    `detections` is a list (one per frame) of bboxes arrays; returns a list
+    of tracks, each a list of (frame_index, face_index).
+    """
+    tracker = FaceTracker()
+    tracks = {}
+    for fi, bboxes in enumerate(detections):
+        for j, track in enumerate(tracker.update(bboxes)):
+            tracks.setdefault(track.track_id, []).append((fi, j))
+    return list(tracks.values())
+
+
+def recognize_faces_in_burst(frames, gallery):
+    """
+    Recognize everyone seen in a short burst of frames.
+
+    The detector runs on every frame, faces are linked across frames, each
+    detection gets a quality score (face_quality.py) and only the best crop
+    per person is aligned and embedded - in one batched recognizer call.
+    People whose every crop is too blurry are reported with
+    student_id None and "skipped": True instead of being embedded.
+
+    Result dicts are the same as recognize_faces_in_frame, with "location"
+    taken from the person's latest frame (so boxes line up with frames[-1]),
+    plus "quality" and "best_frame". "visiting" marks students matched
+    outside a scoped gallery (load_scoped_gallery).
+    """
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        return []
+
+    detections, landmarks = [], []
+    for frame in frames:
+        bboxes, kpss = detect_faces(frame)
+        detections.append(bboxes)
+        landmarks.append(kpss)
+
+    best = []   # (track, frame_index, face_index, quality)
+    for track in link_burst_detections(detections):
+        scored = [
+            (fi, j, face_quality(frames[fi], detections[fi][j], landmarks[fi][j]))
+            for fi, j in track
+        ]
+        fi, j, q = max(scored, key=lambda s: (s[2]["usable"], s[2]["score"]))
+        best.append((track, fi, j, q))
+
+    usable = [b for b in best if b[3]["usable"]]
+    crops = []
+    for _, fi, j, _ in usable:
+        crops.extend(align_faces(frames[fi], landmarks[fi][j:j + 1]))
+    embs = embed_aligned_faces(crops)
+    matches = iter(match_embeddings(gallery, embs) if len(embs) else [])
+
+    results = []
+    for track, fi, j, q in best:
+        lf, lj = track[-1]
+        result = {
+            "location": _box_to_location(detections[lf][lj]),
+            "quality": q["score"],
+            "best_frame": fi,
+        }
+        if q["usable"]:
+            sid, name, dist = next(matches)
+            result.update(student_id=sid, name=name, distance=dist, skipped=False,
+                          visiting=_is_visiting(gallery, sid))
+        else:
+            result.update(student_id=None, name="Blurry", distance=None, skipped=True,
+                          visiting=False)
+        results.append(result)
+
+    return results
+
+
+# -------------------------
+# RECOGNIZE WITH A TRACKER (VIDEO)
+# -------------------------
+def recognize_tracked_frame(frame, tracker, gallery):
+    """
+    Recognize one video frame, re-using identities cached on `tracker`
+    (a tracker.FaceTracker kept by the caller across frames).
+
+    Every frame is detected, but only tracks that are new, low confidence
+    or stale are aligned and embedded (one batched call); blurry crops of
+    such tracks wait for a sharper frame. Result dicts match
+    recognize_faces_in_frame plus "track_id".
+    """
+    if frame is None:
+        return []
+
+    bboxes, kpss = detect_faces(frame)
+    assigned = tracker.update(bboxes)
+
+    todo = []
+    for j in tracker.pending(assigned):
+        q = face_quality(frame, bboxes[j], kpss[j])
+        if q["usable"]:
+            todo.append((j, q["score"]))
+
+    if todo:
+        crops = align_faces(frame, np.stack([kpss[j] for j, _ in todo]))
+        embs = embed_aligned_faces(crops)
+        matches = match_embeddings(gallery, embs)
+        for (j, score), emb, (sid, name, dist) in zip(todo, embs, matches):
+            tracker.record(assigned[j], sid, name, dist, emb, score)
+
+    return [
+        {
+            "student_id": t.student_id,
+            "name": t.name,
+            "location": _box_to_location(t.box),
+            "distance": t.distance,
+            "track_id": t.track_id,
+            "visiting": _is_visiting(gallery, t.student_id),
+        }
+        for t in assigned
+    ]
+
+
 # -------------------------
 # DRAW FACE BOXES
 # -------------------------
@@ -154,6 +421,11 @@ def draw_face_boxes(frame, results):
 # MARK ATTENDANCE
 # -------------------------
 def mark_attendance_from_results(results, user_id, already_today):
+    with metrics.timer("db_write"):
+        return _mark_attendance(results, user_id, already_today)
+
+
+def _mark_attendance(results, user_id, already_today):
     today = datetime.now().strftime("%Y-%m-%d")
     time_now = datetime.now().strftime("%H:%M:%S")
 
@@ -170,12 +442,12 @@ def mark_attendance_from_results(results, user_id, already_today):
         if sid in already_today:
             continue
 
-        if has_attendance_for_date(sid, today):
+        # check + insert in one transaction (one connection per face)
+        if not insert_attendance_once(sid, today, time_now, "Present", user_id):
             already_today.add(sid)
             logs.append(f"{name} already marked today.")
             continue
 
-        insert_attendance(sid, today, time_now, "Present", user_id)
         logs.append(f"Marked {name} present at {time_now}")
         already_today.add(sid)
         new.append(sid)
@@ -0,0 +1,395 @@
+# gallery.py
+"""
+Face Gallery (vectorized matching)
+----------------------------------
+Holds all known face embeddings as ONE contiguous, L2-normalized float32
+matrix so a whole frame of faces is matched with a single matrix product
+instead of a Python loop over every (face, student) pair.
+
+Cosine distance on unit vectors is simply `1 - dot(a, b)`, so the best match
+for every face is an argmax over `queries @ matrix.T`.
+
+A student may own several rows (face templates, see face_templates.py).
+Their similarities are combined per student (MATCH_TEMPLATE_AGG): "max"
+takes the best template, "mean" averages over all of them.
+
+Large galleries can attach an approximate index (see ann_index.py); it is
+only consulted once the gallery reaches ANN_MIN_GALLERY template rows.
+"""
+
+import numpy as np
+
+from config import (
+    ANN_MIN_GALLERY,
+    ANN_RERANK_K,
+    MATCH_TEMPLATE_AGG,
+)
+
+
+EMBEDDING_DIM = 512
+_SPARE_ROWS = 1024   # headroom for appends when apply_changes() copies the matrix
+
+
+# -------------------------------------------------------
+# HELPERS
+# -------------------------------------------------------
+
+def l2_normalize(vectors):
+    """
+    Row-wise L2 normalization into float32.
+    Zero rows stay zero (they can never match, same as cosine_distance).
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _compress(values, keep):
+    """List of values[i] where keep[i] (bulk, via an object array)."""
+    return np.array(values, dtype=object)[keep].tolist()
+
+
+def _segment_rows(starts, counts):
+    """Concatenated ranges starts[i] .. starts[i] + counts[i] - 1."""
+    offsets = np.repeat(starts - np.r_[0, np.cumsum(counts)[:-1]], counts)
+    return np.arange(int(counts.sum())) + offsets
+
+
+def _segment_argmax(values, counts):
+    """
+    Position (in `values`) of the maximum of every segment; segments are
+    consecutive runs of counts[i] > 0 values.
+    """
+    segment = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((-values, segment))
+    return order[np.r_[0, np.cumsum(counts)[:-1]]]
+
+
+# -------------------------------------------------------
+# GALLERY
+# -------------------------------------------------------
+
+class FaceGallery:
+    """
+    Immutable snapshot of the known faces.
+
+    ids[i] / names[i] describe row i of `matrix` (N x D, unit rows); a
+    student with several templates appears on several rows. keys[i] is the
+    unique key of row i (face_templates id; defaults to ids).
+
+    apply_changes() derives the next snapshot from a few changed students
+    instead of reloading everything from the DB.
+
+    partition() gives a cached sub-gallery (e.g. one class / section);
+    with `fallback` set, faces unknown to it are matched against the
+    fallback gallery (visiting students).
+    """
+
+    def __init__(self, ids, names, encodings, normalized=False, keys=None):
+        self.ids = list(ids)
+        self.names = list(names)
+        self.keys = list(keys) if keys is not None else list(self.ids)
+        self.index = None      # optional ann_index.IVFIndex
+        self.generation = None  # DB gallery generation (embedding_store)
+        self.db_uid = None      # identity of that DB (embedding_store)
+        self._row_of = None
+        self._groups = None
+        self._rows_of_student = None
+        self._buffer = None     # [rows array, rows used], shared along apply_changes()
+        self._partitions = {}   # scope -> sub-gallery, dropped with this snapshot
+        self.fallback = None    # gallery consulted for faces unknown to this one
+        self.incremental = 0    # generations applied since the last snapshot (embedding_store)
+
+        if len(self.ids) == 0:
+            self.matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        elif normalized:
+            # caller guarantees unit rows (e.g. a stored snapshot) - no copy
+            self.matrix = np.asarray(encodings, dtype=np.float32)
+        else:
+            self.matrix = np.ascontiguousarray(l2_normalize(encodings))
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def row_of(self, key):
+        """Gallery row for a row key (-1 if absent)."""
+        if self._row_of is None:
+            self._row_of = {k: i for i, k in enumerate(self.keys)}
+        return self._row_of.get(key, -1)
+
+    def rows_of_student(self, student_id):
+        """All gallery rows of a student PK (empty array if absent)."""
+        if self._rows_of_student is None:
+            rows = {}
+            for i, sid in enumerate(self.ids):
+                rows.setdefault(sid, []).append(i)
+            self._rows_of_student = {sid: np.array(r, dtype=np.int64) for sid, r in rows.items()}
+        return self._rows_of_student.get(student_id, np.zeros(0, dtype=np.int64))
+
+    def has_student(self, student_id):
+        return len(self.rows_of_student(student_id)) > 0
+
+    def subset(self, rows):
+        """Sub-gallery of the given rows, with its own contiguous matrix."""
+        rows = np.asarray(rows, dtype=np.int64)
+        gallery = FaceGallery(
+            [self.ids[r] for r in rows],
+            [self.names[r] for r in rows],
+            np.ascontiguousarray(self.matrix[rows]) if len(rows) else None,
+            normalized=True,
+            keys=[self.keys[r] for r in rows],
+        )
+        gallery.generation = self.generation
+        gallery.db_uid = self.db_uid
+        return gallery
+
+    def partition(self, scope, student_pks, fallback=False):
+        """
+        Cached sub-gallery of the students `student_pks` (a callable, only
+        called on a cache miss), keyed by `scope`. The cache lives on this
+        snapshot, so any student / encoding change (a new snapshot) drops it.
+        With fallback=True, faces unknown to the partition are matched
+        against this whole gallery.
+        """
+        key = (scope, fallback)
+        part = self._partitions.get(key)
+        if part is None:
+            rows = [r for pk in student_pks() for r in self.rows_of_student(pk)]
+            part = self.subset(sorted(rows))
+            part.fallback = self if fallback else None
+            self._partitions[key] = part
+        return part
+
+    def _student_groups(self):
+        """
+        (order, starts, counts): gallery columns permuted so each student's
+        rows are adjacent (order is None when they already are), the first
+        column of every student and their template counts.
+        """
+        if self._groups is None:
+            ids = np.asarray(self.ids)
+            order = None
+            if len(ids) > 1 and not (ids[1:] >= ids[:-1]).all():
+                order = np.argsort(ids, kind="stable")
+                ids = ids[order]
+            starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            counts = np.diff(np.r_[starts, len(ids)])
+            self._groups = (order, starts, counts)
+        return self._groups
+
+    def uses_index(self):
+        return self.index is not None and len(self) >= ANN_MIN_GALLERY
+
+    def apply_changes(self, student_pks, ids, names, encodings, keys):
+        """
+        New gallery in which the students `student_pks` have exactly the
+        given rows (their current templates; none = removed). Rows are
+        matched by key: unchanged templates are kept, renames are applied.
+
+        Only the changed students' rows are inspected in Python; the rest
+        is copied in bulk (list / dict copies, numpy masks). Pure additions
+        (the usual enrollment) are appended into spare capacity of a buffer
+        shared with this gallery; only removals, or a full buffer, copy
+        the matrix, with at most _SPARE_ROWS rows of headroom.
+        """
+        changed = set(student_pks)
+        incoming = set(keys)
+        new_names = dict(zip(ids, names))
+
+        old_rows = np.concatenate([self.rows_of_student(pk) for pk in changed]) \
+            if changed else np.zeros(0, dtype=np.int64)
+        drop_rows = np.array([r for r in old_rows.tolist() if self.keys[r] not in incoming],
+                             dtype=np.int64)
+        add = [i for i, k in enumerate(keys) if self.row_of(k) < 0]
+        add_vecs = l2_normalize(np.asarray(encodings)[add]) if add else \
+            np.zeros((0, self.dim), dtype=np.float32)
+
+        out_ids, out_keys, out_names = list(self.ids), list(self.keys), list(self.names)
+        for r in old_rows.tolist():
+            out_names[r] = new_names.get(out_ids[r], out_names[r])
+
+        keep = None
+        if len(drop_rows):
+            keep = np.ones(len(self), dtype=bool)
+            keep[drop_rows] = False
+            out_ids = _compress(out_ids, keep)
+            out_keys = _compress(out_keys, keep)
+            out_names = _compress(out_names, keep)
+        out_ids += [ids[i] for i in add]
+        out_keys += [keys[i] for i in add]
+        out_names += [names[i] for i in add]
+
+        gallery = FaceGallery([], [], None)
+        gallery.ids, gallery.names, gallery.keys = out_ids, out_names, out_keys
+        gallery.generation = self.generation
+        gallery.db_uid = self.db_uid
+        gallery.index = self.index
+        if keep is None:
+            gallery._carry_lookups(self, changed, [keys[i] for i in add])
+
+        n_keep = len(self) - len(drop_rows)
+        buf = self._buffer
+        if keep is None and buf is not None and buf[1] == len(self) \
+                and len(buf[0]) >= len(self) + len(add):
+            # append in place: older galleries only ever read rows [:their len]
+            buf[0][len(self):len(self) + len(add)] = add_vecs
+        else:
+            capacity = n_keep + len(add) + min(_SPARE_ROWS, max(16, (n_keep + len(add)) // 8))
+            rows = np.empty((capacity, self.dim), dtype=np.float32)
+            rows[:n_keep] = self.matrix if keep is None else self.matrix[keep]
+            rows[n_keep:n_keep + len(add)] = add_vecs
+            buf = [rows, 0]
+        buf[1] = len(out_ids)
+        gallery._buffer = buf
+        gallery.matrix = buf[0][:len(out_ids)]
+
+        if self.index is not None and (len(drop_rows) or add):
+            # copy on write: older galleries still search self.index
+            gallery.index = self.index.copy()
+            for r in drop_rows.tolist():
+                gallery.index.remove(int(self.keys[r]))
+            for i, vec in zip(add, add_vecs):
+                gallery.index.upsert(keys[i], vec)
+        return gallery
+
+    def _carry_lookups(self, base, changed, added_keys):
+        """
+        Row lookups of `base` + appended rows (no row moved): copies of
+        its dicts patched for the new keys / changed students, instead of
+        rebuilding them from every row.
+        """
+        n_old = len(base)
+        if base._row_of is not None:
+            self._row_of = dict(base._row_of)
+            self._row_of.update((k, n_old + j) for j, k in enumerate(added_keys))
+        if base._rows_of_student is not None:
+            self._rows_of_student = dict(base._rows_of_student)
+            new_rows = {}
+            for r in range(n_old, len(self)):
+                new_rows.setdefault(self.ids[r], []).append(r)
+            for sid, rows in new_rows.items():
+                self._rows_of_student[sid] = np.concatenate(
+                    [base.rows_of_student(sid), np.array(rows, dtype=np.int64)]
+                )
+
+    def search(self, queries, agg=MATCH_TEMPLATE_AGG):
+        """
+        Best gallery row for every query embedding, scoring every student
+        over all of their templates (`agg` = "max" or "mean").
+
+        Returns (best_idx, best_dist) arrays of length len(queries);
+        best_idx is the best row of the winning student (-1 when the
+        gallery is empty) and best_dist its aggregated cosine distance.
+        """
+        queries = l2_normalize(queries)
+        n = queries.shape[0]
+
+        if len(self) == 0 or n == 0:
+            return np.full(n, -1, dtype=np.int64), np.full(n, 10.0, dtype=np.float32)
+
+        if self.uses_index():
+            top_keys, _ = self.index.search(queries, k=ANN_RERANK_K)
+            candidates = np.array([[self.row_of(int(k)) if k >= 0 else -1 for k in keys]
+                                   for keys in top_keys], dtype=np.int64)
+            return self._rerank(queries, candidates, agg)
+
+        sims = queries @ self.matrix.T            # (n_faces, n_gallery)
+        best_idx = np.argmax(sims, axis=1)
+        best_sim = sims[np.arange(n), best_idx]
+
+        order, starts, counts = self._student_groups()
+        if agg == "mean" and len(starts) < len(self):
+            grouped = sims if order is None else sims[:, order]
+            scores = np.add.reduceat(grouped, starts, axis=1) / counts
+            best_group = np.argmax(scores, axis=1)
+            best_sim = scores[np.arange(n), best_group]
+            # report the student's closest template as the row
+            cols = _segment_rows(starts[best_group], counts[best_group])
+            q_of = np.repeat(np.arange(n), counts[best_group])
+            best = cols[_segment_argmax(grouped[q_of, cols], counts[best_group])]
+            best_idx = best if order is None else order[best]
+
+        return best_idx, (1.0 - best_sim).astype(np.float32)
+
+    def _rerank(self, queries, candidates, agg):
+        """
+        Exact float32 scores for a shortlist: candidates[i] are gallery rows
+        proposed for query i (ANN index, -1 = none); every
+        student among them is scored over ALL of their templates.
+
+        Vectorized over (query, candidate student) pairs: one gathered dot
+        product per pair row, then segment reductions per pair and query.
+        """
+        n = queries.shape[0]
+        best_idx = np.full(n, -1, dtype=np.int64)
+        best_dist = np.full(n, 10.0, dtype=np.float32)
+
+        candidates = np.asarray(candidates, dtype=np.int64).reshape(n, -1)
+        valid = candidates >= 0
+        if not valid.any():
+            return best_idx, best_dist
+
+        # unique (query, student) pairs, sorted by query
+        qi, _ = np.nonzero(valid)
+        students, s_of = np.unique(np.asarray(self.ids)[candidates[valid]], return_inverse=True)
+        pairs = np.unique(qi * len(students) + s_of)
+        pair_q, pair_s = pairs // len(students), pairs % len(students)
+
+        groups = [self.rows_of_student(sid) for sid in students.tolist()]
+        student_rows = np.concatenate(groups)
+        s_counts = np.array([len(g) for g in groups])
+        s_starts = np.r_[0, np.cumsum(s_counts)[:-1]]
+
+        counts = s_counts[pair_s]
+        rows = student_rows[_segment_rows(s_starts[pair_s], counts)]
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        q_of = np.repeat(pair_q, counts)
+        sims = np.einsum("ij,ij->i", self.matrix[rows], queries[q_of])
+
+        if agg == "mean":
+            scores = np.add.reduceat(sims, starts) / counts
+        else:
+            scores = np.maximum.reduceat(sims, starts)
+
+        q_counts = np.bincount(pair_q, minlength=n)
+        found = q_counts > 0
+        best_pair = _segment_argmax(scores, q_counts[found])
+        # the student's closest template is reported as the row
+        sel = _segment_rows(starts[best_pair], counts[best_pair])
+        best_row = sel[_segment_argmax(sims[sel], counts[best_pair])]
+
+        best_idx[found] = rows[best_row]
+        best_dist[found] = 1.0 - scores[best_pair]
+        return best_idx, best_dist
+
+    def match(self, queries, threshold, agg=MATCH_TEMPLATE_AGG):
+        """
+        Match embeddings and resolve identities.
+
+        Returns a list of (student_id, name, distance) tuples; student_id is
+        None and name is "Unknown" when the best distance exceeds threshold.
+        """
+        best_idx, best_dist = self.search(queries, agg)
+
+        matches = []
+        for idx, dist in zip(best_idx, best_dist):
+            if idx >= 0 and dist <= threshold:
+                matches.append((self.ids[idx], self.names[idx], float(dist)))
+            else:
+                matches.append((None, "Unknown", float(dist)))
+
+        if self.fallback is not None:
+            unknown = [i for i, m in enumerate(matches) if m[0] is None]
+            if unknown:
+                queries = l2_normalize(queries)
+                for i, m in zip(unknown, self.fallback.match(queries[unknown], threshold, agg)):
+                    if m[0] is not None:
+                        matches[i] = m
+        return matches
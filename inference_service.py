@@ -0,0 +1,229 @@
+# inference_service.py
+"""
+Local Inference Service (process pool)
+--------------------------------------
+Detection + embedding run in a pool of worker processes, each with its own
+face model, instead of inside the Streamlit script thread.
+
+    service = get_inference_service()
+    future = service.submit(frame)             # -> concurrent.futures.Future
+    results = future.result()                  # same dicts as recognize_faces_in_frame
+
+- workers are started with "spawn" (fork + ONNX Runtime threads is unsafe)
+- each worker gets cpu_count / INFERENCE_WORKERS ONNX intra-op threads, so
+  the pool scales across cores without oversubscribing them
+- matching uses the shared memory-mapped gallery (embedding_store), so
+  workers do not hold their own copy of the encodings
+- if a worker crashes the pool is rebuilt and the task retried once
+- while stage timings are on (metrics.py) tasks run through run_measured
+  and the workers' samples are replayed into this process's sinks
+
+INFERENCE_WORKERS = 0 runs everything in-process (same API, no pool).
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+from config import INFERENCE_WORKERS, INFERENCE_TIMEOUT, FACE_MODEL_WARMUP
+
+
+# -------------------------------------------------------
+# WORKER SIDE
+# -------------------------------------------------------
+
+def _init_worker(intra_op_threads):
+    # samples are only collected on request and sent back (run_measured)
+    metrics.disable()
+
+    # config is already imported when this runs (unpickling the initializer
+    # imports this module), so the thread count is passed in, not via env;
+    # the model is loaded right here, no warm-up thread is started
+    from face_model import get_face_app, ort_settings
+    get_face_app(settings=ort_settings(intra_op_threads=intra_op_threads))
+
+
+def run_task(task, frame):
+    """Execute one task; runs in a worker (or inline when the pool is off)."""
+    import face_utils
+
+    if task == "ping":
+        return True
+    if task == "recognize":
+        return face_utils.recognize_faces_in_frame(frame, face_utils.load_face_gallery())
+    if task == "recognize_burst":
+        frames, scope = frame
+        gallery = face_utils.load_scoped_gallery(*scope) if scope else face_utils.load_face_gallery()
+        return face_utils.recognize_faces_in_burst(frames, gallery)
+    if task == "encode":
+        return face_utils.encode_single_face_from_frame(frame)
+    if task == "recognize_file":
+        from batch_attendance import recognize_file
+        return recognize_file(frame)
+    if task == "enroll_batch":
+        from bulk_enroll import embed_enrollment_images
+        return embed_enrollment_images(frame)
+    if task == "detect_embed":
+        return face_utils.detect_and_embed(frame)
+    raise ValueError(f"Unknown inference task: {task}")
+
+
+def run_measured(task, frame):
+    """run_task with stage timings on; returns (result, metric events)."""
+    previous = metrics.sinks()
+    collector = metrics.CollectSink()
+    metrics.set_sinks([collector])
+    try:
+        result = run_task(task, frame)
+        return result, collector.drain()
+    finally:
+        metrics.set_sinks(previous)
+
+
+# -------------------------------------------------------
+# SERVICE
+# -------------------------------------------------------
+
+class InferenceService:
+    """Futures-style front end over a self-healing process pool."""
+
+    def __init__(self, num_workers=INFERENCE_WORKERS, max_retries=1):
+        self.num_workers = num_workers
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._pool = None
+        self.restarts = 0
+
+    # ---------------- pool management ----------------
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                threads = max(1, (os.cpu_count() or 1) // self.num_workers)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.num_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(threads,),
+                )
+            return self._pool
+
+    def _restart(self, broken_pool):
+        """Replace the pool once, even if many futures report the same crash."""
+        with self._lock:
+            if self._pool is broken_pool:
+                broken_pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+                self.restarts += 1
+
+    # ---------------- public API ----------------
+
+    def submit(self, frame, task="recognize"):
+        """Queue a frame; returns a Future with the task result."""
+        outer = Future()
+
+        if self.num_workers <= 0:
+            try:
+                outer.set_result(run_task(task, frame))
+            except Exception as e:
+                outer.set_exception(e)
+            return outer
+
+        self._dispatch(outer, task, frame, self.max_retries)
+        return outer
+
+    def _dispatch(self, outer, task, frame, retries_left):
+        pool = self._get_pool()
+        measured = metrics.enabled()
+        try:
+            inner = pool.submit(run_measured if measured else run_task, task, frame)
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._retry_or_fail(outer, task, frame, retries_left, pool, e)
+            return
+
+        def _done(f):
+            exc = f.exception()
+            if exc is None and measured:
+                result, events = f.result()
+                metrics.replay(events)
+                outer.set_result(result)
+            elif exc is None:
+                outer.set_result(f.result())
+            elif isinstance(exc, BrokenProcessPool):
+                self._retry_or_fail(outer, task, frame, retries_left, pool, exc)
+            else:
+                outer.set_exception(exc)
+
+        inner.add_done_callback(_done)
+
+    def _retry_or_fail(self, outer, task, frame, retries_left, pool, exc):
+        self._restart(pool)
+        if retries_left > 0:
+            self._dispatch(outer, task, frame, retries_left - 1)
+        else:
+            outer.set_exception(exc)
+
+    def recognize(self, frame, timeout=INFERENCE_TIMEOUT):
+        return self.submit(frame, "recognize").result(timeout=timeout)
+
+    def recognize_burst(self, frames, scope=None, timeout=INFERENCE_TIMEOUT):
+        """
+        Best-crop-per-person recognition over a list of frames. scope:
+        optional (class, section, fallback) for face_utils.load_scoped_gallery.
+        """
+        return self.submit((frames, scope), "recognize_burst").result(timeout=timeout)
+
+    def encode(self, frame, timeout=INFERENCE_TIMEOUT):
+        return self.submit(frame, "encode").result(timeout=timeout)
+
+    def warm_up(self, wait=False):
+        """Start the workers (they load their models in the initializer)."""
+        if self.num_workers <= 0:
+            from face_model import get_face_app, warm_up_in_background
+            if wait:
+                get_face_app()
+            else:
+                warm_up_in_background()
+            return
+        future = self.submit(None, "ping")
+        if wait:
+            future.result(timeout=INFERENCE_TIMEOUT)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait, cancel_futures=True)
+                self._pool = None
+
+
+_service = None
+_service_lock = threading.Lock()
+_warmed_up = False
+
+
+def get_inference_service():
+    """Process-wide InferenceService (pool started on first submit)."""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = InferenceService()
+    return _service
+
+
+def apply_warmup_policy(policy=FACE_MODEL_WARMUP):
+    """
+    Called from app.main() on every render; acts once per process.
+    - "off":        load on first use only
+    - "background": start the workers (or the in-process model) without
+                    blocking rendering
+    - "eager":      block until loaded (old import-time behaviour)
+    """
+    global _warmed_up
+    if _warmed_up or policy == "off":
+        return
+    _warmed_up = True
+    get_inference_service().warm_up(wait=(policy == "eager"))
@@ -0,0 +1,213 @@
+# liveness.py
+"""
+Burst Liveness (anti-spoofing)
+------------------------------
+Decides which recognised faces of a capture burst belong to a live person
+rather than a printed photo or a phone screen held up to the camera.
+
+Optical flow is computed ONCE per consecutive frame pair, over the
+(downscaled) region that holds all faces; every per-face statistic is then
+read for all face boxes at once from summed-area tables, so the cost barely
+grows with the number of faces:
+
+- motion:    mean flow magnitude inside the face (px / frame)
+- nonrigid:  spread of the flow vectors inside the face - a photo moved
+             as a whole has uniform flow, a real face does not
+- blink:     largest change over the burst of the eye band's brightness
+             relative to the whole face
+- texture:   Laplacian variance of the face in the last frame (prints
+             and screens lose fine skin detail)
+
+A face is live when every check in LIVENESS_CHECKS passes its
+LIVENESS_THRESHOLDS. Checks are plain functions (stats, thresholds) ->
+bool array and can be added with register_check().
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+import metrics
+from config import LIVENESS_CHECKS, LIVENESS_THRESHOLDS, LIVENESS_FLOW_SCALE
+
+
+# -------------------------------------------------------
+# SUMMED-AREA TABLES
+# -------------------------------------------------------
+
+def integral(images):
+    """Summed-area table(s) of (..., H, W) images, shape (..., H + 1, W + 1)."""
+    images = np.asarray(images, dtype=np.float64)
+    h, w = images.shape[-2:]
+    tables = [cv2.integral(im, sdepth=cv2.CV_64F) for im in images.reshape(-1, h, w)]
+    return np.stack(tables).reshape(images.shape[:-2] + (h + 1, w + 1))
+
+
+def box_means(table, boxes):
+    """
+    Mean of the image inside every (x1, y1, x2, y2) box, read from its
+    summed-area table. table: (..., H + 1, W + 1) -> (..., n_boxes).
+    """
+    x1, y1, x2, y2 = boxes.T
+    sums = table[..., y2, x2] - table[..., y1, x2] - table[..., y2, x1] + table[..., y1, x1]
+    area = np.maximum((x2 - x1) * (y2 - y1), 1)
+    return sums / area
+
+
+def _boxes_from_locations(locations, shape, scale=1.0):
+    """(top, right, bottom, left) locations -> clipped int (x1, y1, x2, y2) boxes."""
+    h, w = shape[:2]
+    loc = np.asarray(locations, dtype=np.float64).reshape(-1, 4) * scale
+    boxes = np.stack([loc[:, 3], loc[:, 0], loc[:, 1], loc[:, 2]], axis=1)
+    boxes = np.rint(boxes).astype(np.int64)
+    boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, w)
+    boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, h)
+    return boxes
+
+
+def _shrink(boxes, frac):
+    """Central part of every box (drops the background at the edges)."""
+    dx = ((boxes[:, 2] - boxes[:, 0]) * frac / 2).astype(np.int64)
+    dy = ((boxes[:, 3] - boxes[:, 1]) * frac / 2).astype(np.int64)
+    return boxes + np.stack([dx, dy, -dx, -dy], axis=1)
+
+
+def _eye_bands(boxes):
+    """Band from 20% to 50% of the face height (where the eyes are)."""
+    h = boxes[:, 3] - boxes[:, 1]
+    bands = boxes.copy()
+    bands[:, 1] = boxes[:, 1] + (h * 0.2).astype(np.int64)
+    bands[:, 3] = boxes[:, 1] + (h * 0.5).astype(np.int64)
+    return bands
+
+
+# -------------------------------------------------------
+# STATISTICS
+# -------------------------------------------------------
+
+def burst_flow(grays):
+    """Dense Farneback flow between consecutive frames: (pairs, H, W, 2)."""
+    return np.stack([
+        cv2.calcOpticalFlowFarneback(a, b, None, 0.5, 2, 9, 2, 5, 1.1, 0)
+        for a, b in zip(grays[:-1], grays[1:])
+    ])
+
+
+def liveness_stats(frames, locations, flow_scale=LIVENESS_FLOW_SCALE):
+    """
+    Per-face statistics (arrays of len(locations)) for a burst of BGR
+    frames; boxes are (top, right, bottom, left) in full-frame pixels.
+    """
+    n = len(locations)
+    stats = {name: np.zeros(n) for name in ("motion", "nonrigid", "blink", "texture")}
+    if n == 0 or not frames:
+        return stats
+
+    # texture at full resolution, last frame
+    last = cv2.cvtColor(frames[-1], cv2.COLOR_BGR2GRAY)
+    boxes = _boxes_from_locations(locations, last.shape)
+    lap = cv2.Laplacian(last, cv2.CV_64F)
+    lap_mean = box_means(integral(lap), boxes)
+    stats["texture"] = np.maximum(box_means(integral(lap * lap), boxes) - lap_mean ** 2, 0.0)
+
+    if len(frames) < 2:
+        return stats
+
+    # everything temporal on one downscaled grey stack of the region that
+    # holds all faces
+    x1, y1 = boxes[:, 0].min(), boxes[:, 1].min()
+    x2, y2 = boxes[:, 2].max(), boxes[:, 3].max()
+    if x2 - x1 < 8 or y2 - y1 < 8:
+        return stats
+    grays = np.stack([
+        cv2.resize(cv2.cvtColor(f[y1:y2, x1:x2], cv2.COLOR_BGR2GRAY), None,
+                   fx=flow_scale, fy=flow_scale, interpolation=cv2.INTER_AREA)
+        for f in frames
+    ])
+    shifted = np.asarray(locations, dtype=np.float64).reshape(-1, 4) - [y1, x1, y1, x1]
+    small = _boxes_from_locations(shifted, grays.shape[1:], flow_scale)
+    inner = _shrink(small, 0.3)
+
+    flow = burst_flow(grays) / flow_scale           # px / frame at full resolution
+    u, v = flow[..., 0], flow[..., 1]
+    stats["motion"] = box_means(integral(np.hypot(u, v)), inner).mean(axis=0)
+
+    var_u = box_means(integral(u * u), inner) - box_means(integral(u), inner) ** 2
+    var_v = box_means(integral(v * v), inner) - box_means(integral(v), inner) ** 2
+    stats["nonrigid"] = np.sqrt(np.maximum(var_u + var_v, 0.0)).mean(axis=0)
+
+    gray_table = integral(grays)
+    contrast = box_means(gray_table, _eye_bands(small)) - box_means(gray_table, small)  # (T, faces)
+    stats["blink"] = contrast.max(axis=0) - contrast.min(axis=0)
+    return stats
+
+
+# -------------------------------------------------------
+# CHECKS
+# -------------------------------------------------------
+
+def _check_motion(stats, th):
+    """Some non-rigid movement, or a blink."""
+    moving = (stats["motion"] >= th["motion"]) & (stats["nonrigid"] >= th["nonrigid"])
+    return moving | (stats["blink"] >= th["blink"])
+
+
+def _check_texture(stats, th):
+    return stats["texture"] >= th["texture"]
+
+
+CHECKS = {
+    "motion": _check_motion,
+    "texture": _check_texture,
+}
+
+
+def register_check(name, fn):
+    """Add a check fn(stats, thresholds) -> bool array, usable in LIVENESS_CHECKS."""
+    CHECKS[name] = fn
+
+
+# -------------------------------------------------------
+# STAGE
+# -------------------------------------------------------
+
+class LivenessStage:
+    """
+    Liveness for all faces of a burst. Call with the burst frames and the
+    face locations; returns (live, failed, stats):
+    live[i] is a bool, failed[i] the names of the checks face i failed.
+    Motion-based checks are skipped for single-frame bursts.
+    `last_ms` / `last_ms_per_frame` hold the cost of the last call, which is
+    also recorded as the "liveness" stage (metrics.py).
+    """
+
+    TEMPORAL = ("motion",)
+
+    def __init__(self, checks=LIVENESS_CHECKS, thresholds=None):
+        self.checks = list(checks)
+        self.thresholds = dict(LIVENESS_THRESHOLDS, **(thresholds or {}))
+        self.last_ms = 0.0
+        self.last_ms_per_frame = 0.0
+
+    def __call__(self, frames, locations):
+        t0 = time.perf_counter()
+        frames = [f for f in frames if f is not None]
+        stats = liveness_stats(frames, locations)
+
+        n = len(locations)
+        live = np.ones(n, dtype=bool)
+        failed = [[] for _ in range(n)]
+        for name in self.checks:
+            if name in self.TEMPORAL and len(frames) < 2:
+                continue
+            ok = np.asarray(CHECKS[name](stats, self.thresholds), dtype=bool)
+            live &= ok
+            for i in np.flatnonzero(~ok):
+                failed[i].append(name)
+
+        elapsed = time.perf_counter() - t0
+        metrics.record("liveness", elapsed)
+        self.last_ms = elapsed * 1e3
+        self.last_ms_per_frame = self.last_ms / max(len(frames), 1)
+        return live, failed, stats
@@ -0,0 +1,309 @@
+# metrics.py
+"""
+Pipeline Stage Timings
+----------------------
+Lightweight instrumentation of the recognition hot path:
+
+    with metrics.timer("detect"):
+        bboxes, kpss = ...
+    metrics.count("faces_detected", len(bboxes))
+
+Stages: camera_grab, decode, detect, align, embed, match, liveness,
+db_write. Counters: faces_detected, faces_matched.
+
+Samples go to pluggable sinks (METRICS_SINKS / enable()):
+- "memory": latest METRICS_WINDOW samples per stage, summarised as
+            count / mean / p50 / p95 / p99 / max (Live Admin Monitor)
+- "log":    one line per sample on the "pipeline.metrics" logger
+- "csv":    time, kind, name, value rows appended to METRICS_CSV_PATH
+
+Off by default: with no sink, timer() returns one shared no-op context
+manager and count() returns at once, so instrumented code costs a global
+lookup and a function call. Any object with record(name, seconds) and
+count(name, n) can be added as a sink.
+
+Inference workers run in other processes; there samples are collected
+and shipped back with each result (inference_service.run_measured), then
+replayed into this process's sinks.
+"""
+
+import atexit
+import contextlib
+import csv
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from config import METRICS_SINKS, METRICS_WINDOW, METRICS_CSV_PATH
+
+STAGES = ("camera_grab", "decode", "detect", "align", "embed", "match", "liveness", "db_write")
+
+_NULL = contextlib.nullcontext()
+_sinks = ()          # replaced, never mutated, so readers need no lock
+_sinks_lock = threading.Lock()
+_memory = None
+
+
+# -------------------------------------------------------
+# SINKS
+# -------------------------------------------------------
+
+class MemorySink:
+    """Rolling per-stage samples + counters for the in-app panel."""
+
+    name = "memory"
+
+    def __init__(self, window=METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._samples = {}   # stage -> deque of seconds
+            self._totals = {}    # stage -> [count, seconds]
+            self._counters = {}
+            self.since = time.time()
+
+    def record(self, name, seconds):
+        with self._lock:
+            if name not in self._samples:
+                self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            self._samples[name].append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, name, n):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self):
+        """{"since", "stages": [row per stage], "counters": {name: n}}; times in ms."""
+        with self._lock:
+            samples = {k: np.array(v, dtype=np.float64) * 1e3 for k, v in self._samples.items()}
+            totals = {k: tuple(v) for k, v in self._totals.items()}
+            counters = dict(self._counters)
+
+        order = {name: i for i, name in enumerate(STAGES)}
+        stages = []
+        for name in sorted(samples, key=lambda k: (order.get(k, len(order)), k)):
+            ms = samples[name]
+            n, total = totals[name]
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            stages.append({
+                "stage": name,
+                "count": n,
+                "mean_ms": total / n * 1e3,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": float(ms.max()),
+            })
+        return {"since": self.since, "stages": stages, "counters": counters}
+
+
+class LogSink:
+    """Every sample as a log line (configure the "pipeline.metrics" logger)."""
+
+    name = "log"
+
+    def __init__(self, logger="pipeline.metrics"):
+        self.logger = logging.getLogger(logger)
+
+    def record(self, name, seconds):
+        self.logger.info("%s %.2f ms", name, seconds * 1e3)
+
+    def count(self, name, n):
+        self.logger.info("%s +%d", name, n)
+
+
+class CsvSink:
+    """Buffered rows (unix time, "timer" | "count", name, ms or n) appended to a CSV."""
+
+    name = "csv"
+
+    def __init__(self, path=METRICS_CSV_PATH, flush_every=256):
+        self.path = path
+        self.flush_every = flush_every
+        self._rows = []
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, name, seconds):
+        self._add((round(time.time(), 3), "timer", name, round(seconds * 1e3, 3)))
+
+    def count(self, name, n):
+        self._add((round(time.time(), 3), "count", name, n))
+
+    def _add(self, row):
+        with self._lock:
+            self._rows.append(row)
+            full = len(self._rows) >= self.flush_every
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return
+            new = not os.path.exists(self.path)
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                if new:
+                    writer.writerow(["time", "kind", "name", "value"])
+                writer.writerows(rows)
+
+
+class CollectSink:
+    """Raw events kept until drained (worker processes -> parent)."""
+
+    name = "collect"
+
+    def __init__(self):
+        self._events = []
+
+    def record(self, name, seconds):
+        self._events.append(("timer", name, seconds))
+
+    def count(self, name, n):
+        self._events.append(("count", name, n))
+
+    def drain(self):
+        events, self._events = self._events, []
+        return events
+
+
+def memory_sink():
+    """The process-wide MemorySink (created on first use)."""
+    global _memory
+    if _memory is None:
+        with _sinks_lock:
+            if _memory is None:
+                _memory = MemorySink()
+    return _memory
+
+
+def _make_sink(name):
+    if name == "memory":
+        return memory_sink()
+    if name == "log":
+        return LogSink()
+    if name == "csv":
+        return CsvSink()
+    raise ValueError(f"Unknown metrics sink: {name}")
+
+
+# -------------------------------------------------------
+# SWITCHING
+# -------------------------------------------------------
+
+def enabled():
+    return bool(_sinks)
+
+
+def sinks():
+    return _sinks
+
+
+def set_sinks(new_sinks):
+    """Replace all sinks (an empty list turns metrics off)."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = tuple(new_sinks)
+
+
+def add_sink(sink):
+    """Add a sink object or a sink name ("memory", "log", "csv")."""
+    global _sinks
+    if isinstance(sink, str):
+        if any(getattr(s, "name", None) == sink for s in _sinks):
+            return
+        sink = _make_sink(sink)
+    with _sinks_lock:
+        if sink not in _sinks:
+            _sinks = _sinks + (sink,)
+
+
+def remove_sink(sink):
+    """Remove a sink object, or every sink with that name."""
+    global _sinks
+    with _sinks_lock:
+        _sinks = tuple(
+            s for s in _sinks
+            if s is not sink and not (isinstance(sink, str) and getattr(s, "name", None) == sink)
+        )
+
+
+def enable(names=("memory",)):
+    for name in names:
+        add_sink(name)
+
+
+def disable():
+    set_sinks(())
+
+
+# -------------------------------------------------------
+# RECORDING
+# -------------------------------------------------------
+
+class _Timer:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.t0)
+        return False
+
+
+def timer(name):
+    """Context manager timing one stage (no-op while metrics are off)."""
+    if not _sinks:
+        return _NULL
+    return _Timer(name)
+
+
+def record(name, seconds):
+    for sink in _sinks:
+        sink.record(name, seconds)
+
+
+def count(name, n=1):
+    if not _sinks or not n:
+        return
+    for sink in _sinks:
+        sink.count(name, n)
+
+
+def replay(events):
+    """Feed events drained from a CollectSink (another process) to the sinks."""
+    for kind, name, value in events:
+        if kind == "timer":
+            record(name, value)
+        else:
+            count(name, value)
+
+
+def snapshot():
+    """Summary from the memory sink (see MemorySink.snapshot)."""
+    return memory_sink().snapshot()
+
+
+def reset():
+    memory_sink().reset()
+
+
+enable(METRICS_SINKS)
@@ -0,0 +1,418 @@
+# streaming.py
+"""
+Continuous Streaming Attendance
+-------------------------------
+A threaded pipeline over a video source (webcam index, RTSP/HTTP URL or a
+local video file):
+
+    capture/decode -> detect+track -> embed -> match -> persist
+
+Stages are connected by bounded queues (STREAM_QUEUE_SIZE). Under
+backpressure frames are dropped, not queued:
+
+- capture keeps grab()bing so a live source never lags, but only decodes
+  (retrieve()) a frame when the detector has room for it
+- between the other stages the oldest waiting item is dropped
+- persist never drops (attendance writes are small and must not be lost)
+
+Capture and decode share one thread because cv2.VideoCapture is not
+thread-safe; skipping retrieve() is what makes a dropped frame cheap.
+
+The detect stage runs the cross-frame tracker (tracker.py), so only new,
+low-confidence or stale faces reach the recognizer. A student is marked
+present once their track has been seen STREAM_MIN_TRACK_HITS times with a
+known identity. ONNX Runtime releases the GIL, so the stages overlap.
+
+status() is a thread-safe snapshot for the UI (fps, end-to-end latency,
+queue depths, drops, log lines, last annotated frame). Video files can be
+run headless - see benchmarks/bench_streaming.py.
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+import metrics
+from config import CAMERA_SOURCE, STREAM_QUEUE_SIZE, STREAM_MIN_TRACK_HITS
+
+_EOS = None   # end-of-stream marker passed down the queues
+
+
+# -------------------------------------------------------
+# SOURCES
+# -------------------------------------------------------
+
+def parse_source(source=CAMERA_SOURCE):
+    """'0' -> device 0; anything else is a URL or file path."""
+    source = str(source).strip()
+    return int(source) if source.isdigit() else source
+
+
+def open_source(source=CAMERA_SOURCE):
+    """cv2.VideoCapture on the platform's default backend."""
+    return cv2.VideoCapture(parse_source(source))
+
+
+def is_file_source(source):
+    return isinstance(parse_source(source), str) and os.path.isfile(str(source))
+
+
+# -------------------------------------------------------
+# PIPELINE
+# -------------------------------------------------------
+
+class StreamPipeline:
+    """
+    Streaming attendance over one video source.
+
+    realtime: pace a file at its native fps and drop frames like a live
+              camera (default: True for cameras/URLs, False for files,
+              which are then processed as fast as possible, frame by frame)
+    persist:  write attendance rows (False for headless benchmarking)
+    scope:    optional (class, section, fallback) - match against that
+              class's gallery partition (face_utils.load_scoped_gallery)
+    """
+
+    STAGES = ("detect", "embed", "match", "persist")
+
+    def __init__(self, source=CAMERA_SOURCE, user_id=None, realtime=None, persist=True,
+                 queue_size=STREAM_QUEUE_SIZE, scope=None):
+        from tracker import FaceTracker
+
+        self.source = source
+        self.user_id = user_id
+        self.persist = persist
+        self.scope = scope
+        self.realtime = (not is_file_source(source)) if realtime is None else realtime
+
+        self.queues = {name: queue.Queue(maxsize=queue_size) for name in self.STAGES}
+        self.queues["persist"] = queue.Queue()   # unbounded: never drop writes
+
+        self.tracker = FaceTracker()
+        self._tracker_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+        self._stats_lock = threading.Lock()
+        self.started_at = None
+        self.finished_at = None
+        self.state = "idle"
+        self.error = None
+        self.counters = {"captured": 0, "dropped": 0, "processed": 0,
+                         "recognitions": 0, "marked": 0}
+        self.latencies = deque(maxlen=1000)
+        self.log = deque(maxlen=50)
+        self.latest = None          # (frame, results) of the newest processed frame
+
+        self._queued_students = set()   # already sent to persist today
+        self._already_today = set()     # already written today (persist stage)
+        self._day = None                # date the two sets refer to
+
+    # ---------------- lifecycle ----------------
+
+    def start(self):
+        cap = open_source(self.source)
+        if not cap.isOpened():
+            self.state = "error"
+            self.error = f"Could not open video source: {self.source}"
+            return False
+
+        self.started_at = time.perf_counter()
+        self.state = "running"
+        targets = [
+            ("capture", self._capture_stage, (cap,)),
+            ("detect", self._detect_stage, ()),
+            ("embed", self._embed_stage, ()),
+            ("match", self._match_stage, ()),
+            ("persist", self._persist_stage, ()),
+        ]
+        for name, fn, args in targets:
+            t = threading.Thread(target=self._run_stage, args=(fn, args),
+                                 name=f"stream-{name}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def wait(self, timeout=None):
+        for t in self._threads:
+            t.join(timeout)
+
+    @property
+    def running(self):
+        return any(t.is_alive() for t in self._threads)
+
+    def _run_stage(self, fn, args):
+        try:
+            fn(*args)
+        except Exception as e:
+            self.error = f"{threading.current_thread().name}: {e}"
+            self.state = "error"
+            self._stop.set()
+
+    # ---------------- queue helpers ----------------
+
+    def _put(self, name, item, drop=True):
+        """
+        Offer `item` to stage `name`. With drop=True and a full queue the
+        oldest waiting item is discarded; otherwise block until there is room.
+        """
+        q = self.queues[name]
+        if drop and self.realtime and item is not _EOS:
+            while True:
+                try:
+                    q.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self._release(q.get_nowait())
+                    except queue.Empty:
+                        pass
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _get(self, name):
+        """Next item for stage `name`; _EOS when stopping or the stream ended."""
+        while not self._stop.is_set():
+            try:
+                return self.queues[name].get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _EOS
+
+    def _drain(self, name):
+        try:
+            return self.queues[name].get_nowait()
+        except queue.Empty:
+            return _EOS
+
+    def _release(self, item):
+        """A dropped item: count it and let its tracks be picked up again."""
+        if item is _EOS:
+            return
+        for track in item.get("tracks", []):
+            track.in_flight = False
+        self._count("dropped")
+
+    def _count(self, key, n=1):
+        with self._stats_lock:
+            self.counters[key] += n
+
+    def _finish(self, item, results):
+        with self._stats_lock:
+            self.counters["processed"] += 1
+            self.latencies.append(time.perf_counter() - item["t0"])
+            self.latest = (item["frame"], results)
+
+    # ---------------- stages ----------------
+
+    def _capture_stage(self, cap):
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        interval = 1.0 / fps if (self.realtime and fps > 0 and is_file_source(self.source)) else 0
+        seq = 0
+        next_t = time.perf_counter()
+
+        try:
+            while not self._stop.is_set():
+                if interval:
+                    next_t += interval
+                    time.sleep(max(0.0, next_t - time.perf_counter()))
+
+                with metrics.timer("camera_grab"):
+                    grabbed = cap.grab()
+                if not grabbed:
+                    break
+                t0 = time.perf_counter()
+                self._count("captured")
+
+                if self.realtime and self.queues["detect"].full():
+                    self._count("dropped")      # skip decoding this frame
+                    continue
+
+                with metrics.timer("decode"):
+                    ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    continue
+                seq += 1
+                self._put("detect", {"seq": seq, "t0": t0, "frame": frame})
+        finally:
+            cap.release()
+            self._put("detect", _EOS, drop=False)
+
+    def _detect_stage(self):
+        from face_utils import detect_faces
+        from face_quality import face_quality
+
+        while True:
+            item = self._get("detect")
+            if item is _EOS:
+                break
+
+            frame = item["frame"]
+            bboxes, kpss = detect_faces(frame)
+            with self._tracker_lock:
+                assigned = self.tracker.update(bboxes)
+                todo = []
+                for j in self.tracker.pending(assigned):
+                    if face_quality(frame, bboxes[j], kpss[j])["usable"]:
+                        assigned[j].in_flight = True
+                        todo.append(j)
+
+            self._queue_attendance(assigned)
+
+            item.update(bboxes=bboxes, kpss=kpss, assigned=assigned)
+            if todo:
+                item.update(todo=todo, tracks=[assigned[j] for j in todo])
+                self._put("embed", item)
+            else:
+                self._finish(item, self._results(assigned))
+
+        self._put("embed", _EOS, drop=False)
+
+    def _embed_stage(self):
+        from face_utils import align_faces, embed_aligned_faces
+
+        while True:
+            item = self._get("embed")
+            if item is _EOS:
+                break
+            kps = np.stack([item["kpss"][j] for j in item["todo"]])
+            item["embs"] = embed_aligned_faces(align_faces(item["frame"], kps))
+            self._put("match", item)
+
+        self._put("match", _EOS, drop=False)
+
+    def _match_stage(self):
+        from face_utils import load_scoped_gallery, match_embeddings
+
+        while True:
+            item = self._get("match")
+            if item is _EOS:
+                break
+
+            # cheap; reloads only on DB changes
+            gallery = load_scoped_gallery(*self.scope) if self.scope else load_scoped_gallery()
+            matches = match_embeddings(gallery, item["embs"])
+            with self._tracker_lock:
+                for track, emb, (sid, name, dist) in zip(item["tracks"], item["embs"], matches):
+                    self.tracker.record(track, sid, name, dist, emb)
+                    track.in_flight = False
+            self._count("recognitions", len(item["tracks"]))
+
+            self._queue_attendance(item["assigned"])
+            self._finish(item, self._results(item["assigned"]))
+
+        self._put("persist", _EOS, drop=False)
+
+    def _persist_stage(self):
+        from face_utils import mark_attendance_from_results
+
+        try:
+            while True:
+                result = self._get("persist")
+                if result is _EOS:
+                    # stopped early: still write what was already recognised
+                    result = self._drain("persist")
+                    if result is _EOS:
+                        break
+                if not self.persist:
+                    self.log.append(f"{datetime.now():%H:%M:%S} recognised {result['name']} (not saved)")
+                    self._count("marked")
+                    continue
+
+                self._check_day()
+                new, logs = mark_attendance_from_results([result], self.user_id, self._already_today)
+                self._count("marked", len(new))
+                self.log.extend(logs)
+        finally:
+            # last stage: the pipeline is done
+            self.finished_at = time.perf_counter()
+            if self.state == "running":
+                self.state = "stopped"
+
+    # ---------------- helpers ----------------
+
+    def _check_day(self):
+        today = datetime.now().strftime("%Y-%m-%d")
+        if today != self._day:
+            self._new_day(today)
+
+    def _new_day(self, today):
+        """Forget who was queued / marked once the date changes (runs across midnight)."""
+        with self._stats_lock:
+            if today == self._day:
+                return
+            self._day = today
+            self._queued_students.clear()
+            self._already_today.clear()
+
+    def _queue_attendance(self, tracks):
+        """Send stable, identified tracks to the persist stage (once each per day)."""
+        self._check_day()
+        for t in tracks:
+            if t.student_id is None or t.hits < STREAM_MIN_TRACK_HITS:
+                continue
+            with self._stats_lock:
+                if t.student_id in self._queued_students:
+                    continue
+                self._queued_students.add(t.student_id)
+            self.queues["persist"].put({
+                "student_id": t.student_id,
+                "name": t.name,
+                "distance": t.distance,
+                "track_id": t.track_id,
+            })
+
+    @staticmethod
+    def _results(tracks):
+        from face_utils import _box_to_location
+
+        return [
+            {
+                "student_id": t.student_id,
+                "name": t.name,
+                "location": _box_to_location(t.box),
+                "distance": t.distance,
+                "track_id": t.track_id,
+            }
+            for t in tracks
+        ]
+
+    # ---------------- status feed ----------------
+
+    def status(self):
+        """Snapshot for the UI / reports (safe to call from any thread)."""
+        with self._stats_lock:
+            counters = dict(self.counters)
+            latencies = np.array(self.latencies, dtype=np.float64)
+            latest = self.latest
+
+        end = self.finished_at or time.perf_counter()
+        elapsed = (end - self.started_at) if self.started_at else 0.0
+        status = {
+            "state": self.state,
+            "error": self.error,
+            "source": str(self.source),
+            "elapsed": elapsed,
+            "fps": counters["processed"] / elapsed if elapsed > 0 else 0.0,
+            "queues": {name: q.qsize() for name, q in self.queues.items()},
+            "tracks": len(self.tracker.active_tracks()),
+            "log": list(self.log),
+            "latest": latest,
+            **counters,
+        }
+        for p in (50, 95):
+            status[f"latency_p{p}_ms"] = float(np.percentile(latencies, p) * 1e3) if latencies.size else 0.0
+        return status
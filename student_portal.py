@@ -16,9 +16,11 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import cv2
 
 from attendance_utils import attendance_to_dataframe
-from face_utils import encode_single_face_from_frame, save_student_face_encoding
+from face_utils import save_student_face_encoding
+from inference_service import get_inference_service
 from heatmap_utils import generate_empty_seat_map, map_attendance_to_seats, draw_heatmap
 from db import get_student_by_username, update_student
 
@@ -173,7 +175,7 @@ def student_portal_page():
             data = np.frombuffer(img.read(), np.uint8)
             frame = cv2.imdecode(data, 1)
 
-            encoding = encode_single_face_from_frame(frame)
+            encoding = get_inference_service().encode(frame)
             if encoding is None:
                 st.error("No face detected. Try again.")
             else:
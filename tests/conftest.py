@@ -0,0 +1,18 @@
+# tests/conftest.py
+"""Shared fixtures: a throwaway SQLite DB for tests that touch db.py."""
+
+import pytest
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """db module pointed at a fresh, initialised DB under tmp_path."""
+    import db
+
+    path = str(tmp_path / "test.db")
+    monkeypatch.setattr(db, "DB_PATH", path)
+    db.init_db()
+    yield db
+    pool = db._pools.pop(path, None)
+    if pool is not None:
+        pool.close_all()
@@ -0,0 +1,67 @@
+# tests/test_camera_scheduler.py
+"""Start-time fair queuing of cameras (camera_scheduler.CameraScheduler.pick)."""
+
+import numpy as np
+
+from camera_scheduler import CameraScheduler, CameraSource
+
+
+def _source(name, priority=1.0, max_fps=0):
+    src = CameraSource(name, f"{name}.mp4", priority=priority, max_fps=max_fps)
+    src.offer(np.zeros((1, 1, 3), dtype=np.uint8))
+    return src
+
+
+def _serve(scheduler, now, cost):
+    """What the dispatch loop + a finished job do to the picked source."""
+    src = scheduler.pick(now)
+    src.take()
+    src.vtime += cost[src.name] / src.priority
+    src.offer(np.zeros((1, 1, 3), dtype=np.uint8))
+    return src
+
+
+def test_pick_smallest_virtual_time_among_eligible():
+    a, b, c = _source("a"), _source("b"), _source("c")
+    a.vtime, b.vtime, c.vtime = 3.0, 1.0, 2.0
+    scheduler = CameraScheduler([a, b, c], workers=1)
+
+    assert scheduler.pick(now=0.0) is b
+    b.in_flight = True
+    assert scheduler.pick(now=0.0) is c
+    c.take()                                    # no new frame
+    assert scheduler.pick(now=0.0) is a
+    a.next_due = 10.0                           # fps cap
+    assert scheduler.pick(now=5.0) is None
+    assert scheduler.pick(now=10.0) is a
+
+
+def test_share_follows_priority_not_frame_cost():
+    # "hall" frames cost 4x as much; with 2x the priority it gets half the
+    # served frames of each small room but the most pool time
+    hall, r1, r2 = _source("hall", priority=2.0), _source("r1"), _source("r2")
+    scheduler = CameraScheduler([hall, r1, r2], workers=1)
+    cost = {"hall": 0.4, "r1": 0.1, "r2": 0.1}
+
+    served = {"hall": 0, "r1": 0, "r2": 0}
+    for _ in range(600):
+        served[_serve(scheduler, 0.0, cost).name] += 1
+
+    busy = {name: n * cost[name] for name, n in served.items()}
+    assert served["r1"] == served["r2"]
+    assert abs(busy["hall"] / busy["r1"] - 2.0) < 0.1
+    assert abs(served["r1"] / served["hall"] - 2.0) < 0.1
+
+
+def test_marked_students_reset_on_a_new_day():
+    src = _source("a")
+    scheduler = CameraScheduler([src], workers=1, persist=False)
+    scheduler._new_day("2024-01-01")
+    src.marked.add(5)
+    scheduler._already_today.add(5)
+
+    scheduler._new_day("2024-01-01")
+    assert 5 in src.marked
+
+    scheduler._new_day("2024-01-02")
+    assert not src.marked and not scheduler._already_today
@@ -0,0 +1,59 @@
+# tests/test_detection.py
+"""NMS, tile layout and merging of tiled detections (detection.py)."""
+
+import numpy as np
+
+from detection import nms, tile_grid, detect_tiled
+
+
+class SquareDetector:
+    """Finds the bounding box of the non-zero pixels of an image (or nothing)."""
+
+    def detect(self, img, input_size=None, max_num=0, metric="default"):
+        ys, xs = np.nonzero(img[:, :, 0])
+        if len(xs) == 0:
+            return np.zeros((0, 5), dtype=np.float32), np.zeros((0, 5, 2), dtype=np.float32)
+        box = np.array([[xs.min(), ys.min(), xs.max() + 1, ys.max() + 1, 0.9]], dtype=np.float32)
+        kps = np.tile(box[:, None, :2], (1, 5, 1))
+        return box, kps
+
+
+def test_nms_drops_overlaps_and_keeps_best_first():
+    boxes = np.array([
+        [0, 0, 10, 10],
+        [1, 1, 11, 11],     # overlaps box 0 (IoU ~0.68)
+        [50, 50, 60, 60],
+    ], dtype=np.float32)
+    scores = np.array([0.8, 0.9, 0.7], dtype=np.float32)
+
+    assert nms(boxes, scores, iou_thresh=0.5).tolist() == [1, 2]
+    assert nms(boxes, scores, iou_thresh=0.9).tolist() == [1, 0, 2]
+
+
+def test_nms_empty():
+    assert len(nms(np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32))) == 0
+
+
+def test_tile_grid_covers_frame_with_overlap():
+    tiles = tile_grid(480, 640, grid=2, overlap=0.25)
+
+    assert len(tiles) == 4
+    assert min(t[0] for t in tiles) == 0 and max(t[2] for t in tiles) == 640
+    assert min(t[1] for t in tiles) == 0 and max(t[3] for t in tiles) == 480
+    left, right = tiles[0], tiles[1]
+    assert right[0] < left[2]           # neighbouring tiles overlap
+
+
+def test_tile_grid_single_tile_is_whole_frame():
+    assert tile_grid(100, 200, grid=1) == [(0, 0, 200, 100)]
+
+
+def test_detect_tiled_merges_duplicates_in_frame_coordinates():
+    frame = np.zeros((400, 600, 3), dtype=np.uint8)
+    frame[300:340, 450:490] = 255        # one face, inside several tiles
+
+    boxes, kpss = detect_tiled(SquareDetector(), frame, size=320)
+
+    assert len(boxes) == 1
+    np.testing.assert_allclose(boxes[0, :4], [450, 300, 490, 340])
+    np.testing.assert_allclose(kpss[0, 0], [450, 300])
@@ -0,0 +1,59 @@
+# tests/test_embedding_codec.py
+"""Binary embedding BLOBs and legacy JSON rows (embedding_codec.py)."""
+
+import json
+
+import numpy as np
+import pytest
+
+from embedding_codec import (
+    HEADER,
+    encode_embedding,
+    decode_embedding,
+    decode_embeddings,
+    json_to_blob,
+    is_blob,
+)
+
+
+def test_round_trip_float32():
+    emb = np.random.default_rng(0).normal(size=512).astype(np.float32)
+    blob = encode_embedding(emb)
+
+    assert is_blob(blob)
+    assert len(blob) == HEADER.size + 512 * 4
+    np.testing.assert_array_equal(decode_embedding(blob), emb)
+
+
+def test_round_trip_float16():
+    emb = np.linspace(-1, 1, 8, dtype=np.float32)
+    blob = encode_embedding(emb, dtype="<f2")
+
+    assert len(blob) == HEADER.size + 8 * 2
+    np.testing.assert_allclose(decode_embedding(blob), emb, atol=1e-3)
+
+
+def test_legacy_json_rows():
+    values = [0.25, -0.5, 1.0]
+    text = json.dumps(values)
+
+    assert not is_blob(text)
+    np.testing.assert_array_equal(decode_embedding(text), values)
+    np.testing.assert_array_equal(decode_embedding(json_to_blob(text)), values)
+    assert is_blob(json_to_blob(text))
+
+
+def test_decode_many_matches_single_decodes():
+    embs = np.random.default_rng(1).normal(size=(5, 16)).astype(np.float32)
+    blobs = [encode_embedding(e) for e in embs]
+
+    np.testing.assert_array_equal(decode_embeddings(blobs), embs)
+    assert decode_embeddings([]).shape == (0, 0)
+
+
+def test_bad_header_is_rejected():
+    blob = bytearray(encode_embedding(np.ones(4)))
+    blob[3] = 99    # unknown dtype code
+
+    with pytest.raises(ValueError):
+        decode_embedding(bytes(blob))
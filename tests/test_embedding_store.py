@@ -0,0 +1,39 @@
+# tests/test_embedding_store.py
+"""Snapshots are only reused for the DB (identity + generation) they were written for."""
+
+import numpy as np
+
+import embedding_store
+
+
+def _write(store_dir, generation, db_uid, names):
+    embs = np.random.default_rng(generation).normal(size=(len(names), 512))
+    embedding_store.write_snapshot(
+        generation, list(range(len(names))), names, embs, store_dir=str(store_dir), db_uid=db_uid,
+    )
+
+
+def test_snapshot_round_trip(tmp_path):
+    _write(tmp_path, 3, "db-a", ["S0", "S1"])
+
+    gallery = embedding_store.read_snapshot(3, store_dir=str(tmp_path), db_uid="db-a")
+    assert gallery.names == ["S0", "S1"] and gallery.generation == 3
+    assert np.allclose(np.linalg.norm(gallery.matrix, axis=1), 1.0)
+    assert embedding_store._manifest_generation(str(tmp_path), db_uid="db-a") == 3
+
+
+def test_snapshot_of_another_db_is_ignored(tmp_path):
+    _write(tmp_path, 5, "old-db", ["S0", "S1", "S2"])
+
+    assert embedding_store.read_snapshot(5, store_dir=str(tmp_path), db_uid="new-db") is None
+    assert embedding_store._manifest_generation(str(tmp_path), db_uid="new-db") is None
+
+
+def test_change_log_refuses_to_go_backwards(temp_db):
+    db = temp_db
+    db.bump_gallery_generation()
+    generation, uid = db.get_gallery_state()
+
+    assert uid
+    assert db.get_gallery_changes(generation + 4) is None    # snapshot ahead of a restored DB
+    assert db.get_gallery_changes(generation) == (generation, [], [])
@@ -0,0 +1,44 @@
+# tests/test_face_templates.py
+"""Template write paths keep the persisted ANN index in step with the DB."""
+
+import functools
+
+import numpy as np
+
+import ann_index
+import face_templates
+from ann_index import IVFIndex
+
+
+def _vec(seed):
+    return np.random.default_rng(seed).normal(size=512).astype(np.float32)
+
+
+def _template_ids(db):
+    return {r[0] for r in db.get_all_face_templates()}
+
+
+def test_removals_reach_the_delta_log(temp_db, tmp_path, monkeypatch):
+    db = temp_db
+    path = str(tmp_path / "test.ann.npz")
+    monkeypatch.setattr(face_templates, "append_deltas",
+                        functools.partial(ann_index.append_deltas, path=path))
+
+    pks = []
+    for i, roll_no in enumerate(["R1", "R2", "R3"]):
+        _, pk = db.create_student(roll_no, f"Student {roll_no}", "10", "A", None)
+        face_templates.add_student_template(pk, _vec(2 * i))
+        face_templates.add_student_template(pk, _vec(2 * i + 1))
+        pks.append(pk)
+
+    rows = db.get_all_face_templates()
+    IVFIndex.build([r[0] for r in rows], np.stack([_vec(0)] * len(rows)), nlist=2).save(path)
+
+    face_templates.remove_student(pks[0])
+    assert IVFIndex.load(path).id_set() == _template_ids(db)
+
+    face_templates.add_student_template(pks[1], _vec(9))
+    assert IVFIndex.load(path).id_set() == _template_ids(db)
+
+    face_templates.clear_all_templates()
+    assert IVFIndex.load(path).id_set() == set()
@@ -0,0 +1,119 @@
+# tests/test_gallery_changes.py
+"""Gallery change log (db.get_gallery_changes) applied with FaceGallery.apply_changes."""
+
+import numpy as np
+
+from embedding_codec import encode_embedding
+from gallery import FaceGallery
+
+
+def _vec(seed):
+    return np.random.default_rng(seed).normal(size=512).astype(np.float32)
+
+
+def _enroll(db, roll_no, *seeds):
+    _, pk = db.create_student(roll_no, f"Student {roll_no}", "10", "A", None)
+    for seed in seeds:
+        db.add_face_template(pk, encode_embedding(_vec(seed)), encode_embedding(_vec(seed)))
+    return pk
+
+
+def _full_gallery(db):
+    from face_utils import load_face_templates
+
+    ids, names, encs, keys = load_face_templates()
+    gallery = FaceGallery(ids, names, encs if len(ids) else None, keys=keys)
+    gallery.generation = db.get_gallery_generation()
+    return gallery
+
+
+def _apply(gallery, since):
+    from face_utils import load_gallery_changes
+
+    generation, student_pks, ids, names, encs, keys = load_gallery_changes(since)
+    updated = gallery.apply_changes(student_pks, ids, names, encs, keys)
+    updated.generation = generation
+    return updated
+
+
+def _rows_by_key(gallery):
+    return {k: (sid, name, row) for k, sid, name, row in
+            zip(gallery.keys, gallery.ids, gallery.names, gallery.matrix)}
+
+
+def _assert_same(a, b):
+    rows_a, rows_b = _rows_by_key(a), _rows_by_key(b)
+    assert rows_a.keys() == rows_b.keys()
+    for key, (sid, name, row) in rows_a.items():
+        assert rows_b[key][:2] == (sid, name)
+        np.testing.assert_allclose(rows_b[key][2], row, atol=1e-6)
+
+
+def test_additions_and_removals_match_full_reload(temp_db):
+    db = temp_db
+    first = _enroll(db, "R1", 1, 2)
+    _enroll(db, "R2", 3)
+    base = _full_gallery(db)
+
+    _enroll(db, "R3", 4, 5)
+    db.delete_student(first)
+
+    updated = _apply(base, base.generation)
+    assert updated.generation == db.get_gallery_generation()
+    _assert_same(updated, _full_gallery(db))
+    assert not base.has_student(db.get_student_by_student_id("R3")["id"])   # old snapshot untouched
+    assert base.has_student(first)
+
+
+def test_generations_without_rows_are_no_ops(temp_db):
+    db = temp_db
+    _enroll(db, "R1", 1)
+    base = _full_gallery(db)
+
+    conn = db.get_connection()
+    db._bump_generation(conn.cursor(), [])      # touched no student
+    conn.commit()
+    conn.close()
+    _enroll(db, "R2", 2)
+
+    changes = db.get_gallery_changes(base.generation)
+    assert changes is not None
+    assert changes[0] == db.get_gallery_generation()
+    _assert_same(_apply(base, base.generation), _full_gallery(db))
+
+
+def test_full_reload_when_log_cannot_tell(temp_db, monkeypatch):
+    db = temp_db
+    _enroll(db, "R1", 1)
+    since = db.get_gallery_generation()
+
+    db.bump_gallery_generation()                # "everything changed"
+    assert db.get_gallery_changes(since) is None
+
+    monkeypatch.setattr(db, "GALLERY_CHANGELOG_KEEP", 2)
+    since = db.get_gallery_generation()
+    for seed in range(2, 6):
+        _enroll(db, f"P{seed}", seed)           # prunes generations <= since
+    assert db.get_gallery_changes(since) is None
+    assert db.get_gallery_changes(db.get_gallery_generation() - 1) is not None
+
+
+def test_appends_reuse_bounded_buffer_and_keep_lookups():
+    vecs = np.stack([_vec(i) for i in range(40)])
+    base = FaceGallery([i // 2 for i in range(40)], [f"S{i // 2}" for i in range(40)], vecs,
+                       keys=list(range(40)))
+    base.row_of(0)
+    base.rows_of_student(0)
+
+    first = base.apply_changes([100], [100], ["New"], _vec(100)[None], [1000])
+    spare = len(first._buffer[0]) - len(first)
+    assert 0 < spare <= max(16, len(first) // 8)
+
+    second = first.apply_changes([0], [0, 0, 0], ["Renamed"] * 3,
+                                 np.stack([vecs[0], vecs[1], _vec(101)]), [0, 1, 1001])
+    assert second._buffer is first._buffer                   # appended in place
+    assert len(first) == 41 and first.row_of(1001) == -1     # older snapshot unchanged
+    assert second.row_of(1001) == 41 and second.row_of(1000) == 40
+    assert second.rows_of_student(0).tolist() == [0, 1, 41]
+    assert second.names[0] == "Renamed" and first.names[0] == "S0"
+    np.testing.assert_allclose(second.matrix[41], _vec(101) / np.linalg.norm(_vec(101)), atol=1e-6)
@@ -0,0 +1,34 @@
+# tests/test_streaming.py
+"""Once-per-day bookkeeping of streaming.StreamPipeline."""
+
+from types import SimpleNamespace
+
+from streaming import StreamPipeline
+
+
+def _track(student_id):
+    return SimpleNamespace(student_id=student_id, name=f"S{student_id}", distance=0.1,
+                           track_id=student_id, hits=100)
+
+
+def test_queued_and_marked_students_reset_on_a_new_day():
+    pipe = StreamPipeline("missing.mp4", persist=False)
+    pipe._new_day("2024-01-01")
+    pipe._queued_students.add(5)
+    pipe._already_today.add(5)
+
+    pipe._new_day("2024-01-01")
+    assert 5 in pipe._queued_students
+
+    pipe._new_day("2024-01-02")
+    assert not pipe._queued_students and not pipe._already_today
+
+
+def test_each_student_is_queued_once_per_day():
+    pipe = StreamPipeline("missing.mp4", persist=False)
+    pipe._queue_attendance([_track(5), _track(5)])
+    assert pipe.queues["persist"].qsize() == 1
+
+    pipe._day = "2000-01-01"        # the pipeline ran past midnight
+    pipe._queue_attendance([_track(5)])
+    assert pipe.queues["persist"].qsize() == 2
@@ -0,0 +1,66 @@
+# tests/test_tracker.py
+"""IoU association and Kalman-predicted tracking (tracker.py)."""
+
+import numpy as np
+
+from tracker import FaceTracker, greedy_assign, iou_matrix
+
+
+def box(x, y, size=40, score=0.9):
+    return [x, y, x + size, y + size, score]
+
+
+def test_iou_matrix():
+    iou = iou_matrix([box(0, 0, 10)], [box(0, 0, 10), box(5, 0, 10), box(50, 50, 10)])
+
+    np.testing.assert_allclose(iou, [[1.0, 50 / 150, 0.0]], rtol=1e-5)
+
+
+def test_greedy_assign_best_pairs_first():
+    iou = np.array([
+        [0.9, 0.8],
+        [0.85, 0.1],
+    ], dtype=np.float32)
+
+    # row 0 takes col 0 (0.9); row 1 cannot reuse it and 0.1 is below min_iou
+    assert greedy_assign(iou, min_iou=0.3) == [(0, 0)]
+    assert sorted(greedy_assign(iou, min_iou=0.05)) == [(0, 0), (1, 1)]
+
+
+def test_tracks_keep_ids_for_moving_faces():
+    tracker = FaceTracker(min_iou=0.3, max_misses=2)
+
+    first = tracker.update([box(0, 0), box(200, 0)])
+    ids = [t.track_id for t in first]
+    assert len(set(ids)) == 2
+
+    # both faces drift right; detection order swapped
+    for step in range(1, 6):
+        assigned = tracker.update([box(200 + 5 * step, 0), box(5 * step, 0)])
+        assert [t.track_id for t in assigned] == ids[::-1]
+
+    assert all(t.hits == 6 for t in tracker.active_tracks())
+
+
+def test_missed_tracks_expire_and_new_faces_get_new_ids():
+    tracker = FaceTracker(min_iou=0.3, max_misses=1)
+    (old,) = tracker.update([box(0, 0)])
+
+    tracker.update([])
+    assert old in tracker.tracks and old.misses == 1
+    tracker.update([])
+    assert old not in tracker.tracks
+
+    (new,) = tracker.update([box(0, 0)])
+    assert new.track_id != old.track_id
+
+
+def test_recognition_is_cached_per_track():
+    tracker = FaceTracker(min_iou=0.3)
+    assigned = tracker.update([box(0, 0)])
+    assert tracker.pending(assigned) == [0]
+
+    tracker.record(assigned[0], 7, "Asha", 0.1)
+    assigned = tracker.update([box(2, 0)])
+    assert tracker.pending(assigned) == []
+    assert assigned[0].student_id == 7
@@ -0,0 +1,226 @@
+# tracker.py
+"""
+Cross-Frame Face Tracker
+------------------------
+Sits between the detector and the matcher for bursts and video:
+
+    detector -> FaceTracker.update() -> only tracks that need it -> recognizer
+
+Each face gets a track ID. A small constant-velocity Kalman filter predicts
+where every track moves next; detections are assigned to the predictions by
+IoU (greedy, best pairs first). A track caches its best embedding and
+identity, and is only sent to the recognizer again when it is
+
+- new (never recognized),
+- low confidence (distance above TRACK_CONFIDENT_DIST), retried every
+  TRACK_RETRY_FRAMES frames, or
+- stale (not recognized for TRACK_REFRESH_FRAMES frames).
+
+On steady classroom video most faces are confident and still, so the
+recognizer runs for a handful of faces per second instead of every face in
+every frame.
+"""
+
+import itertools
+
+import numpy as np
+
+from config import (
+    TRACK_IOU,
+    TRACK_MAX_MISSES,
+    TRACK_CONFIDENT_DIST,
+    TRACK_RETRY_FRAMES,
+    TRACK_REFRESH_FRAMES,
+)
+
+
+# -------------------------------------------------------
+# GEOMETRY
+# -------------------------------------------------------
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (n, 4+) and (m, 4+) boxes [x1, y1, x2, y2]."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a, b = a[:, :4], b[:, :4]
+
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+def greedy_assign(iou, min_iou=TRACK_IOU):
+    """(row, col) pairs, highest IoU first, each row / col used once."""
+    pairs = []
+    if iou.size == 0:
+        return pairs
+    rows, cols = np.nonzero(iou >= min_iou)
+    order = np.argsort(-iou[rows, cols])
+    used_r, used_c = set(), set()
+    for k in order:
+        r, c = int(rows[k]), int(cols[k])
+        if r in used_r or c in used_c:
+            continue
+        pairs.append((r, c))
+        used_r.add(r)
+        used_c.add(c)
+    return pairs
+
+
+# -------------------------------------------------------
+# KALMAN FILTER (box centre + size, constant velocity)
+# -------------------------------------------------------
+
+class BoxKalman:
+    """State [cx, cy, w, h, vx, vy]; measurement [cx, cy, w, h]."""
+
+    _F = np.eye(6, dtype=np.float64)
+    _F[0, 4] = _F[1, 5] = 1.0
+    _H = np.eye(4, 6, dtype=np.float64)
+    _Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.5, 0.5])
+    _R = np.diag([4.0, 4.0, 9.0, 9.0])
+
+    def __init__(self, box):
+        self.x = np.zeros(6)
+        self.x[:4] = self._to_z(box)
+        self.P = np.diag([10.0, 10.0, 10.0, 10.0, 100.0, 100.0])
+
+    @staticmethod
+    def _to_z(box):
+        x1, y1, x2, y2 = [float(v) for v in box[:4]]
+        return np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1])
+
+    def predict(self):
+        self.x = self._F @ self.x
+        self.P = self._F @ self.P @ self._F.T + self._Q
+        return self.box()
+
+    def update(self, box):
+        z = self._to_z(box)
+        y = z - self._H @ self.x
+        S = self._H @ self.P @ self._H.T + self._R
+        K = self.P @ self._H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ y
+        self.P = (np.eye(6) - K @ self._H) @ self.P
+
+    def box(self):
+        cx, cy, w, h = self.x[:4]
+        return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], dtype=np.float32)
+
+
+# -------------------------------------------------------
+# TRACKS
+# -------------------------------------------------------
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.kalman = BoxKalman(box)
+        self.box = np.asarray(box, dtype=np.float32)  # last detection [x1, y1, x2, y2, score]
+        self.misses = 0
+        self.hits = 1
+
+        # cached recognition
+        self.student_id = None
+        self.name = "Unknown"
+        self.distance = None
+        self.embedding = None
+        self.quality = -1.0
+        self.recognized_at = None   # frame number of the last recognizer run
+        self.in_flight = False      # queued for recognition (streaming pipeline)
+
+    @property
+    def confident(self):
+        return self.distance is not None and self.distance <= TRACK_CONFIDENT_DIST
+
+    def needs_recognition(self, frame_no):
+        if self.in_flight:
+            return False
+        if self.recognized_at is None:
+            return True
+        since = frame_no - self.recognized_at
+        if not self.confident:
+            return since >= TRACK_RETRY_FRAMES
+        return since >= TRACK_REFRESH_FRAMES
+
+    def set_identity(self, student_id, name, distance, embedding, quality, frame_no):
+        """
+        Keep the better of the cached and the new result. A stale refresh
+        (confident track re-checked) always takes the new result.
+        """
+        refresh = self.confident
+        if refresh or self.distance is None or distance < self.distance:
+            self.student_id, self.name, self.distance = student_id, name, distance
+            self.embedding = embedding
+            self.quality = quality
+        self.recognized_at = frame_no
+
+
+class FaceTracker:
+    """IoU + Kalman multi-face tracker with per-track recognition cache."""
+
+    def __init__(self, min_iou=TRACK_IOU, max_misses=TRACK_MAX_MISSES):
+        self.min_iou = min_iou
+        self.max_misses = max_misses
+        self.tracks = []
+        self.frame_no = -1
+        self._ids = itertools.count(1)
+
+        # counters for reports / benchmarks
+        self.detections_seen = 0
+        self.recognitions = 0
+
+    def update(self, bboxes):
+        """
+        Advance one frame with its detections (n, 5). Returns a list with the
+        Track for every detection, in detection order.
+        """
+        self.frame_no += 1
+        bboxes = np.asarray(bboxes, dtype=np.float32).reshape(-1, 5)
+        self.detections_seen += len(bboxes)
+
+        predicted = np.array([t.kalman.predict() for t in self.tracks]).reshape(-1, 4)
+        pairs = greedy_assign(iou_matrix(predicted, bboxes), self.min_iou)
+
+        assigned = [None] * len(bboxes)
+        matched = set()
+        for ti, j in pairs:
+            track = self.tracks[ti]
+            track.kalman.update(bboxes[j])
+            track.box = bboxes[j]
+            track.misses = 0
+            track.hits += 1
+            assigned[j] = track
+            matched.add(ti)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched:
+                track.misses += 1
+
+        for j in range(len(bboxes)):
+            if assigned[j] is None:
+                track = Track(next(self._ids), bboxes[j])
+                self.tracks.append(track)
+                assigned[j] = track
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return assigned
+
+    def pending(self, assigned):
+        """Indices of detections whose track should be (re)recognized now."""
+        return [j for j, t in enumerate(assigned) if t.needs_recognition(self.frame_no)]
+
+    def record(self, track, student_id, name, distance, embedding=None, quality=0.0):
+        self.recognitions += 1
+        track.set_identity(student_id, name, distance, embedding, quality, self.frame_no)
+
+    def active_tracks(self):
+        """Tracks seen in the current frame."""
+        return [t for t in self.tracks if t.misses == 0]